@@ -0,0 +1,179 @@
+"""
+Локальная замена вебхуков Discord для стенда производительности.
+
+Задержка ответа, доля ответов 429 и лимит размера запроса настраиваются.
+Каждое принятое сообщение записывается со временем получения.
+"""
+
+import re
+import json
+import time
+import random
+import asyncio
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+
+# Маркер поста в тексте сообщения, по нему считается сквозная задержка
+MARKER = re.compile(r"bench#(\d+)")
+
+
+@dataclass
+class ReceivedMessage:
+    """
+    Сообщение, принятое фейковым вебхуком
+
+    Attributes:
+        webhook (str): ID вебхука из URL
+        received_at (float): Время получения (unix)
+        content (str): Текст сообщения
+        files (int): Количество вложений
+        size (int): Размер запроса в байтах
+    """
+
+    webhook: str
+    received_at: float
+    content: str
+    files: int
+    size: int
+
+    @property
+    def post(self) -> Optional[int]:
+        match = MARKER.search(self.content)
+        return int(match.group(1)) if match else None
+
+
+@dataclass
+class FakeDiscord:
+    """
+    Фейковый сервер вебхуков.
+
+    Attributes:
+        latency (float): Задержка ответа в секундах
+        rate_limit_ratio (float): Доля запросов, получающих 429
+        retry_after (float): retry_after в ответе 429
+        max_request_size (int): Лимит размера запроса, больше — 413
+        edited (List[Dict[str, Any]]): Правки сообщений (PATCH)
+        deleted (List[str]): ID удаленных сообщений
+    """
+
+    latency: float = 0.05
+    rate_limit_ratio: float = 0.0
+    retry_after: float = 0.5
+    max_request_size: int = 25 * 1024 * 1024
+    received: List[ReceivedMessage] = field(default_factory=list)
+    edited: List[Dict[str, Any]] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    statuses: Dict[int, int] = field(default_factory=dict)
+    base: str = ""
+    _ids: Any = field(default_factory=lambda: count(1))
+    _runner: Optional[web.AppRunner] = None
+
+    def webhook_url(self, index: int) -> str:
+        return f"{self.base}/api/webhooks/{index}/token{index}"
+
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=self.max_request_size * 2)
+        app.router.add_post("/api/webhooks/{id}/{token}", self._execute)
+        message = "/api/webhooks/{id}/{token}/messages/{message_id}"
+        app.router.add_patch(message, self._edit)
+        app.router.add_delete(message, self._delete)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        port = self._runner.addresses[0][1]
+        self.base = f"http://{host}:{port}"
+        return self.base
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _count(self, status: int) -> None:
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    async def _edit(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        message_id = request.match_info["message_id"]
+        self.edited.append({"id": message_id, "content": payload.get("content")})
+        self._count(200)
+        return web.json_response({"id": message_id, "content": payload.get("content")})
+
+    async def _delete(self, request: web.Request) -> web.Response:
+        self.deleted.append(request.match_info["message_id"])
+        self._count(204)
+        return web.Response(status=204)
+
+    async def _execute(self, request: web.Request) -> web.Response:
+        if request.content_length and request.content_length > self.max_request_size:
+            await request.release()
+            self._count(413)
+            return web.json_response(
+                {"message": "Request entity too large", "code": 40005}, status=413
+            )
+
+        if random.random() < self.rate_limit_ratio:
+            await request.release()
+            self._count(429)
+            return web.json_response(
+                {
+                    "message": "You are being rate limited.",
+                    "retry_after": self.retry_after,
+                    "global": False,
+                },
+                status=429,
+                headers={
+                    "X-RateLimit-Bucket": f"bench-{request.match_info['id']}",
+                    "X-RateLimit-Limit": "5",
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset-After": str(self.retry_after),
+                },
+            )
+
+        payload: Dict[str, Any] = {}
+        attachments = []
+        size = 0
+        reader = await request.multipart()
+        async for part in reader:
+            data = await part.read()
+            size += len(data)
+            if part.name == "payload_json":
+                payload = json.loads(data)
+            elif part.name and part.name.startswith("files"):
+                attachments.append((part.filename, len(data)))
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        self.received.append(
+            ReceivedMessage(
+                webhook=request.match_info["id"],
+                received_at=time.time(),
+                content=payload.get("content") or "",
+                files=len(attachments),
+                size=size,
+            )
+        )
+        self._count(200)
+        message_id = next(self._ids)
+        return web.json_response(
+            {
+                "id": str(message_id),
+                "content": payload.get("content"),
+                "attachments": [
+                    {
+                        "id": f"{message_id}{index}",
+                        "filename": filename,
+                        "size": length,
+                        "url": f"{self.base}/attachments/{message_id}/{filename}",
+                    }
+                    for index, (filename, length) in enumerate(attachments)
+                ],
+            }
+        )
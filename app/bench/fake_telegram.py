@@ -0,0 +1,171 @@
+"""
+Локальная замена Telegram Bot API для стенда производительности.
+
+Поддерживает методы, которые использует бот при long polling (getMe,
+deleteWebhook, getUpdates, getFile), и раздачу файлов. Обновления
+добавляются через add_update и отдаются в getUpdates.
+"""
+
+import time
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+
+BOT_USER = {
+    "id": 1,
+    "is_bot": True,
+    "first_name": "Bench",
+    "username": "bench_bot",
+    "can_join_groups": False,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+
+class FakeTelegram:
+    """
+    Фейковый Bot API с файлами в памяти.
+
+    Attributes:
+        updates (List[Dict[str, Any]]): Все добавленные обновления
+        injected_at (Dict[int, float]): Время появления обновления по update_id
+        polling (asyncio.Event): Бот начал опрашивать getUpdates
+        sent (List[Dict[str, Any]]): Параметры вызовов sendMessage
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.updates: List[Dict[str, Any]] = []
+        self.injected_at: Dict[int, float] = {}
+        self.files: Dict[str, bytes] = {}
+        self.sent: List[Dict[str, Any]] = []
+        self.base: str = ""
+        # Обновления до этого update_id подтверждены ботом через offset
+        self._confirmed = 0
+        # Выставляется при первом getUpdates: бот запущен и опрашивает API
+        self.polling = asyncio.Event()
+        self._new_update = asyncio.Event()
+        self._runner: Optional[web.AppRunner] = None
+
+    def add_file(self, file_id: str, data: bytes) -> None:
+        self.files[file_id] = data
+
+    def add_update(self, update: Dict[str, Any]) -> int:
+        """Добавляет обновление, update_id назначается по порядку
+
+        Returns:
+            int: update_id
+        """
+        update_id = len(self.updates) + 1
+        self.updates.append({**update, "update_id": update_id})
+        self.injected_at[update_id] = time.time()
+        self._new_update.set()
+        return update_id
+
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route("*", "/bot{token}/{method}", self._method)
+        app.router.add_get("/file/bot{token}/{file_id}", self._file)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Запускает сервер
+
+        Returns:
+            str: Адрес сервера
+        """
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.base = f"http://{host}:{port}"
+        return self.base
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _params(self, request: web.Request) -> Dict[str, Any]:
+        if request.content_type == "application/json":
+            return await request.json()
+        return dict(await request.post()) or dict(request.query)
+
+    async def _method(self, request: web.Request) -> web.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        method = request.match_info["method"]
+        params = await self._params(request)
+
+        if method == "getMe":
+            return _ok(BOT_USER)
+        if method in ("deleteWebhook", "setWebhook", "close", "logOut"):
+            return _ok(True)
+        if method == "getWebhookInfo":
+            pending = sum(1 for u in self.updates if u["update_id"] >= self._confirmed)
+            return _ok(
+                {
+                    "url": "",
+                    "has_custom_certificate": False,
+                    "pending_update_count": pending,
+                }
+            )
+        if method == "getUpdates":
+            self.polling.set()
+            return _ok(await self._get_updates(params))
+        if method == "getFile":
+            file_id = params.get("file_id")
+            if file_id not in self.files:
+                return web.json_response(
+                    {"ok": False, "error_code": 400, "description": "file not found"}
+                )
+            return _ok(
+                {
+                    "file_id": file_id,
+                    "file_unique_id": file_id,
+                    "file_size": len(self.files[file_id]),
+                    "file_path": file_id,
+                }
+            )
+        if method == "sendMessage":
+            self.sent.append(params)
+            return _ok(
+                {
+                    "message_id": len(self.sent),
+                    "date": int(time.time()),
+                    "chat": {"id": int(params["chat_id"]), "type": "private"},
+                    "text": params.get("text"),
+                }
+            )
+        # Остальные методы бенчмарку не нужны
+        return _ok(True)
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        limit = int(params.get("limit") or 100)
+        # Как в Bot API: подтвержденные обновления больше не выдаются
+        self._confirmed = offset = max(self._confirmed, offset)
+        deadline = time.monotonic() + timeout
+        while True:
+            pending = [u for u in self.updates if u["update_id"] >= offset][:limit]
+            remaining = deadline - time.monotonic()
+            if pending or remaining <= 0:
+                return pending
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _file(self, request: web.Request) -> web.Response:
+        data = self.files.get(request.match_info["file_id"])
+        if data is None:
+            return web.Response(status=404)
+        return web.Response(body=data, content_type="application/octet-stream")
+
+
+def _ok(result: Any) -> web.Response:
+    return web.json_response({"ok": True, "result": result})
@@ -0,0 +1,104 @@
+"""
+Стенд для замера пропускной способности приема обновлений в режиме вебхука.
+
+Читает записанные обновления Telegram (по одному JSON на строку) и отправляет
+их на локальный эндпоинт бота, не обращаясь к серверам Telegram.
+
+Пример:
+    python -m app.bench.replay_updates updates.jsonl \\
+        --url http://127.0.0.1:8443/telegram --secret token --concurrency 32
+"""
+
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+from itertools import count
+from typing import Any, Dict, List
+
+import aiohttp
+
+from app.services.telegram_webhook import SECRET_HEADER
+
+
+def load_updates(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def replay(
+    updates: List[Dict[str, Any]],
+    url: str,
+    secret: str = "",
+    concurrency: int = 16,
+    repeat: int = 1,
+) -> Dict[str, Any]:
+    """Отправляет обновления на эндпоинт и считает статусы ответов
+
+    Args:
+        updates (List[Dict[str, Any]]): Записанные обновления
+        url (str): Адрес эндпоинта бота
+        secret (str): Секретный токен вебхука
+        concurrency (int): Количество одновременных запросов
+        repeat (int): Сколько раз повторить набор обновлений
+
+    Returns:
+        Dict[str, Any]: Количество запросов, время и статусы
+    """
+    headers = {SECRET_HEADER: secret} if secret else {}
+    statuses: Counter = Counter()
+    update_ids = count(1)
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(repeat):
+        for update in updates:
+            # Уникальный update_id, как у настоящих повторных доставок
+            queue.put_nowait({**update, "update_id": next(update_ids)})
+
+    async def worker(session: aiohttp.ClientSession) -> None:
+        while not queue.empty():
+            update = queue.get_nowait()
+            try:
+                async with session.post(url, json=update, headers=headers) as resp:
+                    statuses[resp.status] += 1
+            except aiohttp.ClientError as e:
+                statuses[type(e).__name__] += 1
+
+    total = queue.qsize()
+    started = time.perf_counter()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "seconds": round(elapsed, 3),
+        "updates_per_second": round(total / elapsed, 1) if elapsed else 0.0,
+        "statuses": dict(statuses),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("updates", help="JSONL file with recorded updates")
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret", default="")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    result = asyncio.run(
+        replay(
+            load_updates(args.updates),
+            args.url,
+            secret=args.secret,
+            concurrency=args.concurrency,
+            repeat=args.repeat,
+        )
+    )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
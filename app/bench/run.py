@@ -0,0 +1,366 @@
+"""
+Офлайн стенд производительности: бот целиком против фейковых Telegram и Discord.
+
+Поднимает фейковый Bot API и фейковые вебхуки Discord, запускает бота
+(python -m app.main) во временном каталоге с настройками, направленными
+на фейки, подает сценарий постов и считает посты в секунду, p50/p99
+сквозной задержки, пиковый RSS и процессорное время бота.
+
+С --backlog посты подаются до запуска бота, как после простоя, и
+время считается от запуска процесса.
+
+Пример:
+    python -m app.bench.run --workload albums --posts 50 --webhooks 2 \\
+        --discord-latency 0.05 --rate-limit-ratio 0.05
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+import resource
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.bench.fake_discord import FakeDiscord
+from app.bench.fake_telegram import FakeTelegram
+
+
+# Корень репозитория: бот запускается из временного каталога
+ROOT = Path(__file__).resolve().parents[2]
+
+CHAT_ID = -1001000000000
+WORKLOADS = ("photos", "albums", "animations", "mixed")
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Перцентиль методом ближайшего ранга"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Workload:
+    """
+    Генератор постов канала для фейкового Telegram.
+
+    Каждый пост получает подпись с маркером bench#N, по которому фейковый
+    Discord сопоставляет сообщение с постом. file_unique_id у каждого
+    медиа свой, чтобы кэш медиа не искажал замер.
+    """
+
+    def __init__(
+        self,
+        telegram: FakeTelegram,
+        photo_size: int,
+        animation: Optional[bytes],
+        chats: int,
+    ) -> None:
+        self.telegram = telegram
+        self.animation = animation
+        self.chats = chats
+        self._message_id = 0
+        telegram.add_file("photo", os.urandom(photo_size))
+        if animation is not None:
+            telegram.add_file("animation", animation)
+
+    def _message(self, post: int, media: Dict[str, Any]) -> Dict[str, Any]:
+        self._message_id += 1
+        chat_id = CHAT_ID - post % self.chats
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "channel", "title": "Bench"},
+            **media,
+        }
+
+    def _photo(self, unique_id: str) -> Dict[str, Any]:
+        size = len(self.telegram.files["photo"])
+        return {
+            "photo": [
+                {
+                    "file_id": "photo",
+                    "file_unique_id": unique_id,
+                    "width": 1280,
+                    "height": 720,
+                    "file_size": size,
+                }
+            ]
+        }
+
+    def _animation(self, unique_id: str) -> Dict[str, Any]:
+        media = {
+            "file_id": "animation",
+            "file_unique_id": unique_id,
+            "file_size": len(self.animation),
+            "mime_type": "video/mp4",
+            "file_name": "animation.mp4",
+        }
+        return {
+            "animation": {**media, "width": 480, "height": 270, "duration": 3},
+            "document": media,
+        }
+
+    def photo(self, post: int) -> None:
+        message = self._message(post, self._photo(f"p{post}"))
+        self.telegram.add_update(
+            {"channel_post": {**message, "caption": _caption(post)}}
+        )
+
+    def album(self, post: int, size: int = 10) -> None:
+        for index in range(size):
+            message = self._message(post, self._photo(f"a{post}-{index}"))
+            message["media_group_id"] = f"group{post}"
+            if index == 0:
+                message["caption"] = _caption(post)
+            self.telegram.add_update({"channel_post": message})
+
+    def animation_post(self, post: int) -> None:
+        message = self._message(post, self._animation(f"g{post}"))
+        self.telegram.add_update(
+            {"channel_post": {**message, "caption": _caption(post)}}
+        )
+
+    def add(self, kind: str, post: int) -> None:
+        if kind == "mixed":
+            kinds = ["photos", "albums"] + (["animations"] if self.animation else [])
+            kind = kinds[post % len(kinds)]
+        if kind == "photos":
+            self.photo(post)
+        elif kind == "albums":
+            self.album(post)
+        else:
+            self.animation_post(post)
+
+
+def _caption(post: int) -> str:
+    return f"bench#{post}"
+
+
+def make_settings(
+    base: Dict[str, Any], telegram: FakeTelegram, discord: FakeDiscord, webhooks: int
+) -> Dict[str, Any]:
+    """Настройки бота, направленные на фейковые серверы
+
+    Args:
+        base (Dict[str, Any]): Исходные настройки (очередь, воркеры и т.д.)
+        telegram (FakeTelegram): Запущенный фейковый Bot API
+        discord (FakeDiscord): Запущенный фейковый Discord
+        webhooks (int): Количество вебхуков
+
+    Returns:
+        Dict[str, Any]: Содержимое settings.json
+    """
+    settings = json.loads(json.dumps(base))
+    settings.setdefault("telegram", {}).update(
+        {
+            "admin_ids": settings["telegram"].get("admin_ids", []),
+            "bot_token": "1:bench",
+            "max_file_size": settings["telegram"].get("max_file_size", 20971520),
+            "mode": "polling",
+            "base_url": f"{telegram.base}/bot",
+            "base_file_url": f"{telegram.base}/file/bot",
+        }
+    )
+    settings.setdefault("discord", {}).update(
+        {
+            "webhooks": [
+                {"name": f"bench-{index}", "url": discord.webhook_url(index)}
+                for index in range(1, webhooks + 1)
+            ],
+            "max_file_size": settings["discord"].get("max_file_size", 8388608),
+        }
+    )
+    settings.setdefault("general", {})
+    settings.setdefault("metrics", {})["enabled"] = False
+    return settings
+
+
+async def run_bench(args: argparse.Namespace) -> Dict[str, Any]:
+    """Прогоняет сценарий и собирает отчет"""
+    telegram = FakeTelegram(latency=args.telegram_latency)
+    discord = FakeDiscord(
+        latency=args.discord_latency,
+        rate_limit_ratio=args.rate_limit_ratio,
+        retry_after=args.retry_after,
+        max_request_size=args.max_request_size,
+    )
+    await telegram.start()
+    await discord.start()
+
+    base = json.loads(Path(args.config).read_text(encoding="utf-8"))
+    animation = Path(args.animation_file).read_bytes() if args.animation_file else None
+    if args.workload == "animations" and animation is None:
+        raise SystemExit("--animation-file is required for the animations workload")
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-"))
+    settings = make_settings(base, telegram, discord, args.webhooks)
+    (workdir / "settings.json").write_text(json.dumps(settings, indent=2))
+
+    workload = Workload(telegram, args.photo_size, animation, args.chats)
+    if args.backlog:
+        for post in range(args.posts):
+            workload.add(args.workload, post)
+
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    started = time.time()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "app.main",
+        cwd=workdir,
+        env=env,
+        stdout=asyncio.subprocess.DEVNULL if not args.verbose else None,
+        stderr=asyncio.subprocess.DEVNULL if not args.verbose else None,
+    )
+    try:
+        await _wait_started(process, telegram, args.startup_timeout)
+
+        if not args.backlog:
+            started = time.time()
+            for post in range(args.posts):
+                workload.add(args.workload, post)
+                if args.rate:
+                    await asyncio.sleep(1 / args.rate)
+        injected = {
+            post: telegram.injected_at[update_id]
+            for post, update_id in _first_updates(telegram).items()
+        }
+
+        delivered = await _wait_delivered(
+            discord, args.posts, args.webhooks, args.timeout
+        )
+        finished = time.time()
+    finally:
+        if process.returncode is None:
+            process.send_signal(signal.SIGTERM)
+            try:
+                await asyncio.wait_for(process.wait(), args.shutdown_timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+        await telegram.stop()
+        await discord.stop()
+
+    # Процессы бота и воркеров уже завершены и учтены в RUSAGE_CHILDREN
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    latencies = [delivered[post] - injected[post] for post in delivered]
+    elapsed = (max(delivered.values()) if delivered else finished) - started
+
+    return {
+        "workload": args.workload,
+        "posts": args.posts,
+        "delivered": len(delivered),
+        "webhooks": args.webhooks,
+        "seconds": round(elapsed, 3),
+        "posts_per_second": round(len(delivered) / elapsed, 2) if elapsed else 0.0,
+        "latency_p50": _round(percentile(latencies, 50)),
+        "latency_p99": _round(percentile(latencies, 99)),
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 2),
+        "discord_messages": len(discord.received),
+        "discord_statuses": discord.statuses,
+        "workdir": str(workdir),
+    }
+
+
+async def _wait_started(
+    process: asyncio.subprocess.Process, telegram: FakeTelegram, timeout: float
+) -> None:
+    """Ждет первого getUpdates, прерываясь, если бот завершился при запуске"""
+    polling = asyncio.create_task(telegram.polling.wait())
+    exited = asyncio.create_task(process.wait())
+    done, pending = await asyncio.wait(
+        {polling, exited}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+    )
+    for task in pending:
+        task.cancel()
+    if exited in done:
+        raise RuntimeError(f"Bot exited with code {process.returncode} on startup")
+    if not done:
+        raise TimeoutError("Bot did not start polling in time")
+
+
+def _first_updates(telegram: FakeTelegram) -> Dict[int, int]:
+    """update_id первого обновления каждого поста по маркеру в подписи"""
+    posts: Dict[int, int] = {}
+    for update in telegram.updates:
+        caption = update["channel_post"].get("caption") or ""
+        if caption.startswith("bench#"):
+            posts[int(caption[len("bench#") :])] = update["update_id"]
+    return posts
+
+
+async def _wait_delivered(
+    discord: FakeDiscord, posts: int, webhooks: int, timeout: float
+) -> Dict[int, float]:
+    """Ждет, пока каждый пост дойдет до всех вебхуков
+
+    Returns:
+        Dict[int, float]: Время доставки поста во все вебхуки по номеру поста
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        arrivals: Dict[int, Dict[str, float]] = {}
+        for message in discord.received:
+            if message.post is None:
+                continue
+            hooks = arrivals.setdefault(message.post, {})
+            hooks.setdefault(message.webhook, message.received_at)
+        delivered = {
+            post: max(hooks.values())
+            for post, hooks in arrivals.items()
+            if len(hooks) == webhooks
+        }
+        if len(delivered) >= posts or time.monotonic() > deadline:
+            return delivered
+        await asyncio.sleep(0.05)
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 3) if value is not None else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workload", choices=WORKLOADS, default="photos")
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument(
+        "--rate", type=float, default=0, help="Posts per second, 0 = burst"
+    )
+    parser.add_argument("--chats", type=int, default=1, help="Number of channels")
+    parser.add_argument(
+        "--backlog",
+        action="store_true",
+        help="Queue all posts before the bot starts, as after downtime",
+    )
+    parser.add_argument("--webhooks", type=int, default=1)
+    parser.add_argument("--photo-size", type=int, default=200 * 1024)
+    parser.add_argument("--animation-file", help="MP4 used for animation posts")
+    parser.add_argument(
+        "--config",
+        default=str(ROOT / "settings.json_example"),
+        help="Base settings.json (queue, workers, ...)",
+    )
+    parser.add_argument("--telegram-latency", type=float, default=0.0)
+    parser.add_argument("--discord-latency", type=float, default=0.05)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--max-request-size", type=int, default=25 * 1024 * 1024)
+    parser.add_argument("--startup-timeout", type=float, default=30)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--shutdown-timeout", type=float, default=60)
+    parser.add_argument("--verbose", action="store_true", help="Show bot output")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run_bench(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
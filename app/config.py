@@ -1,15 +1,81 @@
+import re
 import json
-from pydantic import Field, BaseModel
-from typing import Optional, List
+import ipaddress
+from pydantic import Field, BaseModel, PrivateAttr, model_validator
+from typing import Dict, Literal, Optional, List, Set
 from pathlib import Path
 
 
+class TelegramWebhookConfig(BaseModel):
+    """Конфигурация приема обновлений Telegram через вебхук"""
+
+    listen: str = Field("127.0.0.1", description="Address to bind the HTTP server")
+    port: int = Field(8443, description="Port to bind the HTTP server")
+    path: str = Field("/telegram", description="Endpoint path for updates")
+    public_url: Optional[str] = Field(
+        None, description="URL registered via setWebhook (skipped if empty)"
+    )
+    secret_token: Optional[str] = Field(
+        None,
+        description="Expected X-Telegram-Bot-Api-Secret-Token header; required "
+        "with public_url or a non-loopback listen address",
+    )
+    max_queue_size: int = Field(
+        1000, ge=1, description="Pending updates before requests are rejected"
+    )
+    max_connections: int = Field(
+        40, ge=1, le=100, description="Max simultaneous connections from Telegram"
+    )
+
+    @property
+    def is_exposed(self) -> bool:
+        """Сервер доступен не только с этой машины"""
+        if self.public_url:
+            return True
+        if self.listen == "localhost":
+            return False
+        try:
+            return not ipaddress.ip_address(self.listen).is_loopback
+        except ValueError:
+            # Имя хоста или пустой адрес (все интерфейсы)
+            return True
+
+
 class TelegramConfig(BaseModel):
     """Конфигурация Telegram бота"""
 
     admin_ids: List[int] = Field(..., description="Admin IDs")
     bot_token: str = Field(..., description="Telegram bot token")
     max_file_size: int = Field(..., description="Max file size for Telegram")
+    max_concurrent_downloads: int = Field(
+        4, ge=1, description="Max media files downloaded at the same time"
+    )
+    mode: Literal["polling", "webhook"] = Field(
+        "polling", description="How updates are received"
+    )
+    webhook: TelegramWebhookConfig = Field(
+        default_factory=TelegramWebhookConfig, description="Webhook mode settings"
+    )
+    base_url: Optional[str] = Field(
+        None, description="Bot API base URL override, e.g. a local Bot API server"
+    )
+    base_file_url: Optional[str] = Field(
+        None, description="Bot API file download base URL override"
+    )
+
+    @model_validator(mode="after")
+    def _check_webhook_secret(self) -> "TelegramConfig":
+        # Без секрета любой, кто знает адрес, может подать боту свои обновления
+        if (
+            self.mode == "webhook"
+            and self.webhook.is_exposed
+            and not self.webhook.secret_token
+        ):
+            raise ValueError(
+                "telegram.webhook.secret_token is required when the webhook has "
+                "a public_url or listens on a non-loopback address"
+            )
+        return self
 
 
 class WebhookConfig(BaseModel):
@@ -36,10 +102,356 @@ class DiscordConfig(BaseModel):
     message: DiscordMessageConfig = Field(
         ..., description="Discord message configuration"
     )
+    max_concurrency: int = Field(
+        4, ge=1, description="Max concurrent webhook deliveries"
+    )
+    connection_limit: int = Field(10, ge=1, description="HTTP connection pool size")
+    request_timeout: float = Field(
+        120.0, gt=0, description="Webhook request timeout in seconds"
+    )
+    rate_limit_retries: int = Field(
+        10, ge=0, description="Max resends of a single message after HTTP 429"
+    )
+    max_attachments: int = Field(
+        10, ge=1, le=10, description="Max attachments in one Discord message"
+    )
+    max_request_size: int = Field(
+        25 * 1024 * 1024, ge=1, description="Max total upload size of one message"
+    )
+    pack_strategy: Literal["ordered", "compact"] = Field(
+        "ordered",
+        description=(
+            "ordered keeps album order when splitting; compact bin-packs "
+            "files into the fewest messages"
+        ),
+    )
 
 
 class GeneralConfig(BaseModel):
     temp_dir: Path = Field(Path("temp"), description="Path to temporary files")
+    cache_max_bytes: int = Field(
+        512 * 1024 * 1024,
+        ge=0,
+        description="Media cache budget in bytes (0 disables), split evenly "
+        "between worker processes",
+    )
+
+
+class GifProfile(BaseModel):
+    """Профиль конвертации видео в GIF"""
+
+    fps: int = Field(10, ge=1, description="Output frame rate")
+    width: int = Field(480, ge=16, description="Output width, height keeps aspect")
+    palette_mode: Literal["full", "diff", "none"] = Field(
+        "full",
+        description="palettegen stats mode; 'none' skips palette generation",
+    )
+    max_output_size: Optional[int] = Field(
+        None,
+        ge=1,
+        description="Max GIF size; larger results are refitted or rejected",
+    )
+
+
+class ConversionConfig(BaseModel):
+    """Конфигурация пула конвертации ffmpeg"""
+
+    workers: int = Field(2, ge=1, description="Max ffmpeg processes at the same time")
+    queue_size: int = Field(
+        32, ge=1, description="Max conversions waiting for a free worker"
+    )
+    timeout: float = Field(120.0, gt=0, description="Conversion timeout in seconds")
+    default_profile: str = Field("default", description="Profile used for GIFs")
+    profiles: Dict[str, GifProfile] = Field(
+        default_factory=lambda: {"default": GifProfile()},
+        description="GIF conversion profiles by name",
+    )
+    fit_to_size: bool = Field(
+        True, description="Re-encode media over discord.max_file_size to fit it"
+    )
+    fit_max_attempts: int = Field(
+        3, ge=1, description="Max re-encode attempts per file when fitting"
+    )
+    fit_margin: float = Field(
+        0.95, gt=0, le=1, description="Fraction of the size limit to aim for"
+    )
+    fit_gif_widths: List[int] = Field(
+        [480, 400, 320, 240, 160], description="GIF widths tried when fitting"
+    )
+    fit_gif_fps: List[int] = Field([10, 8, 6], description="GIF fps tried when fitting")
+
+
+class StickerConfig(BaseModel):
+    """Конфигурация отправки стикеров"""
+
+    enabled: bool = Field(True, description="Send stickers to Discord")
+    animated_format: Literal["gif", "apng"] = Field(
+        "gif", description="Output format of video (WebM) and animated (TGS) stickers"
+    )
+    size: int = Field(
+        320, ge=16, le=512, description="Width of rendered animated stickers"
+    )
+    fps: int = Field(15, ge=1, le=60, description="Frame rate of rendered stickers")
+    tgs_renderer: List[str] = Field(
+        [],
+        description="Command rendering a TGS file to animated_format with "
+        "{input}, {output}, {size} and {fps} placeholders; empty sends the "
+        "static thumbnail instead",
+    )
+
+
+class MediaGroupConfig(BaseModel):
+    """Конфигурация сборки медиа групп"""
+
+    quiet_period: float = Field(
+        1.0, gt=0, description="Initial quiet time after the last item before flush"
+    )
+    min_quiet_period: float = Field(
+        0.3, gt=0, description="Lower bound for the adaptive quiet period"
+    )
+    max_quiet_period: float = Field(
+        3.0, gt=0, description="Upper bound for the adaptive quiet period"
+    )
+    max_wait: float = Field(
+        5.0, gt=0, description="Hard limit from the first item to flush"
+    )
+    shutdown_timeout: float = Field(
+        30.0, ge=0, description="Time to drain pending groups on shutdown"
+    )
+
+
+class DispatcherConfig(BaseModel):
+    """Конфигурация параллельной обработки каналов"""
+
+    max_concurrency: int = Field(
+        4, ge=1, description="Max posts processed at the same time across channels"
+    )
+    max_queue_per_chat: int = Field(
+        100, ge=1, description="Max posts waiting in a single channel's queue"
+    )
+    overflow_policy: Literal["block", "drop_oldest", "drop_newest"] = Field(
+        "block",
+        description="What to do when a channel's queue is full; 'block' holds "
+        "the channel's new posts in memory until its queue has room, without "
+        "stalling other channels or Telegram updates",
+    )
+    max_held_per_chat: int = Field(
+        1000,
+        ge=0,
+        description="Max posts held per channel by the 'block' policy; newer "
+        "posts are dropped once this many are held",
+    )
+    shutdown_timeout: float = Field(
+        60.0, ge=0, description="Time to drain channel queues on shutdown"
+    )
+
+
+class WorkersConfig(BaseModel):
+    """Конфигурация процессов обработки медиа и доставки"""
+
+    count: int = Field(
+        0, ge=0, description="Worker processes; 0 processes posts in the bot process"
+    )
+    path: Optional[Path] = Field(
+        None, description="Ingest queue directory (defaults to <temp_dir>/ingest)"
+    )
+    concurrency: int = Field(2, ge=1, description="Posts processed per worker at once")
+    lease_timeout: float = Field(
+        60.0, gt=0, description="Seconds before a silent worker's post is retried"
+    )
+    poll_interval: float = Field(
+        0.2, gt=0, description="Delay between ingest queue polls when idle"
+    )
+    max_attempts: int = Field(5, ge=1, description="Max processing attempts per post")
+    restart_delay: float = Field(
+        1.0, ge=0, description="Delay before restarting a crashed worker"
+    )
+
+
+class MetricsConfig(BaseModel):
+    """Конфигурация эндпоинта метрик"""
+
+    enabled: bool = Field(False, description="Serve Prometheus metrics")
+    listen: str = Field("127.0.0.1", description="Address to bind the metrics server")
+    port: int = Field(
+        9464, description="Metrics port; worker N listens on port + N + 1"
+    )
+
+
+class DedupConfig(BaseModel):
+    """Конфигурация отсева повторных постов"""
+
+    enabled: bool = Field(False, description="Skip posts repeated within the window")
+    window: float = Field(
+        600.0, gt=0, description="Seconds a post fingerprint is remembered"
+    )
+    max_entries: int = Field(
+        10000, ge=1, description="Max fingerprints kept in memory and on disk"
+    )
+    policy: Literal["skip", "coalesce"] = Field(
+        "skip",
+        description="'skip' drops exact repeats; 'coalesce' also sends only the "
+        "text of posts whose media was posted within the window",
+    )
+    cross_channel: bool = Field(
+        False,
+        description="Also match repeats posted by other channels to the same "
+        "webhooks",
+    )
+    path: Optional[Path] = Field(
+        None, description="Index directory (defaults to <temp_dir>/dedup)"
+    )
+
+
+class EditsConfig(BaseModel):
+    """Конфигурация переноса правок и удалений постов в Discord"""
+
+    enabled: bool = Field(
+        False, description="Apply channel post edits to the Discord messages"
+    )
+    max_age: float = Field(
+        7 * 24 * 3600.0, gt=0, description="Seconds a post stays editable"
+    )
+    max_entries: int = Field(
+        50000, ge=1, description="Max indexed deliveries (post and webhook pairs)"
+    )
+    path: Optional[Path] = Field(
+        None, description="Index directory (defaults to <temp_dir>/messages)"
+    )
+
+
+class CatchUpConfig(BaseModel):
+    """Конфигурация догоняющей обработки обновлений, накопившихся за простой"""
+
+    enabled: bool = Field(False, description="Process a startup backlog in batches")
+    min_backlog: int = Field(
+        50, ge=1, description="Pending updates at startup that switch catch-up on"
+    )
+    max_age: Optional[float] = Field(
+        None, gt=0, description="Skip backlog posts older than this many seconds"
+    )
+    order: Literal["oldest_first", "newest_first"] = Field(
+        "oldest_first", description="Order of backlog posts within a channel"
+    )
+    collapse_edits: bool = Field(
+        True, description="Send a backlog post once, with its latest edit applied"
+    )
+    batch_size: int = Field(
+        50, ge=1, description="Backlog posts prepared and sent per batch"
+    )
+    concurrency: int = Field(
+        4, ge=1, description="Channels sent at the same time during catch-up"
+    )
+    max_attempts: int = Field(
+        3, ge=1, description="Attempts per backlog post before it is dropped"
+    )
+    retry_backoff: float = Field(
+        2.0, gt=0, description="Initial delay before retrying a backlog post"
+    )
+    page_size: int = Field(
+        100, ge=1, le=100, description="Updates requested per getUpdates call"
+    )
+    path: Optional[Path] = Field(
+        None, description="Backlog spool directory (defaults to <temp_dir>/catch_up)"
+    )
+
+
+class QueueConfig(BaseModel):
+    """Конфигурация очереди доставки в Discord"""
+
+    enabled: bool = Field(True, description="Deliver through the persistent queue")
+    path: Optional[Path] = Field(
+        None, description="Queue directory (defaults to <temp_dir>/outbox)"
+    )
+    max_attempts: int = Field(8, ge=1, description="Max delivery attempts per webhook")
+    base_backoff: float = Field(2.0, gt=0, description="Initial retry delay in seconds")
+    max_backoff: float = Field(300.0, gt=0, description="Max retry delay in seconds")
+    batch_size: int = Field(
+        20, ge=1, description="Max deliveries picked from the queue at once"
+    )
+
+
+MediaType = Literal[
+    "text", "photo", "video", "animation", "document", "audio", "voice", "sticker"
+]
+
+
+class RouteConfig(BaseModel):
+    """Маршрут постов из каналов Telegram в вебхуки Discord"""
+
+    name: str = Field(..., description="Route name used in logs and metrics")
+    chats: List[int] = Field(
+        default_factory=list, description="Source chat IDs; empty matches any chat"
+    )
+    media_types: List[MediaType] = Field(
+        default_factory=list,
+        description="Post must contain one of these media types; empty matches any",
+    )
+    caption_pattern: Optional[str] = Field(
+        None, description="Regular expression searched in the caption or text"
+    )
+    webhooks: List[str] = Field(
+        ..., min_length=1, description="Names of webhooks that receive the post"
+    )
+
+
+class RoutingTable:
+    """
+    Маршруты, собранные в индекс по ID канала.
+
+    Для каждого канала заранее составлен список подходящих маршрутов
+    (свои и маршруты для любых каналов) в порядке конфигурации, поэтому
+    поиск кандидатов — одно обращение к словарю.
+    """
+
+    def __init__(self, routes: List[RouteConfig]) -> None:
+        self.routes = routes
+        self._patterns = [
+            re.compile(route.caption_pattern) if route.caption_pattern else None
+            for route in routes
+        ]
+        self._any_chat = [
+            index for index, route in enumerate(routes) if not route.chats
+        ]
+        self._by_chat: Dict[int, List[int]] = {}
+        for index, route in enumerate(routes):
+            for chat_id in route.chats:
+                self._by_chat.setdefault(chat_id, []).append(index)
+        for chat_id, indexes in self._by_chat.items():
+            self._by_chat[chat_id] = sorted(set(indexes) | set(self._any_chat))
+
+    @property
+    def enabled(self) -> bool:
+        """Без маршрутов каждый пост уходит во все вебхуки"""
+        return bool(self.routes)
+
+    def has_routes(self, chat_id: int) -> bool:
+        """Есть ли маршруты, которые могут подойти посту из канала"""
+        return bool(self._by_chat.get(chat_id, self._any_chat))
+
+    def match(
+        self, chat_id: int, media_types: Set[str], text: str
+    ) -> List[RouteConfig]:
+        """Маршруты, подходящие посту
+
+        Args:
+            chat_id (int): ID канала
+            media_types (Set[str]): Типы медиа поста (text, если медиа нет)
+            text (str): Подпись или текст поста
+
+        Returns:
+            List[RouteConfig]: Подходящие маршруты в порядке конфигурации
+        """
+        matched = []
+        for index in self._by_chat.get(chat_id, self._any_chat):
+            route = self.routes[index]
+            if route.media_types and not media_types.intersection(route.media_types):
+                continue
+            pattern = self._patterns[index]
+            if pattern is not None and not pattern.search(text):
+                continue
+            matched.append(route)
+        return matched
 
 
 class Settings(BaseModel):
@@ -48,6 +460,40 @@ class Settings(BaseModel):
     telegram: TelegramConfig
     discord: DiscordConfig
     general: GeneralConfig
+    queue: QueueConfig = Field(default_factory=QueueConfig)
+    conversion: ConversionConfig = Field(default_factory=ConversionConfig)
+    stickers: StickerConfig = Field(default_factory=StickerConfig)
+    media_group: MediaGroupConfig = Field(default_factory=MediaGroupConfig)
+    dispatcher: DispatcherConfig = Field(default_factory=DispatcherConfig)
+    workers: WorkersConfig = Field(default_factory=WorkersConfig)
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig)
+    dedup: DedupConfig = Field(default_factory=DedupConfig)
+    edits: EditsConfig = Field(default_factory=EditsConfig)
+    catch_up: CatchUpConfig = Field(default_factory=CatchUpConfig)
+    routes: List[RouteConfig] = Field(
+        default_factory=list,
+        description="Routes from source chats to webhooks; empty sends every post "
+        "to every webhook",
+    )
+
+    _routing: RoutingTable = PrivateAttr()
+
+    @model_validator(mode="after")
+    def _compile_routes(self) -> "Settings":
+        names = {hook.name for hook in self.discord.webhooks}
+        for route in self.routes:
+            unknown = set(route.webhooks) - names
+            if unknown:
+                raise ValueError(
+                    f"Route {route.name} refers to unknown webhooks: {sorted(unknown)}"
+                )
+        self._routing = RoutingTable(self.routes)
+        return self
+
+    @property
+    def routing(self) -> RoutingTable:
+        """Таблица маршрутов, собранная при загрузке настроек"""
+        return self._routing
 
 
 # Глобальная переменная для хранения настроек
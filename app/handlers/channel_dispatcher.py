@@ -0,0 +1,203 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+
+from app.config import DispatcherConfig
+from app.utils.logging import get_logger
+from app.utils.metrics import get_metrics
+
+
+@dataclass
+class ChannelJob:
+    """
+    Задача обработки одного поста канала
+
+    Attributes:
+        run (Callable[[], Awaitable[None]]): Обработка и отправка поста
+        ready (Optional[asyncio.Event]): Пост готов к обработке (медиа группа
+            собрана). До этого задача держит место в очереди канала, но не
+            занимает общий слот обработки
+        on_drop (Optional[Callable[[], None]]): Освобождение ресурсов, если
+            задача выброшена из переполненной очереди
+        label (str): Название для лога
+    """
+
+    run: Callable[[], Awaitable[None]]
+    ready: Optional[asyncio.Event] = None
+    on_drop: Optional[Callable[[], None]] = None
+    label: str = ""
+
+
+@dataclass
+class _ChannelState:
+    jobs: Deque[ChannelJob] = field(default_factory=deque)
+    # Посты сверх max_queue_per_chat при политике block
+    overflow: Deque[ChannelJob] = field(default_factory=deque)
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition)
+    worker: Optional[asyncio.Task] = None
+    processed: int = 0
+    dropped: int = 0
+
+
+class ChannelDispatcher:
+    """
+    Параллельная обработка постов разных каналов с сохранением порядка.
+
+    У каждого канала своя очередь и свой обработчик, поэтому посты одного
+    канала уходят в Discord в порядке поступления, а медленный пост задерживает
+    только свой канал. Общее число одновременно обрабатываемых постов
+    ограничено max_concurrency. Обработчик канала завершается, когда его
+    очередь пуста, и создается заново при следующем посте.
+
+    submit не ждет места в очереди, поэтому полная очередь одного канала
+    не задерживает обработчик обновлений Telegram и остальные каналы.
+    """
+
+    def __init__(self, config: DispatcherConfig) -> None:
+        self.config = config
+        self.logger = get_logger(__name__)
+        self._slots = asyncio.Semaphore(config.max_concurrency)
+        self._channels: Dict[int, _ChannelState] = {}
+        self._workers: Set[asyncio.Task] = set()
+        self._active = 0
+        get_metrics().gauge(
+            "channel_queue_depth", "Posts waiting in a channel's queue", ["chat_id"]
+        ).set_function(
+            lambda: {
+                (chat_id,): len(state.jobs) + len(state.overflow)
+                for chat_id, state in self._channels.items()
+            }
+        )
+
+    def depth(self, chat_id: int) -> int:
+        """Количество постов канала, ожидающих обработки"""
+        state = self._channels.get(chat_id)
+        return len(state.jobs) + len(state.overflow) if state else 0
+
+    async def submit(self, chat_id: int, job: ChannelJob) -> bool:
+        """Ставит пост в очередь канала
+
+        При переполнении очереди действует overflow_policy: block
+        откладывает пост, пока в очереди канала не освободится место,
+        drop_oldest выбрасывает самый старый ожидающий пост, drop_newest
+        выбрасывает новый. Отложенные посты ждут только свой канал и
+        сохраняют порядок, а вызывающий код не блокируется. Отложенных
+        постов не больше max_held_per_chat, следующие выбрасываются.
+
+        Args:
+            chat_id (int): ID канала
+            job (ChannelJob): Задача обработки поста
+
+        Returns:
+            bool: Принят ли пост в очередь
+        """
+        state = self._channels.setdefault(chat_id, _ChannelState())
+        limit = self.config.max_queue_per_chat
+        policy = self.config.overflow_policy
+
+        async with state.changed:
+            if len(state.jobs) >= limit or state.overflow:
+                can_hold = len(state.overflow) < self.config.max_held_per_chat
+                if policy == "block" and can_hold:
+                    if not state.overflow:
+                        self.logger.warning(
+                            "Channel queue is full, holding posts",
+                            extra={"chat_id": chat_id, "depth": len(state.jobs)},
+                        )
+                    state.overflow.append(job)
+                elif policy == "drop_oldest":
+                    self._drop(chat_id, state, state.jobs.popleft())
+                    state.jobs.append(job)
+                else:
+                    self._drop(chat_id, state, job)
+                    return False
+            else:
+                state.jobs.append(job)
+
+        if state.worker is None:
+            state.worker = asyncio.create_task(self._work(chat_id, state))
+            self._workers.add(state.worker)
+            state.worker.add_done_callback(self._workers.discard)
+        return True
+
+    def _drop(self, chat_id: int, state: _ChannelState, job: ChannelJob) -> None:
+        state.dropped += 1
+        self.logger.warning(
+            "Channel queue overflow, post dropped",
+            extra={
+                "chat_id": chat_id,
+                "job": job.label,
+                "policy": self.config.overflow_policy,
+            },
+        )
+        if job.on_drop is not None:
+            job.on_drop()
+
+    async def _work(self, chat_id: int, state: _ChannelState) -> None:
+        """Обрабатывает очередь канала по одному посту"""
+        try:
+            while state.jobs:
+                job = state.jobs[0]
+                if job.ready is not None:
+                    # Ожидание сборки не занимает общий слот
+                    await job.ready.wait()
+
+                async with state.changed:
+                    # Пока шло ожидание, задачу могли выбросить из очереди
+                    if not state.jobs or state.jobs[0] is not job:
+                        continue
+                    state.jobs.popleft()
+                    if state.overflow:
+                        state.jobs.append(state.overflow.popleft())
+
+                async with self._slots:
+                    self._active += 1
+                    try:
+                        await job.run()
+                    except Exception as e:
+                        self.logger.error(
+                            f"Error processing post: {e}",
+                            extra={"chat_id": chat_id, "job": job.label},
+                        )
+                    finally:
+                        self._active -= 1
+                state.processed += 1
+        finally:
+            state.worker = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Глубина очередей и счетчики по каналам"""
+        return {
+            "active": self._active,
+            "channels": {
+                chat_id: {
+                    "depth": len(state.jobs) + len(state.overflow),
+                    "processed": state.processed,
+                    "dropped": state.dropped,
+                }
+                for chat_id, state in self._channels.items()
+            },
+        }
+
+    async def shutdown(self, timeout: Optional[float] = None) -> None:
+        """Дожидается обработки очередей каналов
+
+        Args:
+            timeout (Optional[float]): Сколько ждать, затем обработка отменяется
+        """
+        timeout = self.config.shutdown_timeout if timeout is None else timeout
+        workers = list(self._workers)
+        if not workers:
+            return
+        self.logger.info(f"Draining {len(workers)} channel queues")
+        _, pending = await asyncio.wait(workers, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        # Невыполненные задачи освобождают свои ресурсы
+        for chat_id, state in self._channels.items():
+            for jobs in (state.jobs, state.overflow):
+                while jobs:
+                    self._drop(chat_id, state, jobs.popleft())
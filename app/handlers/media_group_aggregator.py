@@ -0,0 +1,212 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+from telegram import Message
+from telegram.ext import ContextTypes
+
+from app.config import MediaGroupConfig
+from app.models.media_group import MediaGroup
+from app.utils.logging import get_logger
+from app.utils.metrics import get_metrics
+
+
+FlushCallback = Callable[[MediaGroup, ContextTypes.DEFAULT_TYPE], Awaitable[None]]
+ItemCallback = Callable[[Message, ContextTypes.DEFAULT_TYPE], Awaitable[Any]]
+StartCheck = Callable[[List[Message]], bool]
+
+# Сколько последних замеров хранить для статистики
+STATS_WINDOW = 1000
+
+GROUP_SIZE = get_metrics().histogram(
+    "media_group_size", "Messages per media group", buckets=range(1, 11)
+)
+GROUP_WAIT_SECONDS = get_metrics().histogram(
+    "media_group_wait_seconds",
+    "Time from the first item of a media group to its flush",
+    buckets=(0.25, 0.5, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0, 7.5, 10.0),
+)
+
+
+def _percentile(values: Deque[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class MediaGroupAggregator:
+    """
+    Сборщик медиа групп с адаптивным ожиданием.
+
+    Группа отправляется, когда после последнего сообщения прошла пауза
+    тишины, но не позже max_wait от первого сообщения. Пауза подстраивается
+    под наблюдаемые интервалы между сообщениями групп. У каждой группы своя
+    задача ожидания, общей блокировки нет.
+
+    Если задан on_item, обработка каждого сообщения запускается сразу при
+    его поступлении, а не после сборки группы. Если задан may_start, она
+    откладывается, пока may_start не разрешит ее по уже пришедшим
+    сообщениям группы. Когда группа собрана, выставляется
+    MediaGroup.complete и вызывается on_flush, если он задан.
+    """
+
+    def __init__(
+        self,
+        on_flush: Optional[FlushCallback],
+        config: MediaGroupConfig,
+        on_item: Optional[ItemCallback] = None,
+        may_start: Optional[StartCheck] = None,
+    ) -> None:
+        self.on_flush = on_flush
+        self.on_item = on_item
+        self.may_start = may_start
+        self.config = config
+        self.logger = get_logger(__name__)
+        self._groups: Dict[str, MediaGroup] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._gaps: Deque[float] = deque(maxlen=STATS_WINDOW)
+        self._latencies: Deque[float] = deque(maxlen=STATS_WINDOW)
+
+    @property
+    def quiet_period(self) -> float:
+        """Текущая пауза тишины перед отправкой"""
+        if len(self._gaps) < 10:
+            return self.config.quiet_period
+        # С запасом относительно медленных, но нормальных интервалов
+        quiet = 2 * _percentile(self._gaps, 95)
+        return min(
+            max(quiet, self.config.min_quiet_period), self.config.max_quiet_period
+        )
+
+    @property
+    def pending(self) -> int:
+        """Количество групп, ожидающих отправки"""
+        return len(self._groups)
+
+    def __contains__(self, group_id: str) -> bool:
+        return group_id in self._groups
+
+    def add(self, msg: Message, context: ContextTypes.DEFAULT_TYPE) -> MediaGroup:
+        """Добавляет сообщение в его медиа группу
+
+        Args:
+            msg (Message): Сообщение с media_group_id
+            context (ContextTypes.DEFAULT_TYPE): Контекст обновления
+
+        Returns:
+            MediaGroup: Группа, в которую попало сообщение
+        """
+        now = asyncio.get_running_loop().time()
+        group_id = msg.media_group_id
+        group = self._groups.get(group_id)
+        if group is None:
+            group = MediaGroup(first_seen=now, last_seen=now)
+            self._groups[group_id] = group
+            task = asyncio.create_task(self._flush_when_ready(group_id, context))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        elif msg.message_id not in group.ids:
+            self._gaps.append(now - group.last_seen)
+
+        if msg.message_id not in group.ids:
+            group.messages.append(msg)
+            group.ids.add(msg.message_id)
+            group.last_seen = now
+            if (
+                self.on_item is not None
+                and not group.discarded
+                and (self.may_start is None or self.may_start(group.messages))
+            ):
+                # Скачивание начинается, пока группа еще собирается.
+                # Отложенные ранее сообщения запускаются вместе с этим
+                for message in group.messages:
+                    if message.message_id not in group.tasks:
+                        group.tasks[message.message_id] = asyncio.create_task(
+                            self.on_item(message, context)
+                        )
+        return group
+
+    async def _flush_when_ready(
+        self, group_id: str, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """Ждет тишины в группе и отправляет ее"""
+        loop = asyncio.get_running_loop()
+        group = self._groups[group_id]
+        while not group.flush_now.is_set():
+            deadline = min(
+                group.last_seen + self.quiet_period,
+                group.first_seen + self.config.max_wait,
+            )
+            delay = deadline - loop.time()
+            if delay <= 0:
+                break
+            try:
+                await asyncio.wait_for(group.flush_now.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+        self._groups.pop(group_id, None)
+        latency = loop.time() - group.first_seen
+        self._latencies.append(latency)
+        GROUP_SIZE.observe(len(group.messages))
+        GROUP_WAIT_SECONDS.observe(latency)
+        self.logger.info(
+            "Media group complete",
+            extra={
+                "media_group_id": group_id,
+                "size": len(group.messages),
+                "latency": round(latency, 3),
+                **self.latency_stats(),
+            },
+        )
+
+        # Порядок сообщений в альбоме соответствует их ID
+        group.messages.sort(key=lambda message: message.message_id)
+        group.complete.set()
+        if self.on_flush is None:
+            return
+        try:
+            await self.on_flush(group, context)
+        except asyncio.CancelledError:
+            for task in group.tasks.values():
+                task.cancel()
+            raise
+        except Exception as e:
+            self.logger.error(
+                f"Error sending media group: {e}",
+                extra={"media_group_id": group_id},
+            )
+
+    def latency_stats(self) -> Dict[str, Any]:
+        """Медиана и p99 задержки сборки групп
+
+        Returns:
+            Dict[str, Any]: Статистика в секундах
+        """
+        return {
+            "groups": len(self._latencies),
+            "latency_p50": round(_percentile(self._latencies, 50), 3),
+            "latency_p99": round(_percentile(self._latencies, 99), 3),
+            "quiet_period": round(self.quiet_period, 3),
+        }
+
+    async def shutdown(self, timeout: Optional[float] = None) -> None:
+        """Отправляет ожидающие группы без паузы и ждет их завершения
+
+        Args:
+            timeout (Optional[float]): Сколько ждать, затем задачи отменяются
+        """
+        timeout = self.config.shutdown_timeout if timeout is None else timeout
+        for group in self._groups.values():
+            group.flush_now.set()
+
+        tasks = list(self._tasks)
+        if not tasks:
+            return
+        self.logger.info(f"Draining {len(tasks)} media groups")
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
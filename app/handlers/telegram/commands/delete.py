@@ -0,0 +1,73 @@
+import re
+import logging
+from typing import Optional, Tuple
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes
+
+from app.config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+# Ссылка на пост: t.me/c/<id>/<message_id> или t.me/<username>/<message_id>
+POST_LINK = re.compile(r"t\.me/(?:c/(?P<id>\d+)|(?P<username>\w+))/(?P<message>\d+)")
+
+USAGE = "Использование: /delete <ссылка на пост> или /delete <chat_id> <message_id>"
+
+
+async def delete(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Удаляет пост из Discord.
+
+    Bot API не сообщает об удалении постов канала, поэтому удаление
+    выполняется командой администратора.
+    """
+    user = update.effective_user
+    if user is None or user.id not in get_settings().telegram.admin_ids:
+        return
+
+    target = await _parse_target(context)
+    if target is None:
+        await update.message.reply_text(USAGE)
+        return
+
+    chat_id, message_id = target
+    media_handler = context.bot_data["media_handler"]
+    result = await media_handler.delete_post(chat_id, message_id)
+    if result == "deleted":
+        await update.message.reply_text("Пост удален из Discord")
+        logger.info(
+            "Post deleted by admin",
+            extra={"chat_id": chat_id, "message_id": message_id, "user_id": user.id},
+        )
+    elif result == "failed":
+        await update.message.reply_text(
+            "Пост удален не во всех вебхуках, повторите команду позже"
+        )
+    else:
+        await update.message.reply_text("Пост не найден в индексе сообщений")
+
+
+async def _parse_target(
+    context: ContextTypes.DEFAULT_TYPE,
+) -> Optional[Tuple[int, int]]:
+    """Канал и ID сообщения из аргументов команды"""
+    args = context.args or []
+    if len(args) == 2 and all(re.fullmatch(r"-?\d+", arg) for arg in args):
+        return int(args[0]), int(args[1])
+    if len(args) != 1:
+        return None
+
+    match = POST_LINK.search(args[0])
+    if match is None:
+        return None
+    message_id = int(match["message"])
+    if match["id"]:
+        # Ссылки на приватные каналы содержат ID без префикса -100
+        return int(f"-100{match['id']}"), message_id
+    try:
+        chat = await context.bot.get_chat(f"@{match['username']}")
+    except TelegramError:
+        return None
+    return chat.id, message_id
@@ -1,19 +1,32 @@
-import io
 import asyncio
-from collections import defaultdict
-from typing import List, Tuple, Optional
+from typing import Awaitable, Callable, Dict, List, Literal, Optional, Set, Tuple
 
 
 from telegram import Update, Message, MessageOriginChannel, MessageOriginUser
 from telegram.ext import ContextTypes
-from discord import File
 
 from app.services.discord import DiscordService
+from app.services.delivery_queue import DeliveryQueue
+from app.services.dedup_index import MEDIA_FIELDS, DedupIndex, fingerprint_post
+from app.services.ingest_queue import IngestQueue
 from app.services.media_service import MediaService
+from app.services.message_index import PostRef
 from app.models.media_group import MediaGroup
+from app.handlers.media_group_aggregator import MediaGroupAggregator
+from app.handlers.channel_dispatcher import ChannelDispatcher, ChannelJob
 from app.utils.logging import get_logger
+from app.utils.metrics import get_metrics
 
-from app.config import get_settings, Settings
+from app.config import Settings
+
+UPDATES = get_metrics().counter(
+    "telegram_updates_total", "Channel posts received from Telegram", ["kind"]
+)
+ROUTED_POSTS = get_metrics().counter(
+    "routed_posts_total",
+    "Routing decisions by matched route, 'unrouted' when nothing matched",
+    ["route"],
+)
 
 
 class TelegramMediaHandler:
@@ -22,13 +35,28 @@ class TelegramMediaHandler:
         media_service: MediaService,
         discord_service: DiscordService,
         settings: Settings,
+        delivery_queue: Optional[DeliveryQueue] = None,
+        ingest_queue: Optional[IngestQueue] = None,
+        dedup: Optional[DedupIndex] = None,
     ) -> None:
-        self.media_groups: dict[str, MediaGroup] = {}
         self.media_service = media_service
         self.discord = discord_service
         self.settings = settings
+        self.delivery_queue = delivery_queue
+        self.ingest_queue = ingest_queue
+        self.dedup = dedup
+        # Группа отправляется из очереди своего канала, когда будет собрана.
+        # Если посты обрабатывают отдельные процессы, медиа здесь не скачиваются
+        self.aggregator = MediaGroupAggregator(
+            None,
+            settings.media_group,
+            on_item=None if ingest_queue else self.media_service.build_payloads,
+            may_start=self._is_routed,
+        )
+        self.dispatcher = ChannelDispatcher(settings.dispatcher)
+        # Последняя отброшенная группа канала, чтобы учесть группу один раз
+        self._dropped_groups: Dict[int, str] = {}
 
-        self.lock = asyncio.Lock()
         self.logger = get_logger(__name__)
 
     async def handle_message(
@@ -36,18 +64,34 @@ class TelegramMediaHandler:
     ) -> None:
         """Обработка сообщения от Telegram
 
+        Пост ставится в очередь своего канала, а обработка и отправка идут
+        в фоне, чтобы не задерживать обновления других каналов.
+
         Args:
             update (Update): Обновление от Telegram
             context (ContextTypes.DEFAULT_TYPE): Контекст обновления
         """
         msg: Message = update.effective_message
+        UPDATES.inc(kind="media_group" if msg.media_group_id else "single")
         try:
             if msg.media_group_id:
                 self.logger.info("Processing media group")
                 await self._handle_media_group(msg, context)
             else:
+                # Пост без маршрута не скачивается и не ставится в очередь
+                webhooks = self._route([msg])
+                if webhooks == []:
+                    return
                 self.logger.info("Processing single message")
-                await self._process_and_send([msg], context)
+                await self.dispatcher.submit(
+                    msg.chat.id,
+                    ChannelJob(
+                        run=lambda: self.process_post(
+                            [msg], context, webhooks=webhooks
+                        ),
+                        label=f"message {msg.message_id}",
+                    ),
+                )
         except Exception as e:
             self.logger.error(
                 f"Error processing message: {e}",
@@ -69,31 +113,247 @@ class TelegramMediaHandler:
             context (ContextTypes.DEFAULT_TYPE): Контекст обновления
 
         """
-        async with self.lock:
-            group_id = msg.media_group_id
-            group = self.media_groups.setdefault(group_id, MediaGroup())
-            if msg.message_id in group.ids:
-                return
-            group.messages.append(msg)
-            group.ids.add(msg.message_id)
-            if len(group.messages) == 1:
-                asyncio.create_task(self._schedule_flush(group_id, context))
+        is_new = msg.media_group_id not in self.aggregator
+        if is_new and not self._may_route(msg.chat.id):
+            # Подпись и остальные элементы группы еще не пришли, поэтому
+            # заранее отбрасываются только группы каналов без маршрутов
+            if self._dropped_groups.get(msg.chat.id) != msg.media_group_id:
+                self._dropped_groups[msg.chat.id] = msg.media_group_id
+                ROUTED_POSTS.inc(route="unrouted")
+            return
+        group = self.aggregator.add(msg, context)
+        if not is_new:
+            return
+
+        # Место в очереди канала занимает первое сообщение группы
+        await self.dispatcher.submit(
+            msg.chat.id,
+            ChannelJob(
+                run=lambda: self.process_post(group.messages, context, group.tasks),
+                ready=group.complete,
+                on_drop=lambda: self._discard_group(group),
+                label=f"media group {msg.media_group_id}",
+            ),
+        )
+
+    def _may_route(self, chat_id: int) -> bool:
+        routing = self.settings.routing
+        return not routing.enabled or routing.has_routes(chat_id)
+
+    def _is_routed(self, messages: List[Message]) -> bool:
+        """Подходит ли уже известная часть поста хотя бы одному маршруту
+
+        Новые элементы группы только добавляют типы медиа, поэтому пост,
+        подошедший маршруту, уже не перестанет ему подходить. Медиа группы
+        скачиваются только после этого.
+
+        Args:
+            messages (List[Message]): Пришедшие сообщения поста
+
+        Returns:
+            bool: Есть подходящий маршрут или маршруты не заданы
+        """
+        routing = self.settings.routing
+        if not routing.enabled:
+            return True
+        media_types, text = _post_features(messages)
+        return bool(routing.match(messages[0].chat.id, media_types, text))
+
+    def _route(self, messages: List[Message]) -> Optional[List[str]]:
+        """Выбирает вебхуки поста по таблице маршрутов
 
-    async def _schedule_flush(
-        self, group_id: str, context: ContextTypes.DEFAULT_TYPE
+        Args:
+            messages (List[Message]): Сообщения поста
+
+        Returns:
+            Optional[List[str]]: Имена вебхуков в порядке настроек, пустой
+                список, если маршрута нет, None — маршруты не заданы
+        """
+        routing = self.settings.routing
+        if not routing.enabled:
+            return None
+
+        media_types, text = _post_features(messages)
+        routes = routing.match(messages[0].chat.id, media_types, text)
+        if not routes:
+            ROUTED_POSTS.inc(route="unrouted")
+            self.logger.debug(
+                "Post matches no route", extra={"chat_id": messages[0].chat.id}
+            )
+            return []
+
+        targets = set()
+        for route in routes:
+            ROUTED_POSTS.inc(route=route.name)
+            targets.update(route.webhooks)
+        return [
+            hook.name for hook in self.settings.discord.webhooks if hook.name in targets
+        ]
+
+    def start_post(
+        self, messages: List[Message], context: ContextTypes.DEFAULT_TYPE
+    ) -> Optional[Callable[[], Awaitable[None]]]:
+        """Выбирает вебхуки поста и сразу запускает обработку его медиа
+
+        Нужен, когда посты известны заранее (отставание после простоя):
+        медиа нескольких постов готовятся параллельно, а отправка
+        выполняется позже в нужном порядке.
+
+        Args:
+            messages (List[Message]): Сообщения поста
+            context (ContextTypes.DEFAULT_TYPE): Контекст обновления
+
+        Returns:
+            Optional[Callable[[], Awaitable[None]]]: Отправка поста или None,
+                если у поста нет маршрута
+        """
+        webhooks = self._route(messages)
+        if webhooks == []:
+            return None
+        started = None
+        if self.ingest_queue is None:
+            started = {
+                message.message_id: asyncio.create_task(
+                    self.media_service.build_payloads(message, context)
+                )
+                for message in messages
+            }
+        return lambda: self.process_post(messages, context, started, webhooks)
+
+    def _discard_group(self, group: MediaGroup) -> None:
+        """Останавливает обработку медиа группы, которая не будет отправлена
+
+        Группа может еще собираться: новые элементы уже не скачиваются.
+        """
+        group.discarded = True
+        self._discard_started(group.tasks, cancel=True)
+
+    @staticmethod
+    def _discard_started(
+        started: Optional[Dict[int, asyncio.Task]], cancel: bool = False
     ) -> None:
-        """Запланировать отправку группы медиа
+        """Удаляет файлы уже запущенной обработки медиа
 
         Args:
-            group_id (str): ID группы медиа
+            started (Optional[Dict[int, asyncio.Task]]): Обработка по ID сообщения
+            cancel (bool): Прервать незавершенную обработку
+        """
+
+        def cleanup(task: asyncio.Task) -> None:
+            if not task.cancelled() and task.exception() is None:
+                for payload in task.result():
+                    payload.cleanup()
+
+        for task in (started or {}).values():
+            task.add_done_callback(cleanup)
+            if cancel:
+                task.cancel()
+
+    async def shutdown(self) -> None:
+        """Дожидается сборки групп медиа и обработки очередей каналов"""
+        await self.aggregator.shutdown()
+        await self.dispatcher.shutdown()
+
+    async def handle_edit(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """Обработка правки поста канала
+
+        Правка идет через очередь канала, поэтому применяется после
+        отправки самого поста. Пока правка ждет доставки поста, следующие
+        посты канала ждут за ней.
+
+        Args:
+            update (Update): Обновление от Telegram
             context (ContextTypes.DEFAULT_TYPE): Контекст обновления
         """
-        await asyncio.sleep(5)
-        async with self.lock:
-            group = self.media_groups.pop(group_id, [])
+        msg: Message = update.edited_channel_post
+        UPDATES.inc(kind="edit")
+        await self.dispatcher.submit(
+            msg.chat.id,
+            ChannelJob(
+                run=lambda: self.edit_post(msg),
+                label=f"edit {msg.message_id}",
+            ),
+        )
+
+    async def edit_post(self, msg: Message) -> None:
+        """Меняет текст отправленного поста без повторной загрузки медиа
+
+        Пост в индексе появляется только после доставки, поэтому сначала
+        дожидается, пока процессы обработки и очередь доставки не отправят
+        посты канала.
 
-        if group:
-            await self._process_and_send(group.messages, context)
+        Args:
+            msg (Message): Измененное сообщение
+        """
+        index = self.discord.message_index
+        if index is None:
+            return
+
+        if self.ingest_queue is not None:
+            await self.ingest_queue.wait_chat(msg.chat.id)
+        if self.delivery_queue is not None:
+            await self.delivery_queue.wait_chat(msg.chat.id)
+
+        key = PostRef.from_messages([msg], "").key
+        post = await index.get(msg.chat.id, key)
+        if post is None:
+            self.logger.info(
+                "Edited post is not in the message index",
+                extra={"chat_id": msg.chat.id, "message_id": msg.message_id},
+            )
+            return
+        if post.ref.source_id != msg.message_id:
+            # Текст группы берется из первого сообщения, правки остальных не видны
+            return
+
+        content = self._compose_content(msg)
+        if content == post.ref.caption:
+            # Поменялось только медиа: его нельзя заменить без повторной загрузки
+            self.logger.info(
+                "Post edit does not change the text",
+                extra={"chat_id": msg.chat.id, "message_id": msg.message_id},
+            )
+            return
+
+        self.logger.info(
+            "Editing post in Discord",
+            extra={"chat_id": msg.chat.id, "webhooks": len(post.deliveries)},
+        )
+        await self.discord.edit_post(post, content)
+
+    async def delete_post(
+        self, chat_id: int, message_id: int
+    ) -> Literal["deleted", "failed", "not_found"]:
+        """Удаляет отправленный пост из Discord
+
+        Args:
+            chat_id (int): ID канала
+            message_id (int): ID первого сообщения поста
+
+        Returns:
+            Literal["deleted", "failed", "not_found"]: deleted — пост удален,
+                failed — удалить удалось не во всех вебхуках, not_found — поста
+                нет в индексе сообщений
+        """
+        index = self.discord.message_index
+        if index is None:
+            return "not_found"
+        post = await index.find(chat_id, message_id)
+        if post is None:
+            return "not_found"
+        if not await self.discord.delete_post(post):
+            return "failed"
+        return "deleted"
+
+    def _compose_content(self, msg: Message) -> str:
+        """Текст поста для Discord: подпись и ссылка на источник репоста"""
+        forward = self._compose_forward_text(msg)
+        content = (msg.caption or msg.text or "").strip()
+        if forward:
+            content = f"{forward}\n\n{content}"
+        return content
 
     def _compose_forward_text(self, msg: Message) -> Optional[str]:
         origin = msg.forward_origin
@@ -129,21 +389,150 @@ class TelegramMediaHandler:
         # Какой-то редкий случай
         return None
 
-    async def _process_and_send(
-        self, messages: List[Message], context: ContextTypes.DEFAULT_TYPE
+    async def process_post(
+        self,
+        messages: List[Message],
+        context: ContextTypes.DEFAULT_TYPE,
+        started: Optional[Dict[int, asyncio.Task]] = None,
+        webhooks: Optional[List[str]] = None,
     ) -> None:
-        """Обработка и отправка сообщений"""
+        """Обработка и отправка сообщений
+
+        Если задана ingest_queue, пост только передается процессам обработки.
+        Если задан индекс dedup, повторы поста внутри окна пропускаются.
+
+        Args:
+            messages (List[Message]): Сообщения поста
+            context (ContextTypes.DEFAULT_TYPE): Контекст обновления
+            started (Optional[Dict[int, asyncio.Task]]): Уже запущенная
+                обработка медиа по ID сообщения
+            webhooks (Optional[List[str]]): Уже выбранные вебхуки, иначе
+                выбираются по таблице маршрутов
+        """
+        if webhooks is None:
+            webhooks = self._route(messages)
+        if webhooks == []:
+            self._discard_started(started)
+            return
+
+        fingerprint = None
+        if self.dedup is not None:
+            fingerprint = fingerprint_post(
+                messages, webhooks, cross_channel=self.settings.dedup.cross_channel
+            )
+        if fingerprint is None:
+            await self._process_post(messages, context, started, webhooks=webhooks)
+            return
 
+        result = await self.dedup.claim(fingerprint)
+        if result == "duplicate":
+            self.logger.info(
+                "Skipping repeated post",
+                extra={"chat_id": messages[0].chat.id, "messages": len(messages)},
+            )
+            self._discard_started(started)
+            return
+
+        # Медиа недавно отправлялось: отправляется только новый текст
+        text_only = (
+            result == "media_duplicate" and self.settings.dedup.policy == "coalesce"
+        )
+        if text_only:
+            self.logger.info(
+                "Coalescing post with repeated media",
+                extra={"chat_id": messages[0].chat.id},
+            )
+            self._discard_started(started)
+            started = None
+        try:
+            await self._process_post(messages, context, started, webhooks, text_only)
+        except Exception:
+            # Пост не обработан, поэтому его повтор не должен быть отброшен
+            await self.dedup.release(fingerprint)
+            raise
+
+    async def _process_post(
+        self,
+        messages: List[Message],
+        context: ContextTypes.DEFAULT_TYPE,
+        started: Optional[Dict[int, asyncio.Task]] = None,
+        webhooks: Optional[List[str]] = None,
+        text_only: bool = False,
+    ) -> None:
         first_msg: Message = messages[0]
-        forward = self._compose_forward_text(first_msg)
-        content = (first_msg.caption or first_msg.text or "").strip()
+        if self.ingest_queue is not None:
+            data = [message.to_dict() for message in messages]
+            if text_only:
+                for item in data:
+                    for attr in MEDIA_FIELDS:
+                        item.pop(attr, None)
+            await self.ingest_queue.put(first_msg.chat.id, data, webhooks)
+            return
 
-        if forward:
-            content = f"{forward}\n\n{content}"
+        content = self._compose_content(first_msg)
+        post = PostRef.from_messages(messages, content)
 
+        # Медиа всех сообщений группы скачиваются параллельно
         payloads = []
-        for msg in messages:
-            payloads.extend(await self.media_service.build_payloads(msg, context))
+        if not text_only:
+            payloads = await self.media_service.build_group_payloads(
+                messages, context, started
+            )
+
+        if not content and not payloads:
+            self.logger.warning("No content or files to send to Discord")
+            return
+
+        try:
+            if self.delivery_queue is not None:
+                # Доставка идет в фоне, обработка обновления на этом заканчивается
+                await self.delivery_queue.enqueue(
+                    content,
+                    payloads,
+                    webhooks=webhooks,
+                    origin_time=first_msg.date.timestamp(),
+                    post=post,
+                    chat_id=first_msg.chat.id,
+                )
+                return
+
+            self.logger.info(
+                "Sending to Discord",
+                extra={
+                    "files": len(payloads),
+                    "bytes": sum(payload.size for payload in payloads),
+                },
+            )
+            await self.discord.send(
+                content,
+                payloads,
+                origin_time=first_msg.date.timestamp(),
+                webhooks=webhooks,
+                post=post,
+            )
+        finally:
+            for payload in payloads:
+                payload.cleanup()
+
+
+def _post_features(messages: List[Message]) -> Tuple[Set[str], str]:
+    """Типы медиа и текст поста для таблицы маршрутов
+
+    Args:
+        messages (List[Message]): Сообщения поста
 
-        self.logger.info("Sending to Discord", extra={"payloads": payloads})
-        await self.discord.send(content, payloads)
+    Returns:
+        Tuple[Set[str], str]: Типы медиа (text, если медиа нет) и подпись
+    """
+    media_types = {
+        attr for message in messages for attr in MEDIA_FIELDS if getattr(message, attr)
+    } or {"text"}
+    text = next(
+        (
+            message.caption or message.text
+            for message in messages
+            if message.caption or message.text
+        ),
+        "",
+    )
+    return media_types, text
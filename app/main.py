@@ -4,15 +4,26 @@ from telegram.ext import (
     MessageHandler,
 )
 import os
+import asyncio
 
 
 from app.services.telegram import TelegramService
-from app.handlers.telegram.commands import test
+from app.handlers.telegram.commands import delete, test
 from app.handlers.telegram_media_handler import TelegramMediaHandler
 
 from app.utils.logging import setup_logget, get_logger
 from app.services.media_service import MediaService
+from app.services.media_cache import MediaCache
 from app.services.discord import DiscordService
+from app.services.delivery_queue import DeliveryQueue
+from app.services.ingest_queue import IngestQueue
+from app.services.dedup_index import DedupIndex
+from app.services.message_index import MessageIndex
+from app.services.catch_up import CatchUp
+from app.services.worker_supervisor import WorkerSupervisor
+from app.services.metrics_server import MetricsServer
+from app.utils.file_utils import close_http_client
+from app.utils.ffmpeg_pool import close_ffmpeg_pool
 from app.config import get_settings
 
 
@@ -34,19 +45,99 @@ def main() -> None:
 
     application.add_handler(CommandHandler("test", test.test))
 
+    settings = get_settings()
+
+    if settings.metrics.enabled:
+        metrics_server = MetricsServer(settings.metrics)
+        telegram_service.add_startup_callback(metrics_server.start)
+        telegram_service.add_shutdown_callback(metrics_server.stop)
+
+    # Соответствие постов сообщениям Discord для правок и удалений
+    message_index = None
+    if settings.edits.enabled:
+        message_index = MessageIndex(settings)
+        telegram_service.add_shutdown_callback(
+            lambda: asyncio.to_thread(message_index.close)
+        )
+
+    discord_service = DiscordService(message_index=message_index)
+    telegram_service.add_shutdown_callback(discord_service.close)
+    telegram_service.add_shutdown_callback(close_http_client)
+    telegram_service.add_shutdown_callback(close_ffmpeg_pool)
+
+    # Очередь доставки между обработкой и отправкой в Discord. Процессы
+    # обработки ставят в нее задачи, а доставляет только этот процесс
+    delivery_queue = None
+    if settings.queue.enabled:
+        delivery_queue = DeliveryQueue(
+            discord_service,
+            settings,
+            poll_interval=(
+                settings.workers.poll_interval if settings.workers.count else None
+            ),
+        )
+        telegram_service.add_startup_callback(delivery_queue.start)
+        telegram_service.add_shutdown_callback(delivery_queue.stop)
+
+    # Кэш скачанных и сконвертированных медиа. Если медиа обрабатывают
+    # отдельные процессы, кэш у каждого из них свой
+    media_cache = None
+    if not settings.workers.count:
+        media_cache = MediaCache(
+            settings.general.temp_dir / "cache", settings.general.cache_max_bytes
+        )
+
+    # Обработка постов в отдельных процессах
+    ingest_queue = None
+    if settings.workers.count:
+        ingest_queue = IngestQueue(settings)
+        supervisor = WorkerSupervisor(settings.workers)
+        telegram_service.add_startup_callback(supervisor.start)
+        telegram_service.add_shutdown_callback(supervisor.stop)
+
+    # Отсев повторных постов до скачивания и отправки
+    dedup = None
+    if settings.dedup.enabled:
+        dedup = DedupIndex(settings)
+        telegram_service.add_shutdown_callback(lambda: asyncio.to_thread(dedup.close))
+
     # Инициализация обработчика медиа
     media_handler = TelegramMediaHandler(
-        media_service=MediaService(),
-        discord_service=DiscordService(),
-        settings=get_settings(),
+        media_service=MediaService(cache=media_cache),
+        discord_service=discord_service,
+        settings=settings,
+        delivery_queue=delivery_queue,
+        ingest_queue=ingest_queue,
+        dedup=dedup,
     )
 
+    # Собираемые группы медиа отправляются до остановки очереди и сессий
+    telegram_service.add_shutdown_callback(media_handler.shutdown)
+
+    # Отставание после простоя забирается до обычного приема и отправляется
+    # в фоне. Регистрируется последним: очереди и процессы обработки уже
+    # запущены. Пока оно отправляется, новые посты его каналов ждут за ним
+    receiver = media_handler
+    if settings.catch_up.enabled:
+        catch_up = CatchUp(media_handler, settings)
+        telegram_service.add_startup_callback(lambda: catch_up.start(application))
+        telegram_service.add_shutdown_callback(catch_up.stop)
+        receiver = catch_up
+
+    if message_index is not None:
+        application.bot_data["media_handler"] = media_handler
+        application.add_handler(CommandHandler("delete", delete.delete))
+        # Правки обрабатываются раньше общего обработчика, иначе пост уйдет заново
+        application.add_handler(
+            MessageHandler(filters.UpdateType.EDITED_CHANNEL_POST, receiver.handle_edit)
+        )
+
     # следить только за постами на канале
     application.add_handler(
-        MessageHandler(filters.ChatType.CHANNEL, media_handler.handle_message)
+        MessageHandler(filters.ChatType.CHANNEL, receiver.handle_message)
     )
 
-    application.run_polling()
+    telegram_service.run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,18 @@
+from dataclasses import dataclass, field
+from typing import List
+
+from app.models.file_payload import FilePayload
+
+
+@dataclass
+class DiscordMessage:
+    """
+    Одно сообщение вебхука после разбиения поста
+
+    Attributes:
+        content (str): Текст сообщения
+        files (List[FilePayload]): Вложения
+    """
+
+    content: str = ""
+    files: List[FilePayload] = field(default_factory=list)
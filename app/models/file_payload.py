@@ -1,4 +1,7 @@
+import io
+from pathlib import Path
 from dataclasses import dataclass
+from typing import BinaryIO, Optional, Union
 
 
 @dataclass
@@ -6,10 +9,62 @@ class FilePayload:
     """
     Носитель файла для отправки в дискорд
 
+    Файл хранится либо в памяти (data), либо на диске (path). Файлы на
+    диске отправляются потоком и не загружаются в память целиком.
+
     Attributes:
-        data (str): Сырые данные файла
+        data (Optional[bytes]): Сырые данные файла
         filename (str): Имя файла
+        path (Optional[Path]): Путь к файлу на диске
+        temporary (bool): Файл на диске принадлежит payload и удаляется в cleanup
     """
 
-    data: bytes
+    data: Optional[Union[bytes, bytearray]]
     filename: str
+    path: Optional[Path] = None
+    temporary: bool = False
+
+    @classmethod
+    def from_path(
+        cls, path: Path, filename: Optional[str] = None, temporary: bool = False
+    ) -> "FilePayload":
+        """Создает payload для файла на диске
+
+        Args:
+            path (Path): Путь к файлу
+            filename (Optional[str]): Имя файла для Discord, по умолчанию имя на диске
+            temporary (bool): Удалить файл в cleanup
+
+        Returns:
+            FilePayload: Payload файла
+        """
+        return cls(
+            data=None,
+            filename=filename or path.name,
+            path=Path(path),
+            temporary=temporary,
+        )
+
+    @property
+    def size(self) -> int:
+        """Размер файла в байтах"""
+        if self.data is not None:
+            return len(self.data)
+        return self.path.stat().st_size
+
+    def open(self) -> BinaryIO:
+        """Открывает файл для чтения потоком"""
+        if self.data is not None:
+            return io.BytesIO(self.data)
+        return self.path.open("rb")
+
+    def read_bytes(self) -> bytes:
+        """Читает файл целиком"""
+        if self.data is not None:
+            return bytes(self.data)
+        return self.path.read_bytes()
+
+    def cleanup(self) -> None:
+        """Удаляет временный файл с диска"""
+        if self.temporary and self.path is not None:
+            self.path.unlink(missing_ok=True)
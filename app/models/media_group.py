@@ -1,4 +1,5 @@
-from typing import List, Set
+import asyncio
+from typing import Dict, List, Set
 from dataclasses import dataclass, field
 
 from telegram import Message
@@ -12,7 +13,20 @@ class MediaGroup:
     Attributes:
         ids (Set[int]): Набор айдишников сообщений
         messages (List[Message]): Список сообщений
+        first_seen (float): Время прихода первого сообщения (часы цикла событий)
+        last_seen (float): Время прихода последнего сообщения
+        flush_now (asyncio.Event): Сигнал отправить группу без ожидания
+        tasks (Dict[int, asyncio.Task]): Запущенная обработка медиа по ID сообщения
+        complete (asyncio.Event): Группа собрана, новых сообщений не будет
+        discarded (bool): Группа не будет отправлена, новые элементы не
+            скачиваются
     """
 
     ids: Set[int] = field(default_factory=set)
     messages: List[Message] = field(default_factory=list)
+    first_seen: float = 0.0
+    last_seen: float = 0.0
+    flush_now: asyncio.Event = field(default_factory=asyncio.Event)
+    tasks: Dict[int, asyncio.Task] = field(default_factory=dict)
+    complete: asyncio.Event = field(default_factory=asyncio.Event)
+    discarded: bool = False
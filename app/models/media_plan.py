@@ -0,0 +1,28 @@
+from dataclasses import dataclass
+from typing import Any, Literal, Optional
+
+
+PlanAction = Literal["send", "fit", "convert", "skip"]
+
+
+@dataclass
+class MediaPlan:
+    """
+    Решение по одному вложению сообщения, принятое до скачивания
+
+    Attributes:
+        kind (str): Тип медиа (photo, video, animation, sticker)
+        media (Any): Выбранный объект Telegram (PhotoSize, Video, Animation,
+            Sticker)
+        ext (str): Расширение файла для Discord
+        action (PlanAction): send — отправить как есть, fit — пережать под
+            лимит Discord, convert — сконвертировать в GIF или отрендерить
+            стикер, skip — пропустить
+        reason (Optional[str]): Причина пропуска
+    """
+
+    kind: str
+    media: Any
+    ext: str
+    action: PlanAction
+    reason: Optional[str] = None
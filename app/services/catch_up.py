@@ -0,0 +1,527 @@
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from telegram import Message, Update
+from telegram.error import TelegramError
+from telegram.ext import Application, CallbackContext, ContextTypes
+
+from app.config import Settings
+from app.handlers.telegram_media_handler import TelegramMediaHandler
+from app.services.message_index import PostRef
+from app.utils.logging import get_logger
+from app.utils.metrics import get_metrics
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    post TEXT NOT NULL,
+    update_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    spooled_at REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (chat_id, message_id, kind)
+);
+CREATE INDEX IF NOT EXISTS messages_post ON messages (kind, chat_id, post);
+"""
+
+CATCH_UP_UPDATES = get_metrics().counter(
+    "catch_up_updates_total", "Backlog updates read at startup by outcome", ["result"]
+)
+CATCH_UP_POSTS = get_metrics().counter(
+    "catch_up_posts_total",
+    "Backlog posts and edits processed in catch-up mode",
+    ["kind", "result"],
+)
+
+# Задача очереди канала: ID канала и обработка
+LaneJob = Tuple[int, Callable[[], Awaitable[None]]]
+
+
+class CatchUp:
+    """
+    Догоняющая обработка обновлений, накопившихся за время простоя.
+
+    При запуске, до обычного приема обновлений, бот проверяет число
+    ожидающих обновлений. Если их не меньше min_backlog, они забираются
+    страницами getUpdates в SQLite, сгруппированными по каналам и медиа
+    группам, и подтверждаются в Telegram. Память не растет с размером
+    отставания: в ней только одна страница и один пакет постов.
+
+    Посты отправляются в фоне, уже при обычном приеме обновлений, пакетами:
+    медиа всего пакета готовятся параллельно, а отправка идет по порядку
+    внутри канала, для разных каналов одновременно. Новые посты каналов с
+    отставанием, пока оно не отправлено, тоже пишутся в хранилище, чтобы
+    не обогнать его. Остальные каналы обрабатываются как обычно.
+
+    Неудачный пост повторяется с экспоненциальной задержкой, пока не
+    кончатся max_attempts. Обработанный пост удаляется из хранилища,
+    поэтому после перезапуска обработка продолжается с того же места.
+    """
+
+    def __init__(self, handler: TelegramMediaHandler, settings: Settings) -> None:
+        self.handler = handler
+        self.settings = settings
+        self.config = settings.catch_up
+        self.root = Path(self.config.path or settings.general.temp_dir / "catch_up")
+        self.logger = get_logger(__name__)
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Каналы, новые посты которых ждут отправки отставания
+        self._held: Set[int] = set()
+        self._held_lock = asyncio.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(
+                self.root / "backlog.db",
+                check_same_thread=False,
+                isolation_level=None,
+                timeout=30,
+            )
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+            columns = {
+                row[1] for row in self._db.execute("PRAGMA table_info(messages)")
+            }
+            if "spooled_at" not in columns:
+                # База предыдущей версии
+                self._db.execute(
+                    "ALTER TABLE messages ADD COLUMN spooled_at REAL NOT NULL DEFAULT 0"
+                )
+        return self._db
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[Any]:
+        with self._db_lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    async def start(self, application: Application) -> None:
+        """Забирает отставание и запускает его обработку в фоне
+
+        Забор идет до обычного приема обновлений: getUpdates нельзя вызывать
+        одновременно с ним. Отправка постов прием уже не задерживает.
+
+        Args:
+            application (Application): Приложение бота, еще не принимающее
+                обновления
+        """
+        bot = application.bot
+        leftover = (
+            await asyncio.to_thread(self._execute, "SELECT COUNT(*) FROM messages")
+        )[0][0]
+        try:
+            info = await bot.get_webhook_info()
+        except TelegramError as e:
+            self.logger.warning(f"Could not check the update backlog: {e}")
+            return
+
+        pending = info.pending_update_count
+        drain = pending >= self.config.min_backlog
+        if drain and info.url and not self._owns_webhook():
+            # Вебхук зарегистрирован не ботом, отставание придет в него
+            self.logger.warning(
+                "Backlog is delivered to an external webhook, catch-up skipped",
+                extra={"pending": pending},
+            )
+            drain = False
+        if not drain and not leftover:
+            self.logger.debug("No update backlog", extra={"pending": pending})
+            return
+
+        self.logger.info(
+            "Catching up on update backlog",
+            extra={"pending": pending, "leftover": leftover},
+        )
+        if drain:
+            if info.url:
+                # getUpdates не работает при вебхуке, он регистрируется после запуска
+                await bot.delete_webhook()
+            await self._drain(application)
+
+        self._held = await asyncio.to_thread(self._spooled_chats)
+        self._task = asyncio.create_task(self._run(CallbackContext(application)))
+
+    async def stop(self) -> None:
+        """Прерывает обработку. Неотправленные посты останутся в хранилище."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.close)
+
+    async def _run(self, context: CallbackContext) -> None:
+        """Отправляет хранилище, пока в нем не останется постов и правок"""
+        started = time.perf_counter()
+        posts = edits = 0
+        try:
+            while True:
+                done = await self._process_posts(context)
+                done_edits = await self._process_edits(context)
+                posts += done
+                edits += done_edits
+                async with self._held_lock:
+                    chats = await asyncio.to_thread(self._spooled_chats)
+                    # Канал без отставания передается обычной обработке
+                    self._held &= chats
+                    if not chats:
+                        break
+                if not done and not done_edits:
+                    # Остались только медиа группы, которые еще собираются
+                    await asyncio.sleep(self.settings.media_group.max_wait)
+        except Exception as e:
+            # Новые посты больше не откладываются, остаток ждет перезапуска
+            self.logger.error(f"Catch-up stopped: {e}")
+            self._held.clear()
+            return
+
+        self.logger.info(
+            "Catch-up finished",
+            extra={
+                "posts": posts,
+                "edits": edits,
+                "seconds": round(time.perf_counter() - started, 3),
+            },
+        )
+
+    def _spooled_chats(self) -> Set[int]:
+        return {
+            chat_id
+            for (chat_id,) in self._execute("SELECT DISTINCT chat_id FROM messages")
+        }
+
+    async def handle_message(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """Новый пост канала, пока отправляется отставание
+
+        Args:
+            update (Update): Обновление от Telegram
+            context (ContextTypes.DEFAULT_TYPE): Контекст обновления
+        """
+        if update.channel_post is not None and await self._hold(
+            "post", update.update_id, update.channel_post
+        ):
+            return
+        await self.handler.handle_message(update, context)
+
+    async def handle_edit(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """Новая правка поста канала, пока отправляется отставание
+
+        Args:
+            update (Update): Обновление от Telegram
+            context (ContextTypes.DEFAULT_TYPE): Контекст обновления
+        """
+        if await self._hold("edit", update.update_id, update.edited_channel_post):
+            return
+        await self.handler.handle_edit(update, context)
+
+    async def _hold(self, kind: str, update_id: int, message: Message) -> bool:
+        """Пишет обновление канала с отставанием в хранилище
+
+        Returns:
+            bool: Обновление отложено, обычная обработка не нужна
+        """
+        if message.chat.id not in self._held:
+            return False
+        async with self._held_lock:
+            if message.chat.id not in self._held:
+                return False
+            await asyncio.to_thread(
+                self._spool, [(kind, update_id, message)], time.time()
+            )
+        return True
+
+    def _owns_webhook(self) -> bool:
+        telegram = self.settings.telegram
+        return telegram.mode == "polling" or bool(telegram.webhook.public_url)
+
+    async def _drain(self, application: Application) -> None:
+        """Забирает все ожидающие обновления в хранилище
+
+        Страница подтверждается в Telegram запросом следующей страницы,
+        то есть только после записи на диск.
+        """
+        offset: Optional[int] = None
+        while True:
+            updates = await application.bot.get_updates(
+                offset=offset,
+                limit=self.config.page_size,
+                timeout=0,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            if not updates:
+                return
+
+            entries: List[Tuple[str, int, Message]] = []
+            for update in updates:
+                if update.channel_post:
+                    entries.append(("post", update.update_id, update.channel_post))
+                elif update.edited_channel_post:
+                    entries.append(
+                        ("edit", update.update_id, update.edited_channel_post)
+                    )
+                else:
+                    self._pass(application, update)
+            await asyncio.to_thread(self._spool, entries)
+            offset = updates[-1].update_id + 1
+
+    def _pass(self, application: Application, update: Update) -> None:
+        """Оставляет обновление (команды и т.д.) обычным обработчикам"""
+        try:
+            application.update_queue.put_nowait(update)
+            CATCH_UP_UPDATES.inc(result="passed")
+        except asyncio.QueueFull:
+            self.logger.warning(
+                "Update queue is full, backlog update dropped",
+                extra={"update_id": update.update_id},
+            )
+            CATCH_UP_UPDATES.inc(result="dropped")
+
+    def _spool(
+        self, entries: List[Tuple[str, int, Message]], spooled_at: float = 0.0
+    ) -> None:
+        cutoff = time.time() - self.config.max_age if self.config.max_age else None
+        with self._db_lock:
+            db = self._connect()
+            db.execute("BEGIN")
+            try:
+                for kind, update_id, message in entries:
+                    result = self._spool_message(
+                        db, kind, update_id, message, cutoff, spooled_at
+                    )
+                    CATCH_UP_UPDATES.inc(result=result)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def _spool_message(
+        self,
+        db: sqlite3.Connection,
+        kind: str,
+        update_id: int,
+        message: Message,
+        cutoff: Optional[float],
+        spooled_at: float = 0.0,
+    ) -> str:
+        """Записывает сообщение отставания
+
+        spooled_at новых сообщений не дает отправить медиа группу, пока она
+        еще собирается. У забранного из getUpdates отставания он нулевой.
+
+        Returns:
+            str: Результат для метрики
+        """
+        chat_id, message_id = message.chat.id, message.message_id
+        data = json.dumps(message.to_dict())
+        if kind == "post":
+            if cutoff is not None and message.date.timestamp() < cutoff:
+                return "expired"
+            # Повтор после сбоя между записью и подтверждением страницы
+            db.execute(
+                "INSERT OR IGNORE INTO messages (chat_id, message_id, kind, post, "
+                "update_id, data, spooled_at) VALUES (?, ?, 'post', ?, ?, ?, ?)",
+                (
+                    chat_id,
+                    message_id,
+                    PostRef.from_messages([message], "").key,
+                    update_id,
+                    data,
+                    spooled_at,
+                ),
+            )
+            return "spooled"
+
+        if self.config.collapse_edits:
+            # Пост еще не отправлен: он уйдет сразу с последней правкой
+            collapsed = db.execute(
+                "UPDATE messages SET data = ? WHERE chat_id = ? AND message_id = ? "
+                "AND kind = 'post'",
+                (data, chat_id, message_id),
+            ).rowcount
+            if collapsed:
+                return "collapsed"
+        # Из нескольких правок одного сообщения нужна только последняя
+        db.execute(
+            "INSERT INTO messages (chat_id, message_id, kind, post, update_id, data) "
+            "VALUES (?, ?, 'edit', '', ?, ?) "
+            "ON CONFLICT (chat_id, message_id, kind) DO UPDATE SET "
+            "update_id = excluded.update_id, data = excluded.data",
+            (chat_id, message_id, update_id, data),
+        )
+        return "spooled"
+
+    async def _process_posts(self, context: CallbackContext) -> int:
+        """Отправляет посты из хранилища пакетами
+
+        Returns:
+            int: Количество обработанных постов
+        """
+        order = "DESC" if self.config.order == "newest_first" else "ASC"
+        processed = 0
+        while True:
+            batch = await asyncio.to_thread(self._load_posts, order)
+            if not batch:
+                return processed
+
+            jobs: List[LaneJob] = []
+            for chat_id, key, items in batch:
+                messages = [Message.de_json(item, context.bot) for item in items]
+                # Медиа пакета начинают готовиться сразу, до очереди отправки
+                send = self.handler.start_post(messages, context)
+                jobs.append(
+                    (chat_id, self._post_job(chat_id, key, messages, context, send))
+                )
+            await self._run_lanes(jobs)
+            processed += len(batch)
+
+    def _load_posts(self, order: str) -> List[Tuple[int, str, List[Dict[str, Any]]]]:
+        ready = time.time() - self.settings.media_group.max_wait
+        posts = self._execute(
+            "SELECT chat_id, post FROM messages WHERE kind = 'post' "
+            "GROUP BY chat_id, post HAVING MAX(spooled_at) <= ? "
+            f"ORDER BY MIN(update_id) {order} LIMIT ?",
+            (ready, self.config.batch_size),
+        )
+        return [
+            (
+                chat_id,
+                key,
+                [
+                    json.loads(data)
+                    for (data,) in self._execute(
+                        "SELECT data FROM messages WHERE kind = 'post' "
+                        "AND chat_id = ? AND post = ? ORDER BY message_id",
+                        (chat_id, key),
+                    )
+                ],
+            )
+            for chat_id, key in posts
+        ]
+
+    def _post_job(
+        self,
+        chat_id: int,
+        key: str,
+        messages: List[Message],
+        context: CallbackContext,
+        send: Optional[Callable[[], Awaitable[None]]],
+    ) -> Callable[[], Awaitable[None]]:
+        async def job() -> None:
+            run = send
+            attempt = 1
+            while True:
+                try:
+                    if run is not None:
+                        await run()
+                    CATCH_UP_POSTS.inc(kind="post", result="processed")
+                    break
+                except Exception as e:
+                    if attempt >= self.config.max_attempts:
+                        self.logger.error(
+                            f"Backlog post failed permanently: {e}",
+                            extra={"chat_id": chat_id, "post": key},
+                        )
+                        CATCH_UP_POSTS.inc(kind="post", result="failed")
+                        break
+                    # Повтор держит очередь канала, чтобы не нарушить порядок
+                    delay = self.config.retry_backoff * 2 ** (attempt - 1)
+                    self.logger.warning(
+                        f"Backlog post failed, retry in {delay:.1f}s: {e}",
+                        extra={"chat_id": chat_id, "post": key, "attempt": attempt},
+                    )
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    run = self.handler.start_post(messages, context)
+
+            # При отмене пост остается в хранилище до следующего запуска
+            await asyncio.to_thread(
+                self._execute,
+                "DELETE FROM messages WHERE kind = 'post' AND chat_id = ? "
+                "AND post = ?",
+                (chat_id, key),
+            )
+
+        return job
+
+    async def _process_edits(self, context: CallbackContext) -> int:
+        """Применяет правки постов, отправленных до простоя
+
+        Returns:
+            int: Количество обработанных правок
+        """
+        processed = 0
+        while True:
+            rows = await asyncio.to_thread(
+                self._execute,
+                "SELECT chat_id, message_id, data FROM messages WHERE kind = 'edit' "
+                "ORDER BY update_id LIMIT ?",
+                (self.config.batch_size,),
+            )
+            if not rows:
+                return processed
+
+            await self._run_lanes(
+                [
+                    (
+                        chat_id,
+                        self._edit_job(Message.de_json(json.loads(data), context.bot)),
+                    )
+                    for chat_id, _, data in rows
+                ]
+            )
+            processed += len(rows)
+
+    def _edit_job(self, message: Message) -> Callable[[], Awaitable[None]]:
+        async def job() -> None:
+            try:
+                await self.handler.edit_post(message)
+                CATCH_UP_POSTS.inc(kind="edit", result="processed")
+            except Exception as e:
+                self.logger.error(
+                    f"Error applying backlog edit: {e}",
+                    extra={
+                        "chat_id": message.chat.id,
+                        "message_id": message.message_id,
+                    },
+                )
+                CATCH_UP_POSTS.inc(kind="edit", result="failed")
+            await asyncio.to_thread(
+                self._execute,
+                "DELETE FROM messages WHERE kind = 'edit' AND chat_id = ? "
+                "AND message_id = ?",
+                (message.chat.id, message.message_id),
+            )
+
+        return job
+
+    async def _run_lanes(self, jobs: List[LaneJob]) -> None:
+        """Выполняет задачи по порядку внутри канала, каналы параллельно"""
+        lanes: Dict[int, List[Callable[[], Awaitable[None]]]] = {}
+        for chat_id, job in jobs:
+            lanes.setdefault(chat_id, []).append(job)
+
+        slots = asyncio.Semaphore(self.config.concurrency)
+
+        async def lane(queue: List[Callable[[], Awaitable[None]]]) -> None:
+            async with slots:
+                for job in queue:
+                    await job()
+
+        await asyncio.gather(*(lane(queue) for queue in lanes.values()))
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
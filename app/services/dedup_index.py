@@ -0,0 +1,241 @@
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, List, Literal, Optional, Sequence, Tuple
+
+from telegram import Message
+
+from app.config import Settings
+from app.utils.logging import get_logger
+from app.utils.metrics import get_metrics
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    key TEXT PRIMARY KEY,
+    media TEXT NOT NULL,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fingerprints_seen ON fingerprints (seen_at);
+"""
+
+# Поля сообщения с вложениями, по которым определяется одинаковое медиа
+MEDIA_FIELDS = ("photo", "video", "animation", "document", "audio", "voice", "sticker")
+
+# Как часто чистить устаревшие записи на диске, в записях
+_PRUNE_EVERY = 100
+
+DEDUP_POSTS = get_metrics().counter(
+    "dedup_posts_total", "Posts checked against the fingerprint index", ["result"]
+)
+
+DedupResult = Literal["new", "duplicate", "media_duplicate"]
+
+
+@dataclass(frozen=True)
+class PostFingerprint:
+    """
+    Отпечаток поста
+
+    Attributes:
+        media (str): Хэш file_unique_id всех вложений, пустой без медиа
+        text (str): Хэш нормализованного текста
+        scope (str): Хэш канала и вебхуков поста: повтором считается только
+            пост с тем же scope
+    """
+
+    media: str
+    text: str
+    scope: str = ""
+
+    @property
+    def key(self) -> str:
+        return f"{self.scope}:{self.media}:{self.text}"
+
+    @property
+    def media_key(self) -> str:
+        return f"{self.scope}:{self.media}" if self.media else ""
+
+
+def fingerprint_post(
+    messages: Sequence[Message],
+    webhooks: Optional[Sequence[str]] = None,
+    cross_channel: bool = False,
+) -> Optional[PostFingerprint]:
+    """Строит отпечаток поста по подписи и file_unique_id вложений
+
+    file_unique_id одинаков у файла при репосте и пересылке, поэтому
+    повторы находятся без скачивания. Подпись автора репоста в отпечаток
+    не входит. Посты в разные вебхуки повторами не считаются, а посты
+    разных каналов — только при cross_channel.
+
+    Args:
+        messages (Sequence[Message]): Сообщения поста
+        webhooks (Optional[Sequence[str]]): Вебхуки поста, None — все
+        cross_channel (bool): Не учитывать канал поста
+
+    Returns:
+        Optional[PostFingerprint]: Отпечаток или None, если пост пустой
+    """
+    media: List[str] = []
+    text = ""
+    for message in messages:
+        for attr in MEDIA_FIELDS:
+            item = getattr(message, attr, None)
+            if item:
+                # У фото берется самый большой размер
+                item = item[-1] if attr == "photo" else item
+                media.append(item.file_unique_id)
+        text = text or message.caption or message.text or ""
+
+    text = " ".join(text.split()).casefold()
+    if not media and not text:
+        return None
+    chat = "*" if cross_channel else str(messages[0].chat.id)
+    targets = "*" if webhooks is None else ",".join(sorted(webhooks))
+    return PostFingerprint(
+        media=_digest("\n".join(sorted(set(media)))) if media else "",
+        text=_digest(text),
+        scope=_digest(f"{chat}\n{targets}"),
+    )
+
+
+def _digest(value: str) -> str:
+    return hashlib.blake2b(value.encode(), digest_size=12).hexdigest()
+
+
+class DedupIndex:
+    """
+    Индекс отпечатков недавно отправленных постов.
+
+    В памяти хранится не больше max_entries отпечатков моложе window.
+    Отпечатки пишутся в SQLite и загружаются при запуске, поэтому повторы
+    находятся и после перезапуска. Отпечаток занимается до обработки поста:
+    одновременно пришедшие копии не обрабатываются дважды, а при ошибке
+    отпечаток освобождается через release.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.config = settings.dedup
+        self.root = Path(self.config.path or settings.general.temp_dir / "dedup")
+        self.logger = get_logger(__name__)
+        # Ключ поста -> время, медиа -> (ключ поста, время)
+        self._posts: "OrderedDict[str, float]" = OrderedDict()
+        self._media: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._writes = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._load()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(
+                self.root / "dedup.db",
+                check_same_thread=False,
+                isolation_level=None,
+                timeout=30,
+            )
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[Any]:
+        with self._db_lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def _load(self) -> None:
+        """Восстанавливает свежие отпечатки с диска"""
+        self._prune()
+        rows = self._execute(
+            "SELECT key, media, seen_at FROM fingerprints "
+            "ORDER BY seen_at DESC LIMIT ?",
+            (self.config.max_entries,),
+        )
+        for key, media, seen_at in reversed(rows):
+            self._remember(key, media, seen_at)
+        if rows:
+            self.logger.info(f"Loaded {len(rows)} post fingerprints")
+
+    def _prune(self) -> None:
+        self._execute(
+            "DELETE FROM fingerprints WHERE seen_at < ?",
+            (time.time() - self.config.window,),
+        )
+        self._execute(
+            "DELETE FROM fingerprints WHERE key NOT IN "
+            "(SELECT key FROM fingerprints ORDER BY seen_at DESC LIMIT ?)",
+            (self.config.max_entries,),
+        )
+
+    def _remember(self, key: str, media: str, seen_at: float) -> None:
+        self._posts[key] = seen_at
+        self._posts.move_to_end(key)
+        if media:
+            self._media[media] = (key, seen_at)
+            self._media.move_to_end(media)
+        for entries in (self._posts, self._media):
+            while len(entries) > self.config.max_entries:
+                entries.popitem(last=False)
+
+    def _fresh(self, seen_at: Optional[float], now: float) -> bool:
+        return seen_at is not None and now - seen_at < self.config.window
+
+    async def claim(self, fingerprint: PostFingerprint) -> DedupResult:
+        """Проверяет пост и занимает его отпечаток
+
+        Args:
+            fingerprint (PostFingerprint): Отпечаток поста
+
+        Returns:
+            DedupResult: duplicate — такой же пост уже был, media_duplicate —
+                было то же медиа с другим текстом, new — пост новый
+        """
+        now = time.time()
+        if self._fresh(self._posts.get(fingerprint.key), now):
+            DEDUP_POSTS.inc(result="duplicate")
+            return "duplicate"
+
+        media = self._media.get(fingerprint.media_key) if fingerprint.media else None
+        result: DedupResult = (
+            "media_duplicate" if media and self._fresh(media[1], now) else "new"
+        )
+        # Медиа остается за первым постом, чтобы окно не продлевалось повторами
+        owned = fingerprint.media_key if result == "new" else ""
+        self._remember(fingerprint.key, owned, now)
+        await asyncio.to_thread(self._store, fingerprint.key, owned, now)
+        DEDUP_POSTS.inc(result=result)
+        return result
+
+    def _store(self, key: str, media: str, seen_at: float) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO fingerprints (key, media, seen_at) "
+            "VALUES (?, ?, ?)",
+            (key, media, seen_at),
+        )
+        self._writes += 1
+        if self._writes % _PRUNE_EVERY == 0:
+            self._prune()
+
+    async def release(self, fingerprint: PostFingerprint) -> None:
+        """Освобождает отпечаток поста, который не удалось обработать"""
+        self._posts.pop(fingerprint.key, None)
+        media = self._media.get(fingerprint.media_key)
+        if media is not None and media[0] == fingerprint.key:
+            del self._media[fingerprint.media_key]
+        await asyncio.to_thread(
+            self._execute,
+            "DELETE FROM fingerprints WHERE key = ?",
+            (fingerprint.key,),
+        )
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
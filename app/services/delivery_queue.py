@@ -0,0 +1,500 @@
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, List, Optional, Set, Tuple
+
+from app.config import Settings
+from app.models.file_payload import FilePayload
+from app.services.discord import DiscordService
+from app.services.message_index import PostRef
+from app.utils.errors import WebhookError
+from app.utils.logging import get_logger
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    files TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    post TEXT,
+    chat_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    job_id TEXT NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    webhook TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    sent TEXT,
+    PRIMARY KEY (job_id, webhook)
+);
+CREATE INDEX IF NOT EXISTS deliveries_due
+    ON deliveries (status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS enqueued_posts (
+    chat_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (chat_id, key)
+);
+"""
+
+# Сколько помнить поставленные посты, чтобы повторная постановка их пропускала
+ENQUEUED_TTL = 24 * 3600
+
+
+class DeliveryQueue:
+    """
+    Персистентная очередь доставки в Discord.
+
+    Задача (текст и файлы) записывается на диск один раз, а доставка в
+    каждый вебхук отслеживается отдельно: с повторами и экспоненциальной
+    задержкой. Незавершенные доставки повторяются после перезапуска.
+
+    Посты одного канала доставляются в вебхук строго по порядку: выдается
+    только самая старая ожидающая доставка канала, поэтому неудачная
+    доставка задерживает следующие, пока не пройдет или не будет брошена.
+
+    Ставить задачи могут несколько процессов, а доставляет один: тот,
+    что вызвал start. Пост Telegram ставится в очередь один раз, повторная
+    постановка (например, после падения процесса обработки) пропускается.
+    """
+
+    def __init__(
+        self,
+        discord_service: DiscordService,
+        settings: Settings,
+        root: Optional[Path] = None,
+        poll_interval: Optional[float] = None,
+    ) -> None:
+        """
+        Args:
+            discord_service (DiscordService): Сервис отправки в Discord
+            settings (Settings): Настройки
+            root (Optional[Path]): Каталог очереди
+            poll_interval (Optional[float]): Как часто проверять задачи,
+                поставленные другими процессами. None — задачи ставит
+                только этот процесс
+        """
+        self.discord = discord_service
+        self.config = settings.queue
+        self.root = Path(
+            root or self.config.path or settings.general.temp_dir / "outbox"
+        )
+        self.poll_interval = poll_interval
+        self.logger = get_logger(__name__)
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight: Set[Tuple[str, str]] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._settled = asyncio.Condition()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(
+                self.root / "queue.db",
+                check_same_thread=False,
+                isolation_level=None,
+                timeout=30,
+            )
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA foreign_keys=ON")
+            self._db.executescript(_SCHEMA)
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            if "post" not in columns:
+                # База предыдущей версии
+                self._db.execute("ALTER TABLE jobs ADD COLUMN post TEXT")
+            if "chat_id" not in columns:
+                self._db.execute("ALTER TABLE jobs ADD COLUMN chat_id INTEGER")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_chat ON jobs (chat_id)")
+            columns = {
+                row[1] for row in self._db.execute("PRAGMA table_info(deliveries)")
+            }
+            if "sent" not in columns:
+                self._db.execute("ALTER TABLE deliveries ADD COLUMN sent TEXT")
+        return self._db
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[Any]:
+        with self._db_lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    async def enqueue(
+        self,
+        content: str,
+        payloads: List[FilePayload],
+        webhooks: Optional[List[str]] = None,
+        origin_time: Optional[float] = None,
+        post: Optional[PostRef] = None,
+        chat_id: Optional[int] = None,
+    ) -> str:
+        """Сохраняет задачу на диск и ставит доставки в очередь
+
+        Args:
+            content (str): Текст сообщения
+            payloads (List[FilePayload]): Файлы для отправки
+            webhooks (Optional[List[str]]): Имена вебхуков, по умолчанию все
+            origin_time (Optional[float]): Время поста в Telegram (unix),
+                по умолчанию время постановки в очередь
+            post (Optional[PostRef]): Пост Telegram для индекса сообщений
+            chat_id (Optional[int]): ID канала. Задачи одного канала
+                доставляются в порядке постановки
+
+        Returns:
+            str: ID задачи. Если пост уже в очереди, ID поставленной ранее
+        """
+        job_id = uuid.uuid4().hex
+        targets = webhooks if webhooks is not None else self.discord.webhook_names
+        queued = await asyncio.to_thread(
+            self._store_job,
+            job_id,
+            content,
+            payloads,
+            targets,
+            origin_time,
+            post,
+            chat_id,
+        )
+        if queued != job_id:
+            self.logger.info(
+                "Post is already queued", extra={"job_id": queued, "post": post.key}
+            )
+            return queued
+        self.logger.info(
+            "Job enqueued",
+            extra={"job_id": job_id, "files": len(payloads), "webhooks": targets},
+        )
+        self._wakeup.set()
+        return job_id
+
+    def _store_job(
+        self,
+        job_id: str,
+        content: str,
+        payloads: List[FilePayload],
+        webhooks: List[str],
+        origin_time: Optional[float] = None,
+        post: Optional[PostRef] = None,
+        chat_id: Optional[int] = None,
+    ) -> str:
+        """Записывает файлы и строки задачи одной транзакцией
+
+        Returns:
+            str: ID задачи или задачи, с которой этот пост уже поставлен
+        """
+        job_dir = self.root / job_id
+        job_dir.mkdir(parents=True, exist_ok=True)
+        for payload in payloads:
+            _persist_payload(payload, job_dir / payload.filename)
+
+        now = time.time()
+        files = json.dumps([payload.filename for payload in payloads])
+        with self._db_lock:
+            db = self._connect()
+            with db:
+                db.execute("BEGIN IMMEDIATE")
+                if post is not None:
+                    row = db.execute(
+                        "SELECT job_id FROM enqueued_posts "
+                        "WHERE chat_id = ? AND key = ?",
+                        (post.chat_id, post.key),
+                    ).fetchone()
+                    if row is not None:
+                        shutil.rmtree(job_dir, ignore_errors=True)
+                        return row[0]
+                    db.execute(
+                        "INSERT INTO enqueued_posts (chat_id, key, job_id, created_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        (post.chat_id, post.key, job_id, now),
+                    )
+                db.execute(
+                    "INSERT INTO jobs (id, content, files, created_at, post, chat_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        job_id,
+                        content,
+                        files,
+                        origin_time or now,
+                        json.dumps(post.to_dict()) if post is not None else None,
+                        chat_id,
+                    ),
+                )
+                db.executemany(
+                    "INSERT INTO deliveries (job_id, webhook, next_attempt_at) "
+                    "VALUES (?, ?, ?)",
+                    [(job_id, webhook, now) for webhook in webhooks],
+                )
+        return job_id
+
+    async def start(self) -> None:
+        """Запускает обработку очереди (включая задачи прошлого запуска)"""
+        pending = await asyncio.to_thread(
+            self._execute, "SELECT COUNT(*) FROM deliveries WHERE status = 'pending'"
+        )
+        if pending[0][0]:
+            self.logger.info(f"Replaying {pending[0][0]} pending deliveries")
+        await asyncio.to_thread(
+            self._execute,
+            "DELETE FROM enqueued_posts WHERE created_at < ?",
+            (time.time() - ENQUEUED_TTL,),
+        )
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает обработку. Прерванные доставки останутся в очереди."""
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    async def _run(self) -> None:
+        """Основной цикл: забирает готовые доставки и ждет следующие"""
+        while True:
+            self._wakeup.clear()
+            # Доставка ждет, пока в ее вебхук не уйдут старые посты канала
+            due = await asyncio.to_thread(
+                self._execute,
+                "SELECT d.job_id, d.webhook FROM deliveries AS d "
+                "JOIN jobs AS j ON j.id = d.job_id "
+                "WHERE d.status = 'pending' AND d.next_attempt_at <= ? "
+                "AND NOT EXISTS (SELECT 1 FROM deliveries AS d2 "
+                "JOIN jobs AS j2 ON j2.id = d2.job_id "
+                "WHERE d2.webhook = d.webhook AND d2.status = 'pending' "
+                "AND j2.chat_id = j.chat_id AND j2.rowid < j.rowid) "
+                "ORDER BY j.rowid LIMIT ?",
+                (time.time(), self.config.batch_size),
+            )
+            for job_id, webhook in due:
+                key = (job_id, webhook)
+                if key in self._in_flight:
+                    continue
+                self._in_flight.add(key)
+                task = asyncio.create_task(self._deliver(job_id, webhook))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            timeout = await self._next_wakeup()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _next_wakeup(self) -> Optional[float]:
+        """Время до ближайшей отложенной доставки"""
+        # Готовые и выполняющиеся доставки будят цикл сами по завершении
+        now = time.time()
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT MIN(next_attempt_at) FROM deliveries "
+            "WHERE status = 'pending' AND next_attempt_at > ?",
+            (now,),
+        )
+        next_at = rows[0][0]
+        if next_at is None:
+            return self.poll_interval
+        delay = max(next_at - now, 0.1)
+        return delay if self.poll_interval is None else min(delay, self.poll_interval)
+
+    async def _deliver(self, job_id: str, webhook: str) -> None:
+        """Доставляет задачу в один вебхук и фиксирует результат"""
+        try:
+            content, payloads, post = await asyncio.to_thread(self._load_job, job_id)
+            sent = await asyncio.to_thread(self._load_sent, job_id, webhook)
+
+            async def save_progress(messages: List[Any]) -> None:
+                await asyncio.to_thread(self._save_sent, job_id, webhook, messages)
+
+            await self.discord.send_to(
+                webhook,
+                content,
+                payloads,
+                post=post,
+                sent=sent,
+                on_sent=save_progress,
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await asyncio.to_thread(self._record_failure, job_id, webhook, e)
+        else:
+            created_at = await asyncio.to_thread(self._record_success, job_id, webhook)
+            self.discord.record_delivery(webhook, created_at)
+            self.logger.info(
+                "Delivery completed", extra={"job_id": job_id, "webhook": webhook}
+            )
+            await asyncio.to_thread(self._cleanup_job, job_id)
+        finally:
+            self._in_flight.discard((job_id, webhook))
+            self._wakeup.set()
+            async with self._settled:
+                self._settled.notify_all()
+
+    async def wait_chat(self, chat_id: int) -> None:
+        """Ждет, пока все задачи канала не будут доставлены или брошены
+
+        Args:
+            chat_id (int): ID канала
+        """
+        async with self._settled:
+            while await asyncio.to_thread(self._pending_in_chat, chat_id):
+                await self._settled.wait()
+
+    def _pending_in_chat(self, chat_id: int) -> int:
+        rows = self._execute(
+            "SELECT COUNT(*) FROM deliveries AS d JOIN jobs AS j ON j.id = d.job_id "
+            "WHERE j.chat_id = ? AND d.status = 'pending'",
+            (chat_id,),
+        )
+        return rows[0][0]
+
+    def _record_success(self, job_id: str, webhook: str) -> float:
+        """Отмечает доставку выполненной
+
+        Returns:
+            float: Время создания задачи (поста в Telegram)
+        """
+        with self._db_lock:
+            db = self._connect()
+            with db:
+                db.execute("BEGIN")
+                (created_at,) = db.execute(
+                    "SELECT created_at FROM jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+                db.execute(
+                    "UPDATE deliveries SET status = 'done' "
+                    "WHERE job_id = ? AND webhook = ?",
+                    (job_id, webhook),
+                )
+        return created_at
+
+    def _load_job(
+        self, job_id: str
+    ) -> Tuple[str, List[FilePayload], Optional[PostRef]]:
+        """Читает текст, файлы и пост задачи с диска"""
+        rows = self._execute(
+            "SELECT content, files, post FROM jobs WHERE id = ?", (job_id,)
+        )
+        content, files, post = rows[0]
+        job_dir = self.root / job_id
+        payloads = [FilePayload.from_path(job_dir / name) for name in json.loads(files)]
+        return content, payloads, PostRef(**json.loads(post)) if post else None
+
+    def _load_sent(self, job_id: str, webhook: str) -> List[Any]:
+        """Сообщения поста, которые прошлые попытки уже отправили в вебхук"""
+        rows = self._execute(
+            "SELECT sent FROM deliveries WHERE job_id = ? AND webhook = ?",
+            (job_id, webhook),
+        )
+        return json.loads(rows[0][0]) if rows and rows[0][0] else []
+
+    def _save_sent(self, job_id: str, webhook: str, messages: List[Any]) -> None:
+        """Запоминает отправленные сообщения, чтобы повтор продолжил с места сбоя"""
+        # Для индекса сообщений достаточно ID, остальной ответ Discord не нужен
+        sent = [
+            {"id": data["id"]} if isinstance(data, dict) and "id" in data else {}
+            for data in messages
+        ]
+        self._execute(
+            "UPDATE deliveries SET sent = ? WHERE job_id = ? AND webhook = ?",
+            (json.dumps(sent), job_id, webhook),
+        )
+
+    def _record_failure(self, job_id: str, webhook: str, error: Exception) -> None:
+        """Планирует повтор с экспоненциальной задержкой или сдается"""
+        rows = self._execute(
+            "SELECT attempts FROM deliveries WHERE job_id = ? AND webhook = ?",
+            (job_id, webhook),
+        )
+        attempts = rows[0][0] + 1
+        give_up = attempts >= self.config.max_attempts or _is_permanent(error)
+        delay = min(
+            self.config.base_backoff * 2 ** (attempts - 1), self.config.max_backoff
+        )
+        self._execute(
+            "UPDATE deliveries SET status = ?, attempts = ?, next_attempt_at = ?, "
+            "last_error = ? WHERE job_id = ? AND webhook = ?",
+            (
+                "failed" if give_up else "pending",
+                attempts,
+                time.time() + delay,
+                str(error),
+                job_id,
+                webhook,
+            ),
+        )
+        if give_up:
+            self.logger.error(
+                f"Delivery to {webhook} failed permanently: {error}",
+                extra={"job_id": job_id, "attempts": attempts},
+            )
+            self._cleanup_job(job_id)
+        else:
+            self.logger.warning(
+                f"Delivery to {webhook} failed, retry in {delay:.1f}s: {error}",
+                extra={"job_id": job_id, "attempts": attempts},
+            )
+
+    def _cleanup_job(self, job_id: str) -> None:
+        """Удаляет задачу и ее файлы, когда не осталось ожидающих доставок"""
+        rows = self._execute(
+            "SELECT COUNT(*) FROM deliveries WHERE job_id = ? AND status = 'pending'",
+            (job_id,),
+        )
+        if rows[0][0]:
+            return
+        self._execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        shutil.rmtree(self.root / job_id, ignore_errors=True)
+
+
+def _is_permanent(error: Exception) -> bool:
+    """Ошибка, которую повтор не исправит
+
+    Неизвестный вебхук (удален из настроек) и отказ Discord с кодом 4xx,
+    кроме 429: неверный запрос, удаленный вебхук, слишком большой файл.
+    Повтор такой доставки только задерживал бы остальные посты канала.
+    """
+    if isinstance(error, KeyError):
+        return True
+    if isinstance(error, WebhookError):
+        return 400 <= error.status < 500 and error.status != 429
+    return False
+
+
+def _persist_payload(payload: FilePayload, destination: Path) -> None:
+    """Переносит файл payload в каталог задачи без лишних копий
+
+    Args:
+        payload (FilePayload): Файл для сохранения
+        destination (Path): Путь внутри каталога задачи
+    """
+    if payload.data is not None:
+        destination.write_bytes(payload.data)
+    elif payload.temporary:
+        # Временный файл принадлежит payload, его можно просто переместить
+        shutil.move(payload.path, destination)
+        payload.path = destination
+        payload.temporary = False
+    else:
+        try:
+            destination.hardlink_to(payload.path)
+        except OSError:
+            shutil.copyfile(payload.path, destination)
@@ -1,12 +1,34 @@
-from io import BytesIO
-from typing import List, Optional
-
-from discord import File as DiscordFile, SyncWebhook
-from discord.errors import HTTPException
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional
 
 from app.config import get_settings
 from app.utils.logging import get_logger
 from app.models.file_payload import FilePayload
+from app.services.message_index import (
+    IndexedDelivery,
+    IndexedPost,
+    MessageIndex,
+    PostRef,
+    SentMessage,
+)
+from app.services.rate_limiter import RateLimiter, WebhookScheduler
+from app.services.webhook_client import WebhookClient
+from app.utils.errors import WebhookError
+from app.utils.message_packer import MAX_CONTENT_LENGTH, pack_message, split_content
+from app.utils.metrics import get_metrics
+
+DISCORD_SEND_SECONDS = get_metrics().histogram(
+    "discord_send_seconds",
+    "Time to deliver a post to a webhook, including rate limit waits",
+    ["webhook", "result"],
+)
+TELEGRAM_TO_DISCORD_SECONDS = get_metrics().histogram(
+    "telegram_to_discord_seconds",
+    "Time from the Telegram post date to its delivery to a webhook",
+    ["webhook"],
+    buckets=(1, 2, 5, 10, 20, 30, 60, 120, 300, 600, 1800, 3600),
+)
 
 
 class DiscordService:
@@ -14,62 +36,346 @@ class DiscordService:
     Класс для работы с Discord
     """
 
-    def __init__(self) -> None:
+    def __init__(self, message_index: Optional[MessageIndex] = None) -> None:
         self.settings = get_settings()
         self.logger = get_logger(__name__)
-        self._hooks = [
-            (SyncWebhook.from_url(hook.url), hook.silent)
+        # Сообщения отправленных постов запоминаются для правок и удалений
+        self.message_index = message_index
+        self.client = WebhookClient(
+            connection_limit=self.settings.discord.connection_limit,
+            timeout=self.settings.discord.request_timeout,
+        )
+        self.limiter = RateLimiter()
+        # Общий лимит одновременных HTTP запросов ко всем вебхукам
+        self._semaphore = asyncio.Semaphore(self.settings.discord.max_concurrency)
+        self._hooks: List[WebhookScheduler] = [
+            WebhookScheduler(
+                hook,
+                self.client,
+                self.limiter,
+                self._semaphore,
+                max_retries=self.settings.discord.rate_limit_retries,
+            )
             for hook in self.settings.discord.webhooks
         ]
 
-    async def send(self, content: str = "", payloads: List[FilePayload] = None) -> None:
-        """Отправляет сообщение в Discord
+    async def send(
+        self,
+        content: str = "",
+        payloads: List[FilePayload] = None,
+        origin_time: Optional[float] = None,
+        webhooks: Optional[List[str]] = None,
+        post: Optional[PostRef] = None,
+    ) -> None:
+        """Отправляет сообщение в вебхуки Discord параллельно
 
         Args:
             content (str): Текст сообщения
             payloads (List[FilePayload]): Список файлов для отправки
+            origin_time (Optional[float]): Время поста в Telegram (unix)
+            webhooks (Optional[List[str]]): Имена вебхуков, по умолчанию все
+            post (Optional[PostRef]): Пост Telegram для индекса сообщений
 
         Raises:
-            Exception: Любая ошибка
+            Exception: Первая ошибка отправки, после попытки во все вебхуки
         """
 
         if not content and not payloads:
             self.logger.warning("No content or files to send to Discord")
             return
 
-        for webhook, silent in self._hooks:
-            files: List[DiscordFile] = []
-            for file_payload in payloads or []:
-                size = len(file_payload.data)
-                if size > self.settings.discord.max_file_size:
-                    self.logger.warning(
-                        f"File {file_payload.filename} is too large: {size} bytes."
-                    )
-                    continue
+        files = self._filter_payloads(payloads)
+        if not content and not files:
+            return
+
+        hooks = [
+            hook
+            for hook in self._hooks
+            if webhooks is None or hook.hook.name in webhooks
+        ]
+        results = await asyncio.gather(
+            *(self._send_to_hook(hook, content, files, post=post) for hook in hooks),
+            return_exceptions=True,
+        )
+
+        # Ошибка одного вебхука не мешает отправке в остальные
+        errors = [result for result in results if isinstance(result, Exception)]
+        if origin_time is not None:
+            for hook, result in zip(hooks, results):
+                if not isinstance(result, Exception):
+                    self.record_delivery(hook.hook.name, origin_time)
+        if errors:
+            raise errors[0]
+
+    def record_delivery(self, webhook: str, origin_time: float) -> None:
+        """Учитывает задержку от поста в Telegram до доставки в вебхук"""
+        TELEGRAM_TO_DISCORD_SECONDS.observe(
+            max(time.time() - origin_time, 0.0), webhook=webhook
+        )
+
+    @property
+    def webhook_names(self) -> List[str]:
+        """Имена настроенных вебхуков"""
+        return [hook.hook.name for hook in self._hooks]
+
+    async def send_to(
+        self,
+        name: str,
+        content: str = "",
+        payloads: List[FilePayload] = None,
+        post: Optional[PostRef] = None,
+        sent: Optional[List[Any]] = None,
+        on_sent: Optional[Callable[[List[Any]], Awaitable[None]]] = None,
+    ) -> None:
+        """Отправляет сообщение в один вебхук по имени
+
+        Args:
+            name (str): Имя вебхука из настроек
+            content (str): Текст сообщения
+            payloads (List[FilePayload]): Список файлов для отправки
+            post (Optional[PostRef]): Пост Telegram для индекса сообщений
+            sent (Optional[List[Any]]): Сообщения поста, отправленные прошлой
+                попыткой. Отправка продолжается со следующего
+            on_sent (Optional[Callable[[List[Any]], Awaitable[None]]]):
+                Вызывается после каждого отправленного сообщения со списком
+                всех отправленных
+
+        Raises:
+            KeyError: Вебхук с таким именем не настроен
+        """
+        hook = self._get_hook(name)
+        files = self._filter_payloads(payloads)
+        if not content and not files:
+            self.logger.warning("No content or files to send to Discord")
+            return
+        await self._send_to_hook(
+            hook, content, files, post=post, sent=sent, on_sent=on_sent
+        )
+
+    def _get_hook(self, name: str) -> WebhookScheduler:
+        hook = next((hook for hook in self._hooks if hook.hook.name == name), None)
+        if hook is None:
+            raise KeyError(f"Unknown Discord webhook: {name}")
+        return hook
+
+    def _filter_payloads(
+        self, payloads: Optional[List[FilePayload]]
+    ) -> List[FilePayload]:
+        """Отбрасывает файлы больше лимита Discord
+
+        Args:
+            payloads (Optional[List[FilePayload]]): Список файлов
 
-                stream = BytesIO(file_payload.data)
-                files.append(
-                    DiscordFile(
-                        fp=stream,
-                        filename=file_payload.filename,
+        Returns:
+            List[FilePayload]: Файлы, которые можно отправить
+        """
+        files: List[FilePayload] = []
+        for file_payload in payloads or []:
+            size = file_payload.size
+            if size > self.settings.discord.max_file_size:
+                self.logger.warning(
+                    f"File {file_payload.filename} is too large: {size} bytes."
+                )
+                continue
+            files.append(file_payload)
+        return files
+
+    async def _send_to_hook(
+        self,
+        hook: WebhookScheduler,
+        content: str,
+        files: List[FilePayload],
+        post: Optional[PostRef] = None,
+        sent: Optional[List[Any]] = None,
+        on_sent: Optional[Callable[[List[Any]], Awaitable[None]]] = None,
+    ) -> List[Any]:
+        """Отправляет пост в один вебхук через его планировщик
+
+        Пост, который не помещается в лимиты Discord, разбивается на несколько
+        сообщений. Они отправляются по очереди, чтобы сохранить порядок.
+        Разбиение детерминировано, поэтому повтор пропускает уже
+        отправленные сообщения и не дублирует их.
+
+        Args:
+            hook (WebhookScheduler): Планировщик вебхука
+            content (str): Текст сообщения
+            files (List[FilePayload]): Файлы для отправки
+            post (Optional[PostRef]): Пост Telegram для индекса сообщений
+            sent (Optional[List[Any]]): Уже отправленные сообщения поста
+            on_sent (Optional[Callable[[List[Any]], Awaitable[None]]]):
+                Обработчик прогресса отправки
+
+        Returns:
+            List[Any]: Объекты отправленных сообщений Discord
+        """
+        name = hook.hook.name
+        config = self.settings.discord
+        messages = pack_message(
+            content,
+            files,
+            max_files=config.max_attachments,
+            max_bytes=config.max_request_size,
+            strategy=config.pack_strategy,
+        )
+        if len(messages) > 1:
+            self.logger.info(
+                f"Post split into {len(messages)} messages",
+                extra={"webhook": name, "files": len(files)},
+            )
+
+        sent = list(sent or [])
+        if sent:
+            self.logger.info(
+                f"Resuming post from message {len(sent) + 1} of {len(messages)}",
+                extra={"webhook": name},
+            )
+        started = time.perf_counter()
+        result = "error"
+        try:
+            self.logger.info(f"Sending message to Discord webhook: {name}")
+            for message in messages[len(sent) :]:
+                sent.append(
+                    await hook.execute(
+                        content=message.content,
+                        files=message.files,
                     )
                 )
+                if on_sent is not None:
+                    await on_sent(sent)
+            self.logger.info(f"Message sent to Discord webhook: {name}")
+            result = "ok"
+            if post is not None and self.message_index is not None:
+                await self.message_index.record(
+                    post,
+                    name,
+                    content,
+                    [
+                        SentMessage(
+                            id=str(data["id"]),
+                            content=message.content,
+                            media=bool(message.files),
+                        )
+                        for message, data in zip(messages, sent)
+                        if isinstance(data, dict) and "id" in data
+                    ],
+                )
+            return sent
+        except Exception as e:
+            self.logger.error(f"Error sending message to Discord webhook {name}: {e}")
+            raise
+        finally:
+            DISCORD_SEND_SECONDS.observe(
+                time.perf_counter() - started, webhook=name, result=result
+            )
 
-            if not content and not files:
-                continue
+    async def edit_post(self, post: IndexedPost, caption: str) -> None:
+        """Меняет текст уже доставленного поста во всех его вебхуках
 
-            try:
-                self.logger.info(f"Sending message to Discord webhook: {webhook.url}")
-                webhook.send(
-                    content=content,
-                    files=files or [],
-                    wait=True,
-                    suppress_embeds=True,
-                    silent=silent,
+        Вложения не загружаются заново: меняется только текст сообщений.
+
+        Args:
+            post (IndexedPost): Пост из индекса сообщений
+            caption (str): Новый текст поста
+        """
+        ref = PostRef(post.ref.chat_id, post.ref.key, post.ref.source_id, caption)
+        results = await asyncio.gather(
+            *(self._edit_delivery(delivery, ref) for delivery in post.deliveries),
+            return_exceptions=True,
+        )
+        for delivery, result in zip(post.deliveries, results):
+            if isinstance(result, Exception):
+                self.logger.error(
+                    f"Error editing post in webhook {delivery.webhook}: {result}",
+                    extra={"chat_id": ref.chat_id, "post": ref.key},
                 )
-                self.logger.info(f"Message sent to Discord webhook: {webhook.url}")
-            except Exception as e:
+
+    async def _edit_delivery(self, delivery: IndexedDelivery, ref: PostRef) -> None:
+        """Переносит новый текст в сообщения одной доставки
+
+        Текст занимает сообщения до первого сообщения с вложениями
+        включительно. Лишние текстовые сообщения удаляются, а если новый
+        текст длиннее, остаток сводится в последнее доступное сообщение:
+        вставить новое сообщение в середину поста нельзя.
+
+        Args:
+            delivery (IndexedDelivery): Доставка поста в вебхук
+            ref (PostRef): Пост с новым текстом
+        """
+        hook = self._get_hook(delivery.webhook)
+        text = ref.caption
+        messages = delivery.messages
+        slots = next(
+            (index + 1 for index, message in enumerate(messages) if message.media),
+            len(messages),
+        )
+        parts = split_content(text)
+        if len(parts) > slots:
+            self.logger.warning(
+                "Edited text does not fit the original messages, truncating",
+                extra={"webhook": delivery.webhook, "post": ref.key},
+            )
+            tail = " ".join(parts[slots - 1 :])
+            if len(tail) > MAX_CONTENT_LENGTH:
+                tail = tail[: MAX_CONTENT_LENGTH - 1] + "…"
+            parts = parts[: slots - 1] + [tail]
+
+        kept: List[SentMessage] = []
+        for index, message in enumerate(messages):
+            if index >= slots:
+                kept.append(message)
+                continue
+            content = parts[index] if index < len(parts) else ""
+            if not content and not message.media:
+                # Пустое сообщение без вложений Discord не примет
+                await hook.delete(message.id)
+                continue
+            if content != message.content:
+                await hook.edit(message.id, content)
+            kept.append(SentMessage(message.id, content, message.media))
+
+        if self.message_index is not None:
+            await self.message_index.record(ref, delivery.webhook, text, kept)
+
+    async def delete_post(self, post: IndexedPost) -> bool:
+        """Удаляет сообщения поста во всех вебхуках и забывает пост
+
+        Если удалить не удалось хотя бы в одном вебхуке, пост остается в
+        индексе, и удаление можно повторить.
+
+        Args:
+            post (IndexedPost): Пост из индекса сообщений
+
+        Returns:
+            bool: Пост удален во всех вебхуках
+        """
+        results = await asyncio.gather(
+            *(self._delete_delivery(delivery) for delivery in post.deliveries),
+            return_exceptions=True,
+        )
+        failed = False
+        for delivery, result in zip(post.deliveries, results):
+            if isinstance(result, Exception):
+                failed = True
                 self.logger.error(
-                    f"Error sending message to Discord webhook: {webhook.url}"
+                    f"Error deleting post in webhook {delivery.webhook}: {result}",
+                    extra={"chat_id": post.ref.chat_id, "post": post.ref.key},
                 )
-                raise
+        if failed:
+            return False
+        if self.message_index is not None:
+            await self.message_index.remove(post.ref)
+        return True
+
+    async def _delete_delivery(self, delivery: IndexedDelivery) -> None:
+        hook = self._get_hook(delivery.webhook)
+        for message in delivery.messages:
+            try:
+                await hook.delete(message.id)
+            except WebhookError as e:
+                # Сообщение уже удалено в Discord вручную
+                if e.status != 404:
+                    raise
+
+    async def close(self) -> None:
+        """Закрывает HTTP сессию"""
+        await self.client.close()
@@ -0,0 +1,230 @@
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.config import Settings
+from app.utils.logging import get_logger
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL,
+    messages TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    leased_by TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    webhooks TEXT
+);
+CREATE INDEX IF NOT EXISTS posts_chat ON posts (chat_id, id);
+CREATE INDEX IF NOT EXISTS posts_available ON posts (available_at);
+"""
+
+
+@dataclass
+class IngestJob:
+    """
+    Пост, выданный процессу обработки
+
+    Attributes:
+        id (int): ID записи в очереди
+        chat_id (int): ID канала
+        messages (List[Dict[str, Any]]): Сообщения поста (Message.to_dict())
+        attempts (int): Номер попытки, начиная с 1
+        webhooks (Optional[List[str]]): Вебхуки по маршрутам, None — все
+    """
+
+    id: int
+    chat_id: int
+    messages: List[Dict[str, Any]]
+    attempts: int
+    webhooks: Optional[List[str]] = None
+
+
+class IngestQueue:
+    """
+    Очередь постов между процессом приема обновлений и процессами обработки.
+
+    Хранится в SQLite, поэтому работает между процессами и переживает их
+    перезапуск. Пост выдается в аренду на lease_timeout: если процесс
+    обработки упал и не продлил аренду, пост выдается другому процессу.
+    Пока пост канала не обработан, следующие посты того же канала не
+    выдаются, поэтому порядок внутри канала сохраняется.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.config = settings.workers
+        self.root = Path(self.config.path or settings.general.temp_dir / "ingest")
+        self.logger = get_logger(__name__)
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(
+                self.root / "ingest.db",
+                check_same_thread=False,
+                isolation_level=None,
+                timeout=30,
+            )
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(posts)")}
+            if "webhooks" not in columns:
+                # База предыдущей версии
+                self._db.execute("ALTER TABLE posts ADD COLUMN webhooks TEXT")
+        return self._db
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[Any]:
+        with self._db_lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    async def put(
+        self,
+        chat_id: int,
+        messages: List[Dict[str, Any]],
+        webhooks: Optional[List[str]] = None,
+    ) -> None:
+        """Добавляет пост в очередь
+
+        Args:
+            chat_id (int): ID канала
+            messages (List[Dict[str, Any]]): Сообщения поста
+            webhooks (Optional[List[str]]): Вебхуки поста, по умолчанию все
+        """
+        now = time.time()
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO posts (chat_id, messages, created_at, available_at, "
+            "webhooks) VALUES (?, ?, ?, ?, ?)",
+            (
+                chat_id,
+                json.dumps(messages),
+                now,
+                now,
+                json.dumps(webhooks) if webhooks is not None else None,
+            ),
+        )
+        self.logger.info(
+            "Post handed to workers",
+            extra={"chat_id": chat_id, "messages": len(messages)},
+        )
+
+    async def lease(self, worker: str) -> Optional[IngestJob]:
+        """Выдает следующий доступный пост
+
+        Args:
+            worker (str): Имя процесса обработки
+
+        Returns:
+            Optional[IngestJob]: Пост или None, если выдавать нечего
+        """
+        return await asyncio.to_thread(self._lease, worker)
+
+    def _lease(self, worker: str) -> Optional[IngestJob]:
+        now = time.time()
+        with self._db_lock:
+            db = self._connect()
+            # IMMEDIATE блокирует запись сразу, чтобы два процесса не взяли один пост
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT id, chat_id, messages, attempts, webhooks FROM posts AS p "
+                    "WHERE available_at <= ? "
+                    "AND id = (SELECT MIN(id) FROM posts WHERE chat_id = p.chat_id) "
+                    "ORDER BY id LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    db.execute(
+                        "UPDATE posts SET leased_by = ?, available_at = ?, "
+                        "attempts = attempts + 1 WHERE id = ?",
+                        (worker, now + self.config.lease_timeout, row[0]),
+                    )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return None
+        post_id, chat_id, messages, attempts, webhooks = row
+        return IngestJob(
+            post_id,
+            chat_id,
+            json.loads(messages),
+            attempts + 1,
+            json.loads(webhooks) if webhooks is not None else None,
+        )
+
+    async def extend(self, job: IngestJob, worker: str) -> None:
+        """Продлевает аренду поста, пока он обрабатывается"""
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE posts SET available_at = ? WHERE id = ? AND leased_by = ?",
+            (time.time() + self.config.lease_timeout, job.id, worker),
+        )
+
+    async def ack(self, job: IngestJob) -> None:
+        """Удаляет обработанный пост из очереди"""
+        await asyncio.to_thread(
+            self._execute, "DELETE FROM posts WHERE id = ?", (job.id,)
+        )
+
+    async def fail(self, job: IngestJob, error: Exception) -> None:
+        """Возвращает пост в очередь с задержкой или сдается
+
+        Args:
+            job (IngestJob): Пост
+            error (Exception): Ошибка обработки
+        """
+        if job.attempts >= self.config.max_attempts:
+            self.logger.error(
+                f"Post failed permanently: {error}",
+                extra={"chat_id": job.chat_id, "attempts": job.attempts},
+            )
+            await self.ack(job)
+            return
+
+        delay = min(2 ** (job.attempts - 1), self.config.lease_timeout)
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE posts SET leased_by = NULL, available_at = ?, last_error = ? "
+            "WHERE id = ?",
+            (time.time() + delay, str(error), job.id),
+        )
+
+    async def wait_chat(self, chat_id: int) -> None:
+        """Ждет, пока процессы обработки не заберут все посты канала
+
+        Args:
+            chat_id (int): ID канала
+        """
+        while True:
+            rows = await asyncio.to_thread(
+                self._execute,
+                "SELECT COUNT(*) FROM posts WHERE chat_id = ?",
+                (chat_id,),
+            )
+            if not rows[0][0]:
+                return
+            await asyncio.sleep(self.config.poll_interval)
+
+    async def size(self) -> int:
+        """Количество постов в очереди"""
+        rows = await asyncio.to_thread(self._execute, "SELECT COUNT(*) FROM posts")
+        return rows[0][0]
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
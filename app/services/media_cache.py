@@ -0,0 +1,149 @@
+import os
+import re
+import shutil
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from app.utils.file_utils import make_temp_path
+from app.utils.logging import get_logger
+from app.utils.metrics import get_metrics
+
+
+CACHE_LOOKUPS = get_metrics().counter(
+    "media_cache_lookups_total", "Media cache lookups", ["transform", "result"]
+)
+CACHE_EVICTIONS = get_metrics().counter(
+    "media_cache_evictions_total", "Media cache entries evicted over the byte budget"
+)
+CACHE_BYTES = get_metrics().gauge("media_cache_bytes", "Size of the media cache")
+
+
+class MediaCache:
+    """
+    Дисковый LRU кэш медиа с ограничением по размеру.
+
+    Ключ — file_unique_id из Telegram и преобразование (raw, gif и т.д.),
+    поэтому повторные посты с тем же файлом не скачиваются и не
+    конвертируются заново. Записи хранятся файлами, порядок LRU
+    восстанавливается после перезапуска по времени изменения.
+    """
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.logger = get_logger(__name__)
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        if self.enabled:
+            self._load()
+            CACHE_BYTES.set_function(lambda: self._size)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def _key(file_unique_id: str, transform: str) -> str:
+        return re.sub(r"[^\w\-.]", "_", f"{file_unique_id}.{transform}")
+
+    def _load(self) -> None:
+        """Восстанавливает индекс из файлов кэша"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        files = sorted(
+            (entry for entry in self.root.iterdir() if entry.is_file()),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in files:
+            size = entry.stat().st_size
+            self._entries[entry.name] = size
+            self._size += size
+        self._evict()
+
+    def checkout(self, file_unique_id: str, transform: str) -> Optional[Path]:
+        """Возвращает копию записи кэша во временном файле
+
+        Копия делается жесткой ссылкой, поэтому вытеснение записи не
+        затрагивает файл, который еще отправляется.
+
+        Args:
+            file_unique_id (str): Уникальный ID файла в Telegram
+            transform (str): Преобразование (raw, gif и т.д.)
+
+        Returns:
+            Optional[Path]: Временный файл, который удаляет вызывающий код
+        """
+        if not self.enabled:
+            return None
+
+        key = self._key(file_unique_id, transform)
+        if key not in self._entries:
+            CACHE_LOOKUPS.inc(transform=transform, result="miss")
+            return None
+
+        source = self.root / key
+        destination = make_temp_path(source.suffix)
+        try:
+            _link_or_copy(source, destination)
+        except OSError as e:
+            # Файл пропал с диска — считаем промахом
+            self.logger.warning(f"Cache entry {key} is unreadable: {e}")
+            destination.unlink(missing_ok=True)
+            self._drop(key)
+            CACHE_LOOKUPS.inc(transform=transform, result="miss")
+            return None
+
+        self._entries.move_to_end(key)
+        os.utime(source)
+        CACHE_LOOKUPS.inc(transform=transform, result="hit")
+        return destination
+
+    def store(self, file_unique_id: str, transform: str, path: Path) -> None:
+        """Сохраняет файл в кэш (файл остается у вызывающего кода)
+
+        Args:
+            file_unique_id (str): Уникальный ID файла в Telegram
+            transform (str): Преобразование (raw, gif и т.д.)
+            path (Path): Файл для сохранения
+        """
+        if not self.enabled:
+            return
+
+        key = self._key(file_unique_id, transform)
+        size = path.stat().st_size
+        if size > self.max_bytes:
+            return
+
+        destination = self.root / key
+        if key in self._entries:
+            self._drop(key)
+        try:
+            _link_or_copy(path, destination)
+        except OSError as e:
+            self.logger.warning(f"Failed to cache {key}: {e}")
+            return
+
+        self._entries[key] = size
+        self._size += size
+        self._evict()
+
+    def _drop(self, key: str) -> None:
+        size = self._entries.pop(key, 0)
+        self._size -= size
+        (self.root / key).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        """Вытесняет давно не использованные записи сверх бюджета"""
+        while self._size > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._drop(key)
+            CACHE_EVICTIONS.inc()
+
+
+def _link_or_copy(source: Path, destination: Path) -> None:
+    """Создает жесткую ссылку, а если нельзя — копирует файл"""
+    destination.unlink(missing_ok=True)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
@@ -1,50 +1,365 @@
-import io
+import uuid
+import asyncio
+from collections import Counter
 from pathlib import Path
-from typing import List, Optional
-from telegram import Message, MessageEntity
+from typing import Any, Awaitable, Dict, List, Optional, Sequence, Tuple
+from telegram import Message
 from telegram.ext import ContextTypes
 
+from app.config import get_settings
 from app.models.file_payload import FilePayload
-from app.utils.file_utils import download_media
-from app.utils.video_converter import convert_mp4_to_gif
+from app.services.media_cache import MediaCache
+from app.utils.errors import FileTooLargeError
+from app.utils.file_utils import (
+    download_media,
+    is_streamable_mp4,
+    make_temp_path,
+    stream_media,
+)
+from app.utils.media_planner import plan_message
+from app.utils.sticker_renderer import render_sticker
+from app.utils.transcoder import fit_gif, fit_photo, fit_video
+from app.utils.video_converter import convert_mp4_to_gif, get_gif_profile
 from app.utils.logging import get_logger
 
 
 class MediaService:
-    def __init__(self):
+    def __init__(self, cache: Optional[MediaCache] = None):
         self.logger = get_logger(__name__)
+        self.settings = get_settings()
+        self.cache = cache
+        self._downloads = asyncio.Semaphore(
+            self.settings.telegram.max_concurrent_downloads
+        )
+        # Рендер одного стикера в нескольких постах сразу выполняется один раз
+        self._render_locks: Dict[str, asyncio.Lock] = {}
+        self._render_waiting: Counter = Counter()
+
+    async def build_group_payloads(
+        self,
+        messages: Sequence[Message],
+        context: ContextTypes.DEFAULT_TYPE,
+        started: Optional[Dict[int, Awaitable[List[FilePayload]]]] = None,
+    ) -> List[FilePayload]:
+        """Собирает файлы нескольких сообщений (медиа группы) параллельно
+
+        Args:
+            messages (Sequence[Message]): Сообщения в исходном порядке
+            context (ContextTypes.DEFAULT_TYPE): Контекст обновления
+            started (Optional[Dict[int, Awaitable[List[FilePayload]]]]): Уже
+                запущенная обработка по ID сообщения
+
+        Returns:
+            List[FilePayload]: Файлы в порядке сообщений
+        """
+        started = started or {}
+        results = await self._gather(
+            [
+                started.get(message.message_id) or self.build_payloads(message, context)
+                for message in messages
+            ],
+            [f"message {message.message_id}" for message in messages],
+        )
+        return [payload for payloads in results for payload in payloads]
 
     async def build_payloads(
         self, message: Message, context: ContextTypes.DEFAULT_TYPE
     ) -> List[FilePayload]:
-        payloads: List[FilePayload] = []
-
-        # Обработка фото
-        if message.photo:
-            self.logger.info("Photo found")
-            file_id = message.photo[-1].file_id
-            data = await download_media(file_id, context.bot)
-            payloads.append(self._make_payload(data, "jpg"))
-
-        # Обработка видео
-        if message.video:
-            self.logger.info("Video found")
-            file_id = message.video.file_id
-            data = await download_media(file_id, context.bot)
-            payloads.append(self._make_payload(data, "mp4"))
-
-        # Обработка анимации
-        if message.animation:
-            self.logger.info("Animation found")
-            file_id = message.animation.file_id
-            data = await download_media(file_id, context.bot)
-            gif_data = await convert_mp4_to_gif(data)
-            payloads.append(self._make_payload(gif_data, "gif"))
-
-        # TODO: Обработка стикеров
-
-        return payloads
-
-    def _make_payload(self, data: bytes, ext: str) -> FilePayload:
-        filename = f"media_{id(data)}.{ext}"
-        return FilePayload(data=data, filename=filename)
+        jobs: List[Awaitable[FilePayload]] = []
+        labels: List[str] = []
+
+        # Что и как скачивать, решается по метаданным до запросов к Bot API
+        for plan in plan_message(message, self.settings):
+            if plan.action == "skip":
+                self.logger.warning(
+                    f"Skipping {plan.kind}: {plan.reason}",
+                    extra={"file_size": plan.media.file_size, "reason": plan.reason},
+                )
+                continue
+
+            self.logger.info(
+                f"{plan.kind.capitalize()} found",
+                extra={"action": plan.action, "file_size": plan.media.file_size},
+            )
+            if plan.action == "convert" and plan.kind == "sticker":
+                jobs.append(self._build_sticker(plan.media, context.bot, plan.ext))
+            elif plan.action == "convert":
+                jobs.append(self._build_animation(plan.media, context.bot))
+            else:
+                jobs.append(self._build_file(plan.media, context.bot, plan.ext))
+            labels.append(plan.kind)
+
+        return await self._gather(jobs, labels)
+
+    async def _gather(self, jobs: List[Awaitable[Any]], labels: List[str]) -> List[Any]:
+        """Выполняет задачи параллельно, сохраняя порядок результатов
+
+        Ошибка одной задачи не отменяет остальные: она попадает в лог,
+        а результат пропускается. Если не удалась ни одна задача,
+        выбрасывается первая ошибка.
+
+        Args:
+            jobs (List[Awaitable[Any]]): Задачи
+            labels (List[str]): Названия задач для лога
+
+        Returns:
+            List[Any]: Результаты успешных задач
+        """
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        succeeded = []
+        errors = []
+        for label, result in zip(labels, results):
+            if isinstance(result, BaseException):
+                self.logger.error(
+                    f"Failed to build {label}: {result}", extra={"item": label}
+                )
+                errors.append(result)
+            else:
+                succeeded.append(result)
+
+        if errors and not succeeded:
+            raise errors[0]
+        return succeeded
+
+    @property
+    def _fit_enabled(self) -> bool:
+        return self.settings.conversion.fit_to_size
+
+    @property
+    def _fit_transform(self) -> str:
+        # Результат подгонки зависит от лимита, поэтому он входит в ключ кэша
+        return f"fit{self.settings.discord.max_file_size}"
+
+    async def _build_file(self, media, bot, ext: str) -> FilePayload:
+        max_size = self.settings.discord.max_file_size
+        if self._fit_enabled and (media.file_size or 0) > max_size:
+            # Уже подогнанный файл не нужно ни скачивать, ни пережимать
+            fitted = self._from_cache(media.file_unique_id, self._fit_transform)
+            if fitted is not None:
+                return self._make_payload(fitted, ext)
+
+        path = await self._fetch(media, bot, f".{ext}")
+        try:
+            path = await self._fit_to_size(path, media, ext)
+        except asyncio.CancelledError:
+            path.unlink(missing_ok=True)
+            raise
+        return self._make_payload(path, ext)
+
+    async def _fit_to_size(self, path: Path, media, ext: str) -> Path:
+        """Пережимает файл больше лимита Discord, чтобы не терять медиа
+
+        Args:
+            path (Path): Скачанный файл
+            media: Объект медиа Telegram
+            ext (str): Расширение (jpg, mp4)
+
+        Returns:
+            Path: Подогнанный файл или исходный, если подогнать не удалось
+        """
+        max_size = self.settings.discord.max_file_size
+        size = path.stat().st_size
+        if not self._fit_enabled or size <= max_size:
+            return path
+
+        self.logger.info(
+            "Fitting media to Discord size limit",
+            extra={"size": size, "max_size": max_size, "ext": ext},
+        )
+        if ext == "mp4":
+            fitted = await fit_video(path, max_size, getattr(media, "duration", None))
+        else:
+            fitted = await fit_photo(path, max_size)
+
+        if fitted is None:
+            self.logger.warning(f"Could not fit {ext} file of {size} bytes")
+            return path
+
+        path.unlink(missing_ok=True)
+        self._to_cache(media.file_unique_id, self._fit_transform, fitted)
+        return fitted
+
+    async def _build_animation(self, animation, bot) -> FilePayload:
+        gif_path = self._from_cache(animation.file_unique_id, "gif")
+        if gif_path is None:
+            path = self._from_cache(animation.file_unique_id, "raw")
+            try:
+                if path is None:
+                    path, gif_path = await self._stream_animation(animation, bot)
+                if gif_path is None:
+                    gif_path = await self._convert_animation(path)
+                gif_path = await self._fit_gif(path, gif_path)
+            except asyncio.CancelledError:
+                if gif_path is not None:
+                    gif_path.unlink(missing_ok=True)
+                raise
+            finally:
+                if path is not None:
+                    path.unlink(missing_ok=True)
+            self._to_cache(animation.file_unique_id, "gif", gif_path)
+        return self._make_payload(gif_path, "gif")
+
+    async def _stream_animation(self, animation, bot) -> Tuple[Path, Optional[Path]]:
+        """Скачивает анимацию, конвертируя ее в GIF прямо из потока загрузки
+
+        Если mp4 нельзя читать из pipe (moov в конце файла), файл просто
+        докачивается на диск и конвертируется уже из него.
+
+        Args:
+            animation: Объект анимации Telegram
+            bot: Объект бота Telegram
+
+        Returns:
+            Tuple[Path, Optional[Path]]: Скачанный mp4 и GIF, если он готов
+        """
+        path = make_temp_path(".mp4")
+        gif_path: Optional[Path] = None
+        try:
+            async with self._downloads:
+                async with stream_media(animation.file_id, bot, path) as stream:
+                    if is_streamable_mp4(await stream.head()):
+                        try:
+                            gif_path = await convert_mp4_to_gif(stream)
+                        except (RuntimeError, FileTooLargeError) as e:
+                            self.logger.warning(
+                                f"Piped conversion failed, retrying from file: {e}"
+                            )
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+
+        self._to_cache(animation.file_unique_id, "raw", path)
+        return path, gif_path
+
+    async def _convert_animation(self, source: Path) -> Path:
+        """Конвертирует mp4 в GIF профилем по умолчанию
+
+        GIF больше max_output_size профиля подгоняется под этот лимит.
+
+        Args:
+            source (Path): Исходное видео mp4
+
+        Returns:
+            Path: Временный файл GIF
+
+        Raises:
+            FileTooLargeError: GIF не удалось уложить в лимит профиля
+        """
+        try:
+            return await convert_mp4_to_gif(source)
+        except FileTooLargeError as e:
+            if not self._fit_enabled:
+                raise
+            fitted = await fit_gif(source, e.max_size, (get_gif_profile(), e.file_size))
+            if fitted is None:
+                raise
+            return fitted
+
+    async def _fit_gif(self, source: Path, gif_path: Path) -> Path:
+        """Подбирает параметры GIF больше лимита Discord
+
+        Args:
+            source (Path): Исходное видео mp4
+            gif_path (Path): GIF, сконвертированный профилем по умолчанию
+
+        Returns:
+            Path: Подогнанный GIF или исходный, если подогнать не удалось
+        """
+        max_size = self.settings.discord.max_file_size
+        size = gif_path.stat().st_size
+        if not self._fit_enabled or size <= max_size:
+            return gif_path
+
+        # Первая конвертация уже измерена, подбор начинается с нее
+        fitted = await fit_gif(source, max_size, (get_gif_profile(), size))
+        if fitted is None:
+            self.logger.warning(f"Could not fit GIF of {size} bytes")
+            return gif_path
+
+        gif_path.unlink(missing_ok=True)
+        return fitted
+
+    async def _build_sticker(self, sticker, bot, ext: str) -> FilePayload:
+        # Каналы повторяют одни и те же стикеры, поэтому рендер кэшируется.
+        # Параметры рендера входят в ключ, чтобы их смена не отдавала старое
+        config = self.settings.stickers
+        transform = (
+            f"sticker.{sticker.set_name or 'noset'}.{config.size}x{config.fps}.{ext}"
+        )
+        path = self._from_cache(sticker.file_unique_id, transform)
+        if path is not None:
+            return self._make_payload(path, ext)
+
+        key = f"{sticker.file_unique_id}.{transform}"
+        self._render_waiting[key] += 1
+        try:
+            async with self._render_locks.setdefault(key, asyncio.Lock()):
+                # Пока ждали, стикер мог отрендерить другой пост
+                path = self._from_cache(sticker.file_unique_id, transform)
+                if path is None:
+                    path = await self._render_sticker(sticker, bot)
+                    self._to_cache(sticker.file_unique_id, transform, path)
+        finally:
+            self._render_waiting[key] -= 1
+            if not self._render_waiting[key]:
+                del self._render_waiting[key]
+                del self._render_locks[key]
+        return self._make_payload(path, ext)
+
+    async def _render_sticker(self, sticker, bot) -> Path:
+        """Скачивает видео или анимированный стикер и рендерит его
+
+        Args:
+            sticker: Стикер Telegram
+            bot: Объект бота Telegram
+
+        Returns:
+            Path: Отрендеренный файл
+        """
+        source = await self._fetch(
+            sticker, bot, ".tgs" if sticker.is_animated else ".webm"
+        )
+        try:
+            return await render_sticker(source, sticker.is_animated)
+        finally:
+            source.unlink(missing_ok=True)
+
+    async def _fetch(self, media, bot, suffix: str) -> Path:
+        """Возвращает файл из кэша или скачивает его
+
+        Args:
+            media: Объект медиа Telegram (PhotoSize, Video, Animation, Sticker)
+            bot: Объект бота Telegram
+            suffix (str): Расширение временного файла
+
+        Returns:
+            Path: Временный файл, который удаляет вызывающий код
+        """
+        path = self._from_cache(media.file_unique_id, "raw")
+        if path is not None:
+            # Попадание в кэш: get_file и загрузка не нужны
+            return path
+
+        async with self._downloads:
+            path = await download_media(media.file_id, bot, suffix)
+        self._to_cache(media.file_unique_id, "raw", path)
+        return path
+
+    def _from_cache(self, file_unique_id: str, transform: str) -> Optional[Path]:
+        if self.cache is None:
+            return None
+        path = self.cache.checkout(file_unique_id, transform)
+        if path is not None:
+            self.logger.info(
+                "Media cache hit",
+                extra={"file_unique_id": file_unique_id, "transform": transform},
+            )
+        return path
+
+    def _to_cache(self, file_unique_id: str, transform: str, path: Path) -> None:
+        if self.cache is not None:
+            self.cache.store(file_unique_id, transform, path)
+
+    def _make_payload(self, path: Path, ext: str) -> FilePayload:
+        filename = f"media_{uuid.uuid4().hex[:12]}.{ext}"
+        return FilePayload.from_path(path, filename=filename, temporary=True)
@@ -0,0 +1,259 @@
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from telegram import Message
+
+from app.config import Settings
+from app.utils.logging import get_logger
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deliveries (
+    chat_id INTEGER NOT NULL,
+    post TEXT NOT NULL,
+    webhook TEXT NOT NULL,
+    source_id INTEGER NOT NULL,
+    caption TEXT NOT NULL,
+    text TEXT NOT NULL,
+    messages TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (chat_id, post, webhook)
+);
+CREATE INDEX IF NOT EXISTS deliveries_created ON deliveries (created_at);
+CREATE INDEX IF NOT EXISTS deliveries_source ON deliveries (chat_id, source_id);
+"""
+
+# Как часто чистить старые записи, в записях
+_PRUNE_EVERY = 100
+
+
+@dataclass(frozen=True)
+class PostRef:
+    """
+    Пост Telegram, доставленный в Discord
+
+    Attributes:
+        chat_id (int): ID канала
+        key (str): Ключ поста: g<media_group_id> или m<message_id>
+        source_id (int): ID первого сообщения поста
+        caption (str): Текст поста без ссылок на вложения
+    """
+
+    chat_id: int
+    key: str
+    source_id: int
+    caption: str
+
+    @classmethod
+    def from_messages(cls, messages: Sequence[Message], caption: str) -> "PostRef":
+        first = messages[0]
+        if first.media_group_id:
+            key = f"g{first.media_group_id}"
+        else:
+            key = f"m{first.message_id}"
+        return cls(first.chat.id, key, first.message_id, caption)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class SentMessage:
+    """
+    Сообщение вебхука, из которых состоит доставка поста
+
+    Attributes:
+        id (str): ID сообщения Discord
+        content (str): Текст сообщения
+        media (bool): В сообщении есть вложения
+    """
+
+    id: str
+    content: str
+    media: bool
+
+
+@dataclass
+class IndexedDelivery:
+    """
+    Доставка поста в один вебхук
+
+    Attributes:
+        webhook (str): Имя вебхука
+        text (str): Полный текст, с которым пост был отправлен
+        messages (List[SentMessage]): Сообщения в порядке отправки
+    """
+
+    webhook: str
+    text: str
+    messages: List[SentMessage] = field(default_factory=list)
+
+
+@dataclass
+class IndexedPost:
+    """
+    Пост и все его доставки
+
+    Attributes:
+        ref (PostRef): Пост
+        deliveries (List[IndexedDelivery]): Доставки по вебхукам
+    """
+
+    ref: PostRef
+    deliveries: List[IndexedDelivery]
+
+
+class MessageIndex:
+    """
+    Соответствие постов Telegram сообщениям вебхуков Discord.
+
+    Хранится в SQLite, поэтому общий для процесса приема обновлений и
+    процессов обработки и переживает перезапуск. Записи старше max_age
+    и сверх max_entries удаляются, начиная со старых.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.config = settings.edits
+        self.root = Path(self.config.path or settings.general.temp_dir / "messages")
+        self.logger = get_logger(__name__)
+        self._writes = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(
+                self.root / "messages.db",
+                check_same_thread=False,
+                isolation_level=None,
+                timeout=30,
+            )
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[Any]:
+        with self._db_lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    async def record(
+        self, ref: PostRef, webhook: str, text: str, messages: List[SentMessage]
+    ) -> None:
+        """Сохраняет или заменяет доставку поста в вебхук
+
+        Args:
+            ref (PostRef): Пост
+            webhook (str): Имя вебхука
+            text (str): Полный текст, с которым пост был отправлен
+            messages (List[SentMessage]): Сообщения вебхука
+        """
+        await asyncio.to_thread(self._record, ref, webhook, text, messages)
+
+    def _record(
+        self, ref: PostRef, webhook: str, text: str, messages: List[SentMessage]
+    ) -> None:
+        self._execute(
+            "INSERT INTO deliveries (chat_id, post, webhook, source_id, caption, "
+            "text, messages, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (chat_id, post, webhook) DO UPDATE SET "
+            "caption = excluded.caption, text = excluded.text, "
+            "messages = excluded.messages",
+            (
+                ref.chat_id,
+                ref.key,
+                webhook,
+                ref.source_id,
+                ref.caption,
+                text,
+                json.dumps([asdict(message) for message in messages]),
+                time.time(),
+            ),
+        )
+        self._writes += 1
+        if self._writes % _PRUNE_EVERY == 0:
+            self._prune()
+
+    def _prune(self) -> None:
+        self._execute(
+            "DELETE FROM deliveries WHERE created_at < ?",
+            (time.time() - self.config.max_age,),
+        )
+        self._execute(
+            "DELETE FROM deliveries WHERE rowid NOT IN "
+            "(SELECT rowid FROM deliveries ORDER BY created_at DESC LIMIT ?)",
+            (self.config.max_entries,),
+        )
+
+    async def get(self, chat_id: int, key: str) -> Optional[IndexedPost]:
+        """Пост по ключу
+
+        Args:
+            chat_id (int): ID канала
+            key (str): Ключ поста (PostRef.key)
+
+        Returns:
+            Optional[IndexedPost]: Пост или None, если его нет или он устарел
+        """
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT post, source_id, caption, webhook, text, messages "
+            "FROM deliveries WHERE chat_id = ? AND post = ? AND created_at >= ?",
+            (chat_id, key, time.time() - self.config.max_age),
+        )
+        return _to_post(chat_id, rows)
+
+    async def find(self, chat_id: int, message_id: int) -> Optional[IndexedPost]:
+        """Пост по ID его первого сообщения
+
+        Args:
+            chat_id (int): ID канала
+            message_id (int): ID первого сообщения поста
+
+        Returns:
+            Optional[IndexedPost]: Пост или None
+        """
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT post, source_id, caption, webhook, text, messages "
+            "FROM deliveries WHERE chat_id = ? AND source_id = ?",
+            (chat_id, message_id),
+        )
+        return _to_post(chat_id, rows)
+
+    async def remove(self, ref: PostRef) -> None:
+        """Удаляет все доставки поста"""
+        await asyncio.to_thread(
+            self._execute,
+            "DELETE FROM deliveries WHERE chat_id = ? AND post = ?",
+            (ref.chat_id, ref.key),
+        )
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def _to_post(chat_id: int, rows: List[Any]) -> Optional[IndexedPost]:
+    if not rows:
+        return None
+    key, source_id, caption = rows[0][:3]
+    return IndexedPost(
+        ref=PostRef(chat_id, key, source_id, caption),
+        deliveries=[
+            IndexedDelivery(
+                webhook=webhook,
+                text=text,
+                messages=[SentMessage(**item) for item in json.loads(messages)],
+            )
+            for _, _, _, webhook, text, messages in rows
+        ],
+    )
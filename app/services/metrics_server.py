@@ -0,0 +1,49 @@
+import logging
+from typing import Optional
+
+from aiohttp import web
+
+from app.config import MetricsConfig
+from app.utils.metrics import MetricsRegistry, get_metrics
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsServer:
+    """
+    HTTP эндпоинт для сбора метрик Prometheus (GET /metrics).
+    """
+
+    def __init__(
+        self,
+        config: MetricsConfig,
+        registry: Optional[MetricsRegistry] = None,
+        port: Optional[int] = None,
+    ) -> None:
+        self.config = config
+        self.registry = registry or get_metrics()
+        self.port = port or config.port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _handle(self, _: web.Request) -> web.Response:
+        return web.Response(
+            body=self.registry.render().encode(),
+            headers={"Content-Type": CONTENT_TYPE},
+        )
+
+    async def start(self) -> None:
+        """Запускает HTTP сервер"""
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.config.listen, self.port).start()
+        logger.info(f"Serving metrics on {self.config.listen}:{self.port}/metrics")
+
+    async def stop(self) -> None:
+        """Останавливает HTTP сервер"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,277 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional
+
+from app.config import WebhookConfig
+from app.models.file_payload import FilePayload
+from app.services.webhook_client import WebhookClient, WebhookResponse
+from app.utils.errors import WebhookError
+from app.utils.logging import get_logger
+from app.utils.metrics import get_metrics
+
+DISCORD_RESPONSES = get_metrics().counter(
+    "discord_responses_total", "Discord webhook responses", ["webhook", "status"]
+)
+DISCORD_RATE_LIMITED = get_metrics().counter(
+    "discord_rate_limited_total", "Discord 429 responses", ["webhook", "scope"]
+)
+DISCORD_QUEUE_DEPTH = get_metrics().gauge(
+    "discord_webhook_queue_depth",
+    "Requests waiting for or running against a webhook",
+    ["webhook"],
+)
+DISCORD_WAIT_SECONDS = get_metrics().histogram(
+    "discord_rate_limit_wait_seconds",
+    "Time a webhook request waited for its rate limit bucket",
+    ["webhook"],
+)
+
+
+@dataclass
+class RateLimitBucket:
+    """
+    Состояние бакета ограничений Discord
+
+    Attributes:
+        key (str): Идентификатор бакета (X-RateLimit-Bucket)
+        limit (Optional[int]): Лимит запросов в окне
+        remaining (Optional[int]): Оставшиеся запросы в окне
+        reset_at (float): Момент сброса окна по часам цикла событий
+    """
+
+    key: str
+    limit: Optional[int] = None
+    remaining: Optional[int] = None
+    reset_at: float = 0.0
+
+    def delay(self, now: float) -> float:
+        """Сколько ждать до следующего запроса"""
+        if self.remaining is not None and self.remaining <= 0 and self.reset_at > now:
+            return self.reset_at - now
+        return 0.0
+
+    def reserve(self) -> None:
+        """Резервирует запрос до получения ответа"""
+        if self.remaining is not None:
+            self.remaining -= 1
+
+
+class RateLimiter:
+    """
+    Отслеживает бакеты ограничений Discord по заголовкам X-RateLimit-*.
+
+    Вебхуки, которым Discord выдал один и тот же бакет, делят его состояние.
+    """
+
+    def __init__(self) -> None:
+        self.logger = get_logger(__name__)
+        self._buckets: Dict[str, RateLimitBucket] = {}
+        self._routes: Dict[str, str] = {}
+        self._global_reset_at = 0.0
+
+    def bucket_for(self, route: str) -> RateLimitBucket:
+        """Возвращает бакет маршрута (URL вебхука)"""
+        key = self._routes.get(route, route)
+        return self._buckets.setdefault(key, RateLimitBucket(key=key))
+
+    def delay(self, route: str, now: float) -> float:
+        """Сколько ждать до отправки по маршруту с учетом глобального лимита"""
+        return max(self.bucket_for(route).delay(now), self._global_reset_at - now, 0.0)
+
+    def update(self, route: str, headers: Mapping[str, str], now: float) -> None:
+        """Обновляет состояние бакета по заголовкам ответа
+
+        Args:
+            route (str): Маршрут (URL вебхука)
+            headers (Mapping[str, str]): Заголовки ответа
+            now (float): Текущее время цикла событий
+        """
+        key = headers.get("X-RateLimit-Bucket")
+        if key and self._routes.get(route) != key:
+            # Временный бакет маршрута становится бакетом Discord
+            provisional = self._buckets.pop(route, None)
+            self._routes[route] = key
+            if key not in self._buckets and provisional is not None:
+                provisional.key = key
+                self._buckets[key] = provisional
+
+        bucket = self.bucket_for(route)
+        if "X-RateLimit-Limit" in headers:
+            bucket.limit = int(headers["X-RateLimit-Limit"])
+        if "X-RateLimit-Remaining" in headers:
+            bucket.remaining = int(headers["X-RateLimit-Remaining"])
+        if "X-RateLimit-Reset-After" in headers:
+            bucket.reset_at = now + float(headers["X-RateLimit-Reset-After"])
+
+    def block(
+        self, route: str, retry_after: float, is_global: bool, now: float
+    ) -> None:
+        """Блокирует маршрут (или все маршруты) после ответа 429
+
+        Args:
+            route (str): Маршрут (URL вебхука)
+            retry_after (float): Через сколько секунд можно повторить
+            is_global (bool): Глобальное ограничение
+            now (float): Текущее время цикла событий
+        """
+        if is_global:
+            self._global_reset_at = max(self._global_reset_at, now + retry_after)
+            return
+        bucket = self.bucket_for(route)
+        bucket.remaining = 0
+        bucket.reset_at = max(bucket.reset_at, now + retry_after)
+
+
+class WebhookScheduler:
+    """
+    Планировщик отправок в один вебхук.
+
+    Отправки выходят в порядке поступления, как только бакет позволяет.
+    Ответ 429 не теряет сообщение: оно ждет retry_after и уходит снова.
+    """
+
+    def __init__(
+        self,
+        hook: WebhookConfig,
+        client: WebhookClient,
+        limiter: RateLimiter,
+        concurrency: asyncio.Semaphore,
+        max_retries: int = 10,
+    ) -> None:
+        self.hook = hook
+        self.client = client
+        self.limiter = limiter
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        # Запросы, ожидающие или выполняющиеся сейчас
+        self.queue_depth = 0
+        self.logger = get_logger(__name__)
+        self._lock = asyncio.Lock()
+
+    async def execute(
+        self,
+        content: str = "",
+        files: Optional[List[FilePayload]] = None,
+    ) -> Any:
+        """Ставит отправку в очередь вебхука и дожидается ее выполнения
+
+        Args:
+            content (str): Текст сообщения
+            files (Optional[List[FilePayload]]): Файлы для отправки
+
+        Raises:
+            WebhookError: Discord вернул ошибку или лимит повторов исчерпан
+
+        Returns:
+            Any: Объект сообщения Discord
+        """
+        return await self._request(
+            lambda: self.client.execute(
+                self.hook.url,
+                content=content,
+                files=files,
+                silent=self.hook.silent,
+            )
+        )
+
+    async def edit(self, message_id: str, content: str) -> Any:
+        """Меняет текст отправленного сообщения
+
+        Args:
+            message_id (str): ID сообщения Discord
+            content (str): Новый текст
+
+        Raises:
+            WebhookError: Discord вернул ошибку или лимит повторов исчерпан
+
+        Returns:
+            Any: Объект сообщения Discord
+        """
+        return await self._request(
+            lambda: self.client.edit_message(self.hook.url, message_id, content)
+        )
+
+    async def delete(self, message_id: str) -> None:
+        """Удаляет отправленное сообщение
+
+        Args:
+            message_id (str): ID сообщения Discord
+
+        Raises:
+            WebhookError: Discord вернул ошибку или лимит повторов исчерпан
+        """
+        await self._request(
+            lambda: self.client.delete_message(self.hook.url, message_id)
+        )
+
+    async def _request(self, send: Callable[[], Awaitable[WebhookResponse]]) -> Any:
+        """Выполняет запрос в очереди вебхука, повторяя его после 429
+
+        Args:
+            send (Callable[[], Awaitable[WebhookResponse]]): Запрос к Discord
+
+        Returns:
+            Any: Тело ответа
+        """
+        loop = asyncio.get_running_loop()
+        waited = 0.0
+        self._set_depth(self.queue_depth + 1)
+        try:
+            for _ in range(self.max_retries + 1):
+                waited += await self._acquire()
+                async with self.concurrency:
+                    response = await send()
+                self.limiter.update(self.hook.url, response.headers, loop.time())
+                DISCORD_RESPONSES.inc(webhook=self.hook.name, status=response.status)
+                if response.status == 429:
+                    self._handle_rate_limit(response)
+                    continue
+                if not response.ok:
+                    raise WebhookError(response.status, str(response.data))
+                return response.data
+            raise WebhookError(429, "Rate limit retries exhausted")
+        finally:
+            self._set_depth(self.queue_depth - 1)
+            DISCORD_WAIT_SECONDS.observe(waited, webhook=self.hook.name)
+            if waited:
+                self.logger.info(
+                    f"Webhook {self.hook.name} delayed by rate limit",
+                    extra={"webhook": self.hook.name, "wait": round(waited, 3)},
+                )
+
+    def _set_depth(self, depth: int) -> None:
+        self.queue_depth = depth
+        DISCORD_QUEUE_DEPTH.set(depth, webhook=self.hook.name)
+
+    async def _acquire(self) -> float:
+        """Ждет свободный слот в бакете (FIFO)
+
+        Returns:
+            float: Время ожидания, сек
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        async with self._lock:
+            while (delay := self.limiter.delay(self.hook.url, loop.time())) > 0:
+                await asyncio.sleep(delay)
+            self.limiter.bucket_for(self.hook.url).reserve()
+        return loop.time() - started
+
+    def _handle_rate_limit(self, response: WebhookResponse) -> None:
+        """Разбирает ответ 429 и блокирует бакет до retry_after"""
+        loop = asyncio.get_running_loop()
+        body = response.data if isinstance(response.data, dict) else {}
+        retry_after = float(
+            body.get("retry_after") or response.headers.get("Retry-After") or 1.0
+        )
+        is_global = bool(body.get("global")) or (
+            response.headers.get("X-RateLimit-Scope") == "global"
+        )
+        DISCORD_RATE_LIMITED.inc(
+            webhook=self.hook.name, scope="global" if is_global else "bucket"
+        )
+        self.limiter.block(self.hook.url, retry_after, is_global, loop.time())
+        self.logger.warning(
+            f"Webhook {self.hook.name} rate limited",
+            extra={"retry_after": retry_after, "global": is_global},
+        )
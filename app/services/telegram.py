@@ -1,6 +1,11 @@
+import signal
+import asyncio
 import logging
+from typing import Awaitable, Callable, List, Optional
+from telegram import Update
 from telegram.ext import ApplicationBuilder
 from app.config import get_settings
+from app.services.telegram_webhook import TelegramWebhookServer
 
 logger = logging.getLogger(__name__)
 
@@ -9,22 +14,54 @@ class TelegramService:
     def __init__(self) -> None:
         self.settings = get_settings()
         self._app = None
+        self.webhook_server: Optional[TelegramWebhookServer] = None
+        self._startup_callbacks: List[Callable[[], Awaitable[None]]] = []
+        self._shutdown_callbacks: List[Callable[[], Awaitable[None]]] = []
 
     @property
     def app(self) -> ApplicationBuilder:
         """Lazy load the Telegram application."""
         if self._app is None:
-            self._app = (
+            builder = (
                 ApplicationBuilder()
                 .token(self.settings.telegram.bot_token)
                 .post_init(self.on_startup)
-                .build()
+                .post_shutdown(self.on_shutdown)
             )
+            if self.settings.telegram.base_url:
+                builder = builder.base_url(self.settings.telegram.base_url)
+            if self.settings.telegram.base_file_url:
+                builder = builder.base_file_url(self.settings.telegram.base_file_url)
+            if self.settings.telegram.mode == "webhook":
+                # Ограниченная очередь дает обратное давление на HTTP сервер
+                builder = builder.update_queue(
+                    asyncio.Queue(maxsize=self.settings.telegram.webhook.max_queue_size)
+                ).updater(None)
+            self._app = builder.build()
         return self._app
 
+    def add_startup_callback(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """Register a coroutine to run after the application is initialized."""
+        self._startup_callbacks.append(callback)
+
+    def add_shutdown_callback(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """Register a coroutine to run when the application shuts down."""
+        self._shutdown_callbacks.append(callback)
+
     async def on_startup(self, _) -> None:
+        for callback in self._startup_callbacks:
+            await callback()
         logger.info("Telegram bot initialized")
 
+    async def on_shutdown(self, _) -> None:
+        # Освобождаем ресурсы в обратном порядке
+        for callback in reversed(self._shutdown_callbacks):
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"Error during shutdown: {e}")
+        logger.info("Telegram bot shut down")
+
     async def start(self) -> None:
         """Start the Telegram bot."""
         if self._app is None:
@@ -40,3 +77,40 @@ class TelegramService:
         await self._app.stop()
         await self._app.shutdown()
         logger.info("Telegram bot stopped.")
+
+    def run(self) -> None:
+        """Run the bot in the configured ingestion mode until stopped."""
+        if self.settings.telegram.mode == "webhook":
+            asyncio.run(self._run_webhook())
+        else:
+            self.app.run_polling(allowed_updates=Update.ALL_TYPES)
+
+    async def _run_webhook(self) -> None:
+        """Receive updates on the embedded HTTP server."""
+        config = self.settings.telegram.webhook
+        app = self.app
+        self.webhook_server = TelegramWebhookServer(app, config)
+
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+
+        async with app:
+            await self.on_startup(app)
+            await app.start()
+            await self.webhook_server.start()
+            if config.public_url:
+                await app.bot.set_webhook(
+                    url=config.public_url,
+                    secret_token=config.secret_token,
+                    max_connections=config.max_connections,
+                    allowed_updates=Update.ALL_TYPES,
+                )
+                logger.info(f"Webhook registered: {config.public_url}")
+            try:
+                await stop_event.wait()
+            finally:
+                await self.webhook_server.stop()
+                await app.stop()
+                await self.on_shutdown(app)
@@ -0,0 +1,115 @@
+import hmac
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from app.config import TelegramWebhookConfig
+from app.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+WEBHOOK_REQUESTS = get_metrics().counter(
+    "telegram_webhook_requests_total", "Telegram webhook requests", ["status"]
+)
+
+
+@dataclass
+class WebhookServerStats:
+    """
+    Статистика приема обновлений
+
+    Attributes:
+        accepted (int): Принятые обновления
+        rejected_auth (int): Запросы с неверным секретом
+        rejected_invalid (int): Запросы с некорректным телом
+        rejected_full (int): Отказы из-за заполненной очереди
+    """
+
+    accepted: int = 0
+    rejected_auth: int = 0
+    rejected_invalid: int = 0
+    rejected_full: int = 0
+
+
+class TelegramWebhookServer:
+    """
+    HTTP сервер для приема обновлений Telegram через вебхук.
+
+    Обновления кладутся в update_queue приложения. Если очередь заполнена,
+    сервер отвечает 503, и Telegram повторит доставку позже.
+    """
+
+    def __init__(self, application: Application, config: TelegramWebhookConfig):
+        self.application = application
+        self.config = config
+        self.stats = WebhookServerStats()
+        self._runner: Optional[web.AppRunner] = None
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.config.path, self._handle)
+        return app
+
+    async def start(self) -> None:
+        """Запускает HTTP сервер"""
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.config.listen, self.config.port)
+        await site.start()
+        logger.info(
+            f"Listening for Telegram updates on "
+            f"{self.config.listen}:{self.config.port}{self.config.path}"
+        )
+
+    async def stop(self) -> None:
+        """Останавливает HTTP сервер"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        secret = self.config.secret_token
+        if secret and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ""), secret
+        ):
+            self.stats.rejected_auth += 1
+            WEBHOOK_REQUESTS.inc(status=403)
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            self.stats.rejected_invalid += 1
+            WEBHOOK_REQUESTS.inc(status=400)
+            logger.warning(f"Invalid update received: {e}")
+            return web.Response(status=400)
+
+        try:
+            self.application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Обратное давление: Telegram повторит запрос позже
+            self.stats.rejected_full += 1
+            WEBHOOK_REQUESTS.inc(status=503)
+            return web.Response(status=503, headers={"Retry-After": "1"})
+
+        self.stats.accepted += 1
+        WEBHOOK_REQUESTS.inc(status=200)
+        return web.Response()
+
+    def snapshot(self) -> dict[str, Any]:
+        """Статистика сервера и глубина очереди"""
+        return {
+            "accepted": self.stats.accepted,
+            "rejected_auth": self.stats.rejected_auth,
+            "rejected_invalid": self.stats.rejected_invalid,
+            "rejected_full": self.stats.rejected_full,
+            "queue_depth": self.application.update_queue.qsize(),
+        }
@@ -0,0 +1,163 @@
+import json
+from dataclasses import dataclass
+from typing import Any, List, Mapping, Optional
+
+import aiohttp
+from yarl import URL
+
+from app.models.file_payload import FilePayload
+from app.utils.logging import get_logger
+
+
+# Флаги сообщения Discord
+SUPPRESS_EMBEDS = 1 << 2
+SUPPRESS_NOTIFICATIONS = 1 << 12
+
+
+@dataclass
+class WebhookResponse:
+    """
+    Ответ Discord на запрос к вебхуку
+
+    Attributes:
+        status (int): HTTP статус
+        headers (Mapping[str, str]): Заголовки ответа
+        data (Any): Тело ответа (JSON или текст)
+    """
+
+    status: int
+    headers: Mapping[str, str]
+    data: Any
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+
+class WebhookClient:
+    """
+    Асинхронный HTTP клиент для вебхуков Discord.
+
+    Все запросы идут через одну общую сессию с пулом соединений,
+    поэтому отправка в несколько вебхуков не блокирует цикл событий.
+    """
+
+    def __init__(self, connection_limit: int = 10, timeout: float = 120.0) -> None:
+        self.logger = get_logger(__name__)
+        self._connection_limit = connection_limit
+        self._timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Лениво создает сессию внутри работающего цикла событий
+
+        Returns:
+            aiohttp.ClientSession: Общая сессия
+        """
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._connection_limit),
+                timeout=aiohttp.ClientTimeout(total=self._timeout),
+            )
+        return self._session
+
+    async def execute(
+        self,
+        url: str,
+        content: str = "",
+        files: Optional[List[FilePayload]] = None,
+        silent: bool = False,
+    ) -> WebhookResponse:
+        """Выполняет вебхук (POST)
+
+        Ошибки не выбрасываются: статус и заголовки ограничений
+        разбирает планировщик.
+
+        Args:
+            url (str): URL вебхука
+            content (str): Текст сообщения
+            files (Optional[List[FilePayload]]): Файлы для отправки
+            silent (bool): Отправить без уведомления
+
+        Returns:
+            WebhookResponse: Ответ Discord
+        """
+        flags = SUPPRESS_EMBEDS
+        if silent:
+            flags |= SUPPRESS_NOTIFICATIONS
+
+        payload: dict[str, Any] = {"content": content, "flags": flags}
+        form = aiohttp.FormData()
+        payload["attachments"] = [
+            {"id": index, "filename": file.filename}
+            for index, file in enumerate(files or [])
+        ]
+        form.add_field(
+            "payload_json", json.dumps(payload), content_type="application/json"
+        )
+        # Файлы с диска отправляются потоком, из памяти — без копирования
+        handles = []
+        for index, file in enumerate(files or []):
+            if file.data is not None:
+                body = file.data
+            else:
+                body = file.open()
+                handles.append(body)
+            form.add_field(
+                f"files[{index}]",
+                body,
+                filename=file.filename,
+                content_type="application/octet-stream",
+            )
+
+        target = URL(url).update_query(wait="true")
+        try:
+            return await self._request("POST", target, data=form)
+        finally:
+            for handle in handles:
+                handle.close()
+
+    async def edit_message(
+        self, url: str, message_id: str, content: str
+    ) -> WebhookResponse:
+        """Меняет текст сообщения вебхука (PATCH), вложения не трогаются
+
+        Args:
+            url (str): URL вебхука
+            message_id (str): ID сообщения Discord
+            content (str): Новый текст
+
+        Returns:
+            WebhookResponse: Ответ Discord
+        """
+        target = URL(url) / "messages" / str(message_id)
+        return await self._request("PATCH", target, json={"content": content})
+
+    async def delete_message(self, url: str, message_id: str) -> WebhookResponse:
+        """Удаляет сообщение вебхука
+
+        Args:
+            url (str): URL вебхука
+            message_id (str): ID сообщения Discord
+
+        Returns:
+            WebhookResponse: Ответ Discord
+        """
+        target = URL(url) / "messages" / str(message_id)
+        return await self._request("DELETE", target)
+
+    async def _request(self, method: str, url: URL, **kwargs: Any) -> WebhookResponse:
+        async with self._get_session().request(method, url, **kwargs) as response:
+            if response.content_type == "application/json":
+                data = await response.json()
+            else:
+                data = await response.text()
+            return WebhookResponse(
+                status=response.status, headers=response.headers, data=data
+            )
+
+    async def close(self) -> None:
+        """Закрывает сессию"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,100 @@
+import asyncio
+import multiprocessing
+from multiprocessing.process import BaseProcess
+from typing import Any, Dict, List, Optional
+
+from app.config import WorkersConfig
+from app.utils.logging import get_logger
+
+# Как часто проверять, живы ли процессы
+CHECK_INTERVAL = 1.0
+
+# Сколько ждать завершения процесса после SIGTERM
+STOP_TIMEOUT = 30.0
+
+
+def _run_worker(index: int) -> None:
+    # Импорт внутри процесса: spawn загружает модуль заново
+    from app.worker import main
+
+    main(index)
+
+
+class WorkerSupervisor:
+    """
+    Запускает процессы обработки и перезапускает упавшие.
+
+    Посты упавшего процесса не теряются: их аренда в IngestQueue истекает,
+    и они выдаются другому процессу.
+    """
+
+    def __init__(self, config: WorkersConfig) -> None:
+        self.config = config
+        self.logger = get_logger(__name__)
+        # spawn не наследует цикл событий и соединения родителя
+        self._mp = multiprocessing.get_context("spawn")
+        self._processes: List[Optional[BaseProcess]] = [None] * config.count
+        self._restarts = [0] * config.count
+        self._monitor: Optional[asyncio.Task] = None
+
+    def _spawn(self, index: int) -> None:
+        process = self._mp.Process(
+            target=_run_worker, args=(index,), name=f"worker-{index}", daemon=False
+        )
+        process.start()
+        self._processes[index] = process
+        self.logger.info(f"Started worker-{index}", extra={"pid": process.pid})
+
+    async def start(self) -> None:
+        """Запускает процессы и наблюдение за ними"""
+        for index in range(self.config.count):
+            self._spawn(index)
+        self._monitor = asyncio.create_task(self._watch())
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL)
+            for index, process in enumerate(self._processes):
+                if process is None or process.is_alive():
+                    continue
+                self.logger.error(
+                    f"worker-{index} exited with code {process.exitcode}, restarting"
+                )
+                process.close()
+                self._processes[index] = None
+                self._restarts[index] += 1
+                await asyncio.sleep(self.config.restart_delay)
+                self._spawn(index)
+
+    async def stop(self) -> None:
+        """Останавливает процессы, давая им доработать начатые посты"""
+        if self._monitor is not None:
+            self._monitor.cancel()
+            await asyncio.gather(self._monitor, return_exceptions=True)
+            self._monitor = None
+
+        running = [process for process in self._processes if process is not None]
+        for process in running:
+            process.terminate()
+        await asyncio.gather(
+            *(asyncio.to_thread(self._join, process) for process in running)
+        )
+        self._processes = [None] * self.config.count
+
+    def _join(self, process: BaseProcess) -> None:
+        process.join(STOP_TIMEOUT)
+        if process.is_alive():
+            self.logger.warning(f"{process.name} did not stop in time, killing")
+            process.kill()
+            process.join()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Состояние процессов и число перезапусков"""
+        return {
+            f"worker-{index}": {
+                "pid": process.pid if process is not None else None,
+                "alive": process is not None and process.is_alive(),
+                "restarts": self._restarts[index],
+            }
+            for index, process in enumerate(self._processes)
+        }
@@ -31,3 +31,17 @@ class MediaDownloadError(Exception):
         """
         self.file_id = file_id
         super().__init__(message)
+
+
+class WebhookError(Exception):
+    """Для обработки ошибок, связанных с отправкой в вебхук Discord."""
+
+    def __init__(self, status: int, message: str):
+        """Инициализация ошибки.
+
+        Args:
+            status (int): HTTP статус ответа
+            message (str): Сообщение об ошибке
+        """
+        self.status = status
+        super().__init__(f"Webhook request failed with status {status}: {message}")
@@ -0,0 +1,246 @@
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, BinaryIO, List, Optional, Set
+
+from app.config import get_settings
+from app.utils.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# Размер блока при чтении вывода ffmpeg
+PIPE_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class ConversionStats:
+    """
+    Статистика пула конвертации
+
+    Attributes:
+        completed (int): Успешные конвертации
+        failed (int): Неуспешные конвертации
+        total_seconds (float): Суммарное время работы ffmpeg
+        max_seconds (float): Самая долгая конвертация
+        last_seconds (float): Время последней конвертации
+        total_wait (float): Суммарное ожидание в очереди
+    """
+
+    completed: int = 0
+    failed: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_seconds: float = 0.0
+    total_wait: float = 0.0
+
+    def record(self, seconds: float, wait: float) -> None:
+        self.last_seconds = seconds
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.total_wait += wait
+
+
+class FFmpegPool:
+    """
+    Пул конвертации с ограниченным числом процессов ffmpeg.
+
+    Задачи ждут в ограниченной очереди, а одновременно работает не больше
+    workers процессов, поэтому всплеск GIF не перегружает процессор.
+    Процессы запускаются через asyncio, вход и выход можно передавать
+    через pipe без промежуточных файлов.
+    """
+
+    def __init__(self, workers: int, queue_size: int, timeout: float) -> None:
+        self.workers = workers
+        self.timeout = timeout
+        self.stats = ConversionStats()
+        self._queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_started(self) -> asyncio.Queue:
+        """Лениво запускает воркеры в текущем цикле событий"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self._queue_size)
+            for index in range(self.workers):
+                task = asyncio.create_task(self._worker(index))
+                self._tasks.add(task)
+        return self._queue
+
+    async def run(
+        self,
+        cmd: List[str],
+        label: str = "ffmpeg",
+        stdin: Optional[AsyncIterable[bytes]] = None,
+        stdout: Optional[BinaryIO] = None,
+    ) -> float:
+        """Ставит команду ffmpeg в очередь и ждет ее завершения
+
+        Args:
+            cmd (List[str]): Команда ffmpeg
+            label (str): Название задачи для лога
+            stdin (Optional[AsyncIterable[bytes]]): Источник для pipe:0
+            stdout (Optional[BinaryIO]): Приемник для pipe:1, пишется по мере вывода
+
+        Raises:
+            RuntimeError: ffmpeg завершился с ошибкой или по таймауту
+
+        Returns:
+            float: Время работы ffmpeg, сек
+        """
+        queue = self._ensure_started()
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        # Если очередь заполнена, вызывающий код ждет свободного места
+        await queue.put((cmd, label, stdin, stdout, time.perf_counter(), future))
+        return await future
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            cmd, label, stdin, stdout, queued_at, future = await self._queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                started = time.perf_counter()
+                wait = started - queued_at
+                try:
+                    await self._execute(cmd, stdin, stdout)
+                except Exception as e:
+                    self.stats.failed += 1
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+
+                seconds = time.perf_counter() - started
+                self.stats.completed += 1
+                self.stats.record(seconds, wait)
+                logger.info(
+                    f"Conversion {label} finished in {seconds:.2f}s",
+                    extra={
+                        "worker": index,
+                        "duration": round(seconds, 3),
+                        "queue_wait": round(wait, 3),
+                    },
+                )
+                if not future.done():
+                    future.set_result(seconds)
+            finally:
+                self._queue.task_done()
+
+    async def _execute(
+        self,
+        cmd: List[str],
+        stdin: Optional[AsyncIterable[bytes]],
+        stdout: Optional[BinaryIO],
+    ) -> None:
+        """Запускает ffmpeg и перекачивает данные через pipe"""
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=(
+                asyncio.subprocess.PIPE
+                if stdin is not None
+                else asyncio.subprocess.DEVNULL
+            ),
+            stdout=(
+                asyncio.subprocess.PIPE
+                if stdout is not None
+                else asyncio.subprocess.DEVNULL
+            ),
+            stderr=asyncio.subprocess.PIPE,
+        )
+        jobs = [process.stderr.read()]
+        if stdin is not None:
+            jobs.append(_feed(process, stdin))
+        if stdout is not None:
+            jobs.append(_pump(process, stdout))
+
+        try:
+            stderr, *_ = await asyncio.wait_for(asyncio.gather(*jobs), self.timeout)
+            await asyncio.wait_for(process.wait(), self.timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"FFmpeg timed out after {self.timeout}s") from None
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+        if process.returncode != 0:
+            message = stderr.decode(errors="replace")
+            logger.error(f"FFmpeg error: {message}")
+            raise RuntimeError(f"FFmpeg conversion failed: {message}")
+
+    def snapshot(self) -> dict[str, Any]:
+        """Статистика пула"""
+        done = self.stats.completed + self.stats.failed
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "completed": self.stats.completed,
+            "failed": self.stats.failed,
+            "avg_seconds": (
+                self.stats.total_seconds / self.stats.completed
+                if self.stats.completed
+                else 0.0
+            ),
+            "max_seconds": self.stats.max_seconds,
+            "last_seconds": self.stats.last_seconds,
+            "avg_wait": self.stats.total_wait / done if done else 0.0,
+        }
+
+    async def close(self) -> None:
+        """Останавливает воркеры"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._queue = None
+
+
+async def _feed(
+    process: asyncio.subprocess.Process, source: AsyncIterable[bytes]
+) -> None:
+    """Передает данные в stdin ffmpeg с учетом обратного давления"""
+    try:
+        async for chunk in source:
+            process.stdin.write(chunk)
+            await process.stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        # ffmpeg закончил читать раньше (например, сработал -fs)
+        pass
+    finally:
+        process.stdin.close()
+
+
+async def _pump(process: asyncio.subprocess.Process, sink: BinaryIO) -> None:
+    """Пишет вывод ffmpeg в приемник по мере поступления"""
+    while chunk := await process.stdout.read(PIPE_CHUNK_SIZE):
+        sink.write(chunk)
+
+
+# Глобальный пул конвертации
+_pool: Optional[FFmpegPool] = None
+
+
+def get_ffmpeg_pool() -> FFmpegPool:
+    """Фабрика пула конвертации для ленивой инициализации
+
+    Returns:
+        FFmpegPool: Экземпляр пула
+    """
+    global _pool
+    if _pool is None:
+        config = get_settings().conversion
+        _pool = FFmpegPool(config.workers, config.queue_size, config.timeout)
+    return _pool
+
+
+async def close_ffmpeg_pool() -> None:
+    """Закрывает глобальный пул конвертации"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
@@ -1,44 +1,93 @@
-from typing import Optional
+import os
+import time
+import asyncio
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, List, Optional
 
+import httpx
 from telegram.error import BadRequest, TelegramError
 
 from app.utils.logging import get_logger
 from app.config import get_settings
 from app.utils.errors import FileTooLargeError, MediaDownloadError
+from app.utils.metrics import get_metrics
 
 
 logger = get_logger(__name__)
 
+DOWNLOAD_SECONDS = get_metrics().histogram(
+    "telegram_download_seconds", "Telegram media download time", ["mode"]
+)
+DOWNLOAD_BYTES = get_metrics().counter(
+    "telegram_download_bytes_total", "Bytes downloaded from Telegram", ["mode"]
+)
 
-async def download_media(file_id: str, bot) -> bytes:
-    """Просто скачивает медиа из Telegram.
+# Размер блока при потоковой загрузке
+CHUNK_SIZE = 64 * 1024
+
+# Общий HTTP клиент для загрузки файлов
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=10.0))
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Закрывает общий HTTP клиент загрузки."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def make_temp_path(suffix: str = "") -> Path:
+    """Создает пустой временный файл в temp_dir.
+
+    Args:
+        suffix (str): Расширение файла.
+    Returns:
+        Path: Путь к временному файлу.
+    """
+    temp_dir = Path(get_settings().general.temp_dir)
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    fd, name = tempfile.mkstemp(dir=temp_dir, suffix=suffix)
+    os.close(fd)
+    return Path(name)
+
+
+async def _stream_to_file(tg_file, destination: Path) -> None:
+    """Скачивает файл Telegram блоками прямо на диск."""
+    file_path = tg_file.file_path
+    if not file_path.startswith(("http://", "https://")):
+        # Локальный Bot API сервер отдает путь на диске
+        await tg_file.download_to_drive(destination)
+        return
+
+    async with _get_http_client().stream("GET", file_path) as response:
+        response.raise_for_status()
+        with destination.open("wb") as out:
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                out.write(chunk)
+
+
+async def _get_file(file_id: str, bot):
+    """Получает файл Telegram и проверяет его размер.
 
     Args:
         file_id (str): ID файла в Telegram.
         bot: Объект бота Telegram.
     Returns:
-        bytes: Скачанный файл в виде байтового массива.
+        telegram.File: Файл Telegram.
     """
-
     settings = get_settings()
     try:
         tg_file = await bot.get_file(file_id)
-        file_size = tg_file.file_size
-        if file_size > settings.telegram.max_file_size:
-            logger.error(f"File {file_id} is too large: {file_size} bytes.")
-            raise FileTooLargeError(file_id, file_size, settings.telegram.max_file_size)
-
-        logger.info(
-            "Downloading...",
-            extra={
-                "file_id": file_id,
-                "file_size": file_size,
-                "max_size": settings.telegram.max_file_size,
-            },
-        )
-        file_bytes = await tg_file.download_as_bytearray()
-
-        return file_bytes
     except BadRequest as e:
         if "File is too big" in str(e):
             logger.error(
@@ -55,9 +104,165 @@ async def download_media(file_id: str, bot) -> bytes:
             "Telegram client error", extra={"file_id": file_id, "error": str(e)}
         )
         raise MediaDownloadError(file_id, "Telegram client error")
+
+    file_size = tg_file.file_size
+    if file_size and file_size > settings.telegram.max_file_size:
+        logger.error(f"File {file_id} is too large: {file_size} bytes.")
+        raise FileTooLargeError(file_id, file_size, settings.telegram.max_file_size)
+
+    logger.info(
+        "Downloading...",
+        extra={
+            "file_id": file_id,
+            "file_size": file_size,
+            "max_size": settings.telegram.max_file_size,
+        },
+    )
+    return tg_file
+
+
+async def download_media(file_id: str, bot, suffix: str = "") -> Path:
+    """Скачивает медиа из Telegram потоком во временный файл.
+
+    Args:
+        file_id (str): ID файла в Telegram.
+        bot: Объект бота Telegram.
+        suffix (str): Расширение временного файла.
+    Returns:
+        Path: Путь к скачанному файлу. Удалять его должен вызывающий код.
+    """
+
+    started = time.perf_counter()
+    tg_file = await _get_file(file_id, bot)
+    destination = make_temp_path(suffix)
+    try:
+        await _stream_to_file(tg_file, destination)
+        DOWNLOAD_SECONDS.observe(time.perf_counter() - started, mode="file")
+        DOWNLOAD_BYTES.inc(destination.stat().st_size, mode="file")
+        return destination
+    except asyncio.CancelledError:
+        destination.unlink(missing_ok=True)
+        raise
     except Exception as e:
+        # Недокачанный файл не должен оставаться на диске
+        destination.unlink(missing_ok=True)
         logger.error(
             "Unexpected error in download_media",
             extra={"file_id": file_id, "error": str(e)},
         )
         raise MediaDownloadError(file_id, "Unexpected error")
+
+
+class MediaStream:
+    """
+    Поток загрузки файла Telegram.
+
+    Блоки отдаются потребителю (например, в stdin ffmpeg) и одновременно
+    записываются на диск. Если потребитель остановился раньше, остаток
+    дописывается в drain.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], out: BinaryIO) -> None:
+        self._chunks = chunks
+        self._out = out
+        self._buffer: List[bytes] = []
+
+    async def head(self, size: int = CHUNK_SIZE) -> bytes:
+        """Читает начало файла, не теряя его для потребителя."""
+        while sum(map(len, self._buffer)) < size:
+            try:
+                chunk = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                break
+            self._out.write(chunk)
+            self._buffer.append(chunk)
+        return b"".join(self._buffer)[:size]
+
+    def __aiter__(self) -> "MediaStream":
+        return self
+
+    async def __anext__(self) -> bytes:
+        if self._buffer:
+            return self._buffer.pop(0)
+        chunk = await self._chunks.__anext__()
+        self._out.write(chunk)
+        return chunk
+
+    async def drain(self) -> None:
+        """Дописывает на диск то, что потребитель не прочитал."""
+        self._buffer.clear()
+        async for _ in self:
+            pass
+
+
+async def _read_file_chunks(path: Path) -> AsyncIterator[bytes]:
+    with path.open("rb") as source:
+        while chunk := source.read(CHUNK_SIZE):
+            yield chunk
+
+
+@asynccontextmanager
+async def stream_media(file_id: str, bot, destination: Path):
+    """Открывает поток загрузки медиа с параллельной записью на диск.
+
+    После выхода из контекста файл destination скачан целиком.
+
+    Args:
+        file_id (str): ID файла в Telegram.
+        bot: Объект бота Telegram.
+        destination (Path): Куда сохранить файл.
+    Yields:
+        MediaStream: Поток блоков файла.
+    """
+    started = time.perf_counter()
+    tg_file = await _get_file(file_id, bot)
+    file_path = tg_file.file_path
+    try:
+        if not file_path.startswith(("http://", "https://")):
+            # Локальный Bot API сервер: файл уже на диске
+            await tg_file.download_to_drive(destination)
+            with open(os.devnull, "wb") as sink:
+                yield MediaStream(_read_file_chunks(destination), sink)
+            return
+
+        async with _get_http_client().stream("GET", file_path) as response:
+            response.raise_for_status()
+            with destination.open("wb") as out:
+                stream = MediaStream(response.aiter_bytes(CHUNK_SIZE), out)
+                yield stream
+                await stream.drain()
+        # Время включает обработку потока потребителем (конвертацию)
+        DOWNLOAD_SECONDS.observe(time.perf_counter() - started, mode="stream")
+        DOWNLOAD_BYTES.inc(destination.stat().st_size, mode="stream")
+    except httpx.HTTPError as e:
+        logger.error(
+            "Error streaming media", extra={"file_id": file_id, "error": str(e)}
+        )
+        raise MediaDownloadError(file_id, "Download stream error") from e
+
+
+def is_streamable_mp4(head: bytes) -> bool:
+    """Проверяет, можно ли читать mp4 из pipe без перемотки.
+
+    ffmpeg читает mp4 из pipe, только если атом moov идет раньше mdat
+    (faststart). Иначе нужен файл на диске.
+
+    Args:
+        head (bytes): Начало файла.
+    Returns:
+        bool: True, если moov найден раньше mdat.
+    """
+    offset = 0
+    while offset + 8 <= len(head):
+        size = int.from_bytes(head[offset : offset + 4], "big")
+        box = head[offset + 4 : offset + 8]
+        if box == b"moov":
+            return True
+        if box == b"mdat":
+            return False
+        if size == 1 and offset + 16 <= len(head):
+            size = int.from_bytes(head[offset + 8 : offset + 16], "big")
+        if size < 8:
+            return False
+        offset += size
+    return False
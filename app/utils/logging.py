@@ -1,8 +1,110 @@
 import sys
+import copy
+import json
+import time
+import queue
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
+
+
+# Стандартные атрибуты LogRecord: все остальное пришло через extra
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись в одну строку JSON вместе с полями extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Ограничивает частоту повторяющихся сообщений.
+
+    Сообщения из одного места кода (логгер, файл и строка) пропускаются не
+    чаще burst раз за period секунд. Первое сообщение следующего окна
+    получает поле suppressed с числом отброшенных. Предупреждения и ошибки
+    пропускаются всегда. Хранится не больше max_keys окон: давно не
+    использованные вытесняются первыми.
+    """
+
+    def __init__(
+        self, burst: int = 20, period: float = 1.0, max_keys: int = 1024
+    ) -> None:
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[Tuple[str, str, int], list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        # Текст f-строк меняется от вызова к вызову, а место вызова нет
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.period:
+                suppressed = window[2] if window is not None else 0
+                self._windows[key] = [now, 1, 0]
+                self._windows.move_to_end(key)
+                while len(self._windows) > self.max_keys:
+                    self._windows.popitem(last=False)
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            self._windows.move_to_end(key)
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+class _LoopSafeQueueHandler(QueueHandler):
+    """Кладет запись в очередь, почти не тратя время вызывающего потока
+
+    В отличие от QueueHandler.prepare, сообщение не форматируется целиком:
+    подставляются только аргументы, а поля extra остаются в записи.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Traceback нельзя передать в другой поток после выхода из except
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _Listener(QueueListener):
+    """QueueListener, который можно останавливать повторно"""
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            super().stop()
 
 
 def setup_logget(
@@ -11,15 +113,27 @@ def setup_logget(
     max_bytes: int = 5 * 1024 * 1024,
     backup_count: int = 3,
     libs: Optional[list[str]] = None,
-) -> None:
+    json_format: bool = True,
+    rate_limit: Optional[int] = 20,
+    rate_period: float = 1.0,
+) -> QueueListener:
     """Настраивает логирование в файл и на консоль.
 
+    Вызывающий поток только кладет запись в очередь, а форматирование,
+    запись в файл и ротация выполняются в отдельном потоке.
+
     Args:
         log_file (str): Путь к файлу лога.
         log_level (str): Уровень логирования.
         max_bytes (int): Максимальный размер файла лога в байтах.
         backup_count (int): Количество резервных файлов лога.
         libs (Optional[list[str]]): Список библиотек для настройки уровня логирования.
+        json_format (bool): Писать файл лога в JSON с полями extra.
+        rate_limit (Optional[int]): Сколько одинаковых сообщений пропускать
+            за rate_period, None отключает ограничение.
+        rate_period (float): Окно ограничения частоты в секундах.
+    Returns:
+        QueueListener: Поток записи логов. Останавливается при выходе.
     """
     log_path = Path(log_file)
     log_path.parent.mkdir(parents=True, exist_ok=True)
@@ -36,7 +150,7 @@ def setup_logget(
         encoding="utf-8",
     )
 
-    file_handler.setFormatter(formatter)
+    file_handler.setFormatter(JsonFormatter() if json_format else formatter)
     file_handler.setLevel(log_level)
 
     # Обработчик для консоли
@@ -44,14 +158,27 @@ def setup_logget(
     console_bandler.setFormatter(formatter)
     console_bandler.setLevel("INFO")
 
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = _Listener(
+        log_queue, file_handler, console_bandler, respect_handler_level=True
+    )
+    listener.start()
+    # Оставшиеся в очереди записи дописываются при выходе
+    atexit.register(listener.stop)
+
+    queue_handler = _LoopSafeQueueHandler(log_queue)
+    if rate_limit is not None:
+        queue_handler.addFilter(RateLimitFilter(rate_limit, rate_period))
+
     root_logger = logging.getLogger()
     root_logger.setLevel(log_level)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_bandler)
+    root_logger.addHandler(queue_handler)
 
     for lib in libs or []:
         logging.getLogger(lib).setLevel("WARNING")
 
+    return listener
+
 
 def get_logger(name: Optional[str] = None) -> logging.Logger:
     return logging.getLogger(name)
@@ -0,0 +1,142 @@
+from typing import List, Optional, Sequence
+
+from telegram import Message, PhotoSize, Sticker
+
+from app.config import Settings
+from app.models.media_plan import MediaPlan
+from app.utils.sticker_renderer import STICKER_EXTENSIONS
+from app.utils.metrics import get_metrics
+
+
+MEDIA_PLANNED = get_metrics().counter(
+    "media_planned_total",
+    "Media planning decisions made from message metadata",
+    ["kind", "action"],
+)
+
+
+def choose_photo_size(sizes: Sequence[PhotoSize], max_size: int) -> Optional[PhotoSize]:
+    """Самый большой вариант фото, который помещается в лимит
+
+    Размеры отсортированы Telegram по возрастанию. Вариант без file_size
+    считается подходящим: его размер проверится после скачивания.
+
+    Args:
+        sizes (Sequence[PhotoSize]): Варианты фото
+        max_size (int): Лимит размера файла
+
+    Returns:
+        Optional[PhotoSize]: Вариант или None, если все больше лимита
+    """
+    for size in reversed(sizes):
+        if size.file_size is None or size.file_size <= max_size:
+            return size
+    return None
+
+
+def plan_message(message: Message, settings: Settings) -> List[MediaPlan]:
+    """Решает по метаданным сообщения, какие файлы скачивать и как
+
+    Ни get_file, ни скачивание не выполняются: размеры берутся из
+    file_size вложений. Файлы больше лимита Bot API пропускаются сразу,
+    фото заменяется меньшим вариантом, а видео больше лимита Discord
+    пережимается, если это разрешено.
+
+    Args:
+        message (Message): Сообщение Telegram
+        settings (Settings): Настройки
+
+    Returns:
+        List[MediaPlan]: Решения по вложениям в порядке обработки
+    """
+    plans: List[MediaPlan] = []
+    download_limit = settings.telegram.max_file_size
+    discord_limit = settings.discord.max_file_size
+    fit = settings.conversion.fit_to_size
+
+    if message.photo:
+        size = choose_photo_size(message.photo, discord_limit)
+        if size is not None:
+            plans.append(MediaPlan("photo", size, "jpg", "send"))
+        else:
+            # Даже самый маленький вариант больше лимита Discord: пережимается
+            # самый маленький, его дешевле скачать и меньше нужно сжимать
+            size = next(
+                (size for size in message.photo if not _exceeds(size, download_limit)),
+                None,
+            )
+            if size is None:
+                plans.append(
+                    MediaPlan(
+                        "photo", message.photo[-1], "jpg", "skip", "bot_api_limit"
+                    )
+                )
+            else:
+                plans.append(_oversized("photo", size, "jpg", fit))
+
+    if message.video:
+        plans.append(_plan_file("video", message.video, "mp4", settings))
+
+    if message.animation:
+        animation = message.animation
+        if _exceeds(animation, download_limit):
+            plans.append(
+                MediaPlan("animation", animation, "gif", "skip", "bot_api_limit")
+            )
+        else:
+            # Размер GIF заранее неизвестен, он подгоняется после конвертации
+            plans.append(MediaPlan("animation", animation, "gif", "convert"))
+
+    if message.sticker and settings.stickers.enabled:
+        plans.append(plan_sticker(message.sticker, settings))
+
+    for plan in plans:
+        MEDIA_PLANNED.inc(kind=plan.kind, action=plan.action)
+    return plans
+
+
+def plan_sticker(sticker: Sticker, settings: Settings) -> MediaPlan:
+    """Решает, как отправить стикер
+
+    Статичный WebP отправляется как есть. Видео (WebM) и анимированные (TGS)
+    стикеры рендерятся в animated_format. Если рендерер TGS не настроен,
+    вместо анимации отправляется статичная миниатюра.
+
+    Args:
+        sticker (Sticker): Стикер
+        settings (Settings): Настройки
+
+    Returns:
+        MediaPlan: Решение по стикеру
+    """
+    config = settings.stickers
+    ext = STICKER_EXTENSIONS[config.animated_format]
+    if _exceeds(sticker, settings.telegram.max_file_size):
+        return MediaPlan("sticker", sticker, ext, "skip", "bot_api_limit")
+    if sticker.is_video:
+        return MediaPlan("sticker", sticker, ext, "convert")
+    if not sticker.is_animated:
+        return MediaPlan("sticker", sticker, "webp", "send")
+    if config.tgs_renderer:
+        return MediaPlan("sticker", sticker, ext, "convert")
+    if sticker.thumbnail is not None:
+        return MediaPlan("sticker", sticker.thumbnail, "webp", "send")
+    return MediaPlan("sticker", sticker, ext, "skip", "no_tgs_renderer")
+
+
+def _plan_file(kind: str, media, ext: str, settings: Settings) -> MediaPlan:
+    if not _exceeds(media, settings.discord.max_file_size):
+        return MediaPlan(kind, media, ext, "send")
+    if _exceeds(media, settings.telegram.max_file_size):
+        return MediaPlan(kind, media, ext, "skip", "bot_api_limit")
+    return _oversized(kind, media, ext, settings.conversion.fit_to_size)
+
+
+def _oversized(kind: str, media, ext: str, fit: bool) -> MediaPlan:
+    if fit:
+        return MediaPlan(kind, media, ext, "fit")
+    return MediaPlan(kind, media, ext, "skip", "discord_limit")
+
+
+def _exceeds(media, limit: int) -> bool:
+    return media.file_size is not None and media.file_size > limit
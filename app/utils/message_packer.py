@@ -0,0 +1,137 @@
+from typing import List, Literal
+
+from app.models.discord_message import DiscordMessage
+from app.models.file_payload import FilePayload
+
+
+# Лимит длины текста сообщения Discord
+MAX_CONTENT_LENGTH = 2000
+
+# Запас на payload_json и заголовки multipart в размере запроса
+REQUEST_OVERHEAD = 64 * 1024
+
+# Границы разбиения текста, от более предпочтительных к менее
+SPLIT_SEPARATORS = ["\n\n", "\n", ". ", " "]
+
+
+def split_content(content: str, limit: int = MAX_CONTENT_LENGTH) -> List[str]:
+    """Разбивает текст на части не длиннее limit.
+
+    Разрез ставится на последней подходящей границе: абзаце, строке,
+    предложении или пробеле. Если границы нет, текст режется по лимиту.
+
+    Args:
+        content (str): Текст.
+        limit (int): Максимальная длина части.
+    Returns:
+        List[str]: Части текста в исходном порядке.
+    """
+    parts: List[str] = []
+    rest = content.strip()
+    while len(rest) > limit:
+        cut = -1
+        for separator in SPLIT_SEPARATORS:
+            index = rest.rfind(separator, 0, limit - len(separator) + 1)
+            # Слишком короткие части хуже, чем разрез на менее удачной границе
+            if index > limit // 2:
+                cut = index + len(separator)
+                break
+        if cut == -1:
+            cut = limit
+        parts.append(rest[:cut].rstrip())
+        rest = rest[cut:].lstrip()
+    if rest:
+        parts.append(rest)
+    return parts
+
+
+def pack_files(
+    files: List[FilePayload],
+    max_files: int,
+    max_bytes: int,
+    strategy: Literal["ordered", "compact"] = "ordered",
+) -> List[List[FilePayload]]:
+    """Раскладывает файлы по сообщениям с учетом лимитов количества и размера.
+
+    ordered сохраняет порядок файлов: сообщение заполняется, пока файл
+    помещается. Для разбиения без перестановок это дает минимальное число
+    сообщений. compact раскладывает файлы по убыванию размера в первое
+    подходящее сообщение (first-fit decreasing), что может сэкономить
+    сообщения ценой порядка; внутри сообщения исходный порядок сохраняется.
+
+    Args:
+        files (List[FilePayload]): Файлы.
+        max_files (int): Лимит вложений в сообщении.
+        max_bytes (int): Лимит суммарного размера вложений.
+        strategy (Literal["ordered", "compact"]): Способ раскладки.
+    Returns:
+        List[List[FilePayload]]: Файлы по сообщениям.
+    """
+    sizes = {id(file): file.size for file in files}
+    bins: List[List[FilePayload]] = []
+    used: List[int] = []
+
+    def fits(index: int, size: int) -> bool:
+        return len(bins[index]) < max_files and used[index] + size <= max_bytes
+
+    if strategy == "ordered":
+        for file in files:
+            size = sizes[id(file)]
+            if not bins or not fits(-1, size):
+                bins.append([])
+                used.append(0)
+            bins[-1].append(file)
+            used[-1] += size
+        return bins
+
+    order = {id(file): position for position, file in enumerate(files)}
+    for file in sorted(files, key=lambda item: sizes[id(item)], reverse=True):
+        size = sizes[id(file)]
+        # Файл больше лимита запроса все равно уходит, но отдельным сообщением
+        target = next((i for i in range(len(bins)) if fits(i, size)), None)
+        if target is None:
+            bins.append([])
+            used.append(0)
+            target = len(bins) - 1
+        bins[target].append(file)
+        used[target] += size
+    for group in bins:
+        group.sort(key=lambda item: order[id(item)])
+    bins.sort(key=lambda group: order[id(group[0])])
+    return bins
+
+
+def pack_message(
+    content: str,
+    files: List[FilePayload],
+    max_files: int = 10,
+    max_bytes: int = 25 * 1024 * 1024,
+    strategy: Literal["ordered", "compact"] = "ordered",
+) -> List[DiscordMessage]:
+    """Разбивает пост на сообщения, которые Discord примет.
+
+    Сначала идут части текста, последняя часть отправляется вместе с
+    первыми вложениями, за ними остальные вложения.
+
+    Args:
+        content (str): Текст поста.
+        files (List[FilePayload]): Вложения.
+        max_files (int): Лимит вложений в сообщении.
+        max_bytes (int): Лимит размера запроса.
+        strategy (Literal["ordered", "compact"]): Раскладка вложений.
+    Returns:
+        List[DiscordMessage]: Сообщения в порядке отправки.
+    """
+    texts = split_content(content) or [""]
+    file_groups = pack_files(
+        files, max_files, max(max_bytes - REQUEST_OVERHEAD, 1), strategy
+    )
+
+    messages = [DiscordMessage(content=text) for text in texts]
+    tail = messages[-1]
+    for group in file_groups:
+        if tail.files:
+            tail = DiscordMessage()
+            messages.append(tail)
+        tail.files = group
+    return messages
@@ -0,0 +1,99 @@
+from pathlib import Path
+from typing import List
+
+from app.config import StickerConfig, get_settings
+from app.utils.ffmpeg_pool import get_ffmpeg_pool
+from app.utils.file_utils import make_temp_path
+from app.utils.logging import get_logger
+from app.utils.metrics import get_metrics
+
+
+logger = get_logger(__name__)
+
+STICKER_RENDER_SECONDS = get_metrics().histogram(
+    "sticker_render_seconds", "Run time of animated sticker renders", ["source"]
+)
+
+# Расширение файла для Discord по формату анимированного стикера
+STICKER_EXTENSIONS = {"gif": "gif", "apng": "png"}
+
+
+def build_video_sticker_command(
+    source: Path, output: Path, config: StickerConfig
+) -> List[str]:
+    """Собирает команду ffmpeg для рендера видеостикера (WebM VP9).
+
+    Видеостикеры прозрачные: альфа-канал VP9 читает только декодер
+    libvpx, поэтому он указывается явно.
+
+    Args:
+        source (Path): Файл webm.
+        output (Path): Выходной файл.
+        config (StickerConfig): Настройки стикеров.
+    Returns:
+        List[str]: Команда ffmpeg.
+    """
+    base = f"fps={config.fps},scale={config.size}:-1:flags=lanczos"
+    cmd = ["ffmpeg", "-y", "-c:v", "libvpx-vp9", "-i", str(source)]
+    if config.animated_format == "apng":
+        return cmd + ["-vf", base, "-plays", "0", "-f", "apng", str(output)]
+    return cmd + [
+        "-vf",
+        f"{base},split[s0][s1];"
+        "[s0]palettegen=reserve_transparent=1[p];[s1][p]paletteuse=alpha_threshold=128",
+        "-loop",
+        "0",
+        str(output),
+    ]
+
+
+def build_tgs_command(source: Path, output: Path, config: StickerConfig) -> List[str]:
+    """Подставляет файлы и параметры в команду рендера TGS из настроек.
+
+    Args:
+        source (Path): Файл tgs.
+        output (Path): Выходной файл.
+        config (StickerConfig): Настройки стикеров.
+    Returns:
+        List[str]: Команда рендера.
+    """
+    values = {
+        "input": str(source),
+        "output": str(output),
+        "size": config.size,
+        "fps": config.fps,
+    }
+    return [part.format(**values) for part in config.tgs_renderer]
+
+
+async def render_sticker(source: Path, animated: bool) -> Path:
+    """Рендерит видео или анимированный стикер в animated_format.
+
+    Рендер идет в пуле конвертации, поэтому всплеск стикеров не запускает
+    больше процессов, чем conversion.workers.
+
+    Args:
+        source (Path): Скачанный файл стикера (webm или tgs).
+        animated (bool): Стикер в формате TGS (Lottie), иначе WebM.
+    Returns:
+        Path: Путь к временному файлу. Удалять его должен вызывающий код.
+    """
+    config = get_settings().stickers
+    output_path = make_temp_path(f".{STICKER_EXTENSIONS[config.animated_format]}")
+    kind = "tgs" if animated else "webm"
+    try:
+        if animated:
+            cmd = build_tgs_command(source, output_path, config)
+        else:
+            cmd = build_video_sticker_command(source, output_path, config)
+        elapsed = await get_ffmpeg_pool().run(cmd, label=f"{kind} sticker")
+        STICKER_RENDER_SECONDS.observe(elapsed, source=kind)
+
+        if not output_path.exists() or output_path.stat().st_size == 0:
+            raise FileNotFoundError(f"Rendered sticker is empty: {output_path}")
+
+        logger.debug(f"Rendered {kind} sticker to {output_path}")
+        return output_path
+    except BaseException:
+        output_path.unlink(missing_ok=True)
+        raise
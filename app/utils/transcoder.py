@@ -0,0 +1,253 @@
+import math
+import asyncio
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.config import get_settings, GifProfile
+from app.utils.ffmpeg_pool import get_ffmpeg_pool
+from app.utils.file_utils import make_temp_path
+from app.utils.logging import get_logger
+from app.utils.video_converter import build_gif_command
+
+
+logger = get_logger(__name__)
+
+# Битрейт звука при пережатии видео
+AUDIO_BITRATE = 64_000
+
+# Минимальный битрейт видео, ниже которого пережимать бессмысленно
+MIN_VIDEO_BITRATE = 100_000
+
+# Высота кадра в зависимости от доступного битрейта видео
+VIDEO_HEIGHTS: List[Tuple[int, int]] = [
+    (2_500_000, 1080),
+    (1_200_000, 720),
+    (600_000, 480),
+    (0, 360),
+]
+
+
+async def _attempt(cmd: List[str], output: Path, label: str) -> Optional[int]:
+    """Выполняет одну попытку пережатия.
+
+    Args:
+        cmd (List[str]): Команда ffmpeg.
+        output (Path): Выходной файл.
+        label (str): Название задачи для лога.
+    Returns:
+        Optional[int]: Размер результата или None при ошибке ffmpeg.
+    """
+    try:
+        await get_ffmpeg_pool().run(cmd, label=label)
+    except RuntimeError as e:
+        logger.warning(f"Re-encode attempt failed: {e}")
+        return None
+    except asyncio.CancelledError:
+        output.unlink(missing_ok=True)
+        raise
+    if not output.exists() or output.stat().st_size == 0:
+        return None
+    return output.stat().st_size
+
+
+async def probe_duration(source: Path) -> Optional[float]:
+    """Определяет длительность медиа через ffprobe.
+
+    Args:
+        source (Path): Путь к файлу.
+    Returns:
+        Optional[float]: Длительность в секундах или None.
+    """
+    process = await asyncio.create_subprocess_exec(
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_entries",
+        "format=duration",
+        "-of",
+        "csv=p=0",
+        str(source),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    stdout, _ = await process.communicate()
+    try:
+        return float(stdout.decode().strip())
+    except ValueError:
+        return None
+
+
+async def fit_video(
+    source: Path, max_size: int, duration: Optional[float] = None
+) -> Optional[Path]:
+    """Пережимает видео mp4, чтобы оно уложилось в max_size.
+
+    Битрейт считается из длительности, а каждая следующая попытка
+    поправляет его по фактическому размеру предыдущей.
+
+    Args:
+        source (Path): Исходное видео.
+        max_size (int): Лимит размера в байтах.
+        duration (Optional[float]): Длительность из метаданных Telegram.
+    Returns:
+        Optional[Path]: Временный файл или None, если уложиться не удалось.
+    """
+    config = get_settings().conversion
+    duration = duration or await probe_duration(source)
+    if not duration:
+        logger.warning(f"Unknown duration of {source.name}, cannot fit video")
+        return None
+
+    target = max_size * config.fit_margin
+    bitrate = int(target * 8 / duration) - AUDIO_BITRATE
+    for attempt in range(config.fit_max_attempts):
+        if bitrate < MIN_VIDEO_BITRATE:
+            break
+        height = next(h for threshold, h in VIDEO_HEIGHTS if bitrate >= threshold)
+        output = make_temp_path(".mp4")
+        cmd = [
+            "ffmpeg",
+            "-y",
+            "-i",
+            str(source),
+            "-vf",
+            f"scale=-2:'min(ih,{height})'",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "veryfast",
+            "-b:v",
+            str(bitrate),
+            "-maxrate",
+            str(bitrate),
+            "-bufsize",
+            str(bitrate * 2),
+            "-c:a",
+            "aac",
+            "-b:a",
+            str(AUDIO_BITRATE),
+            "-movflags",
+            "+faststart",
+            str(output),
+        ]
+        size = await _attempt(cmd, output, f"{source.name} fit#{attempt + 1}")
+        logger.info(
+            "Video re-encode attempt",
+            extra={"bitrate": bitrate, "height": height, "size": size},
+        )
+        if size is not None and size <= max_size:
+            return output
+        output.unlink(missing_ok=True)
+        if size is None:
+            break
+        # Поправка битрейта по фактическому перерасходу
+        bitrate = int(bitrate * target / size)
+
+    return None
+
+
+async def fit_gif(
+    source: Path,
+    max_size: int,
+    measured: Optional[Tuple[GifProfile, int]] = None,
+) -> Optional[Path]:
+    """Подбирает fps и ширину GIF, чтобы он уложился в max_size.
+
+    Размер GIF примерно пропорционален fps * width^2. По последнему
+    измерению выбирается самый качественный вариант из сетки, который
+    по прогнозу помещается в лимит, поэтому перебора всей сетки нет.
+
+    Args:
+        source (Path): Исходное видео mp4.
+        max_size (int): Лимит размера в байтах.
+        measured (Optional[Tuple[GifProfile, int]]): Уже сделанная попытка и ее размер.
+    Returns:
+        Optional[Path]: Временный файл или None, если уложиться не удалось.
+    """
+    config = get_settings().conversion
+    target = max_size * config.fit_margin
+    candidates = sorted(
+        {(fps, width) for fps in config.fit_gif_fps for width in config.fit_gif_widths},
+        key=lambda item: item[0] * item[1] ** 2,
+        reverse=True,
+    )
+
+    bytes_per_unit: Optional[float] = None
+    last_cost = math.inf
+    if measured is not None:
+        profile, size = measured
+        last_cost = profile.fps * profile.width**2
+        bytes_per_unit = size / last_cost
+
+    for attempt in range(config.fit_max_attempts):
+        choice = None
+        for fps, width in candidates:
+            cost = fps * width**2
+            if cost >= last_cost:
+                continue
+            if bytes_per_unit is None or bytes_per_unit * cost <= target:
+                choice = (fps, width)
+                break
+        if choice is None:
+            # Даже самый маленький вариант по прогнозу не помещается
+            break
+
+        fps, width = choice
+        profile = GifProfile(fps=fps, width=width, palette_mode="diff")
+        output = make_temp_path(".gif")
+        size = await _attempt(
+            build_gif_command(source, output, profile),
+            output,
+            f"{source.name} fit#{attempt + 1}",
+        )
+        logger.info(
+            "GIF re-encode attempt",
+            extra={"fps": fps, "width": width, "size": size},
+        )
+        if size is not None and size <= max_size:
+            return output
+        output.unlink(missing_ok=True)
+        if size is None:
+            break
+        last_cost = fps * width**2
+        bytes_per_unit = size / last_cost
+
+    return None
+
+
+async def fit_photo(source: Path, max_size: int) -> Optional[Path]:
+    """Пережимает фото в JPEG, при необходимости уменьшая разрешение.
+
+    Args:
+        source (Path): Исходное фото.
+        max_size (int): Лимит размера в байтах.
+    Returns:
+        Optional[Path]: Временный файл или None, если уложиться не удалось.
+    """
+    config = get_settings().conversion
+    target = max_size * config.fit_margin
+    scale = 1.0
+    for attempt in range(config.fit_max_attempts):
+        output = make_temp_path(".jpg")
+        cmd = [
+            "ffmpeg",
+            "-y",
+            "-i",
+            str(source),
+            "-vf",
+            f"scale='trunc(iw*{scale:.4f}/2)*2':-2",
+            "-q:v",
+            "4",
+            str(output),
+        ]
+        size = await _attempt(cmd, output, f"{source.name} fit#{attempt + 1}")
+        logger.info("Photo re-encode attempt", extra={"scale": scale, "size": size})
+        if size is not None and size <= max_size:
+            return output
+        output.unlink(missing_ok=True)
+        if size is None:
+            break
+        # Размер JPEG пропорционален площади кадра
+        scale *= math.sqrt(target / size)
+
+    return None
@@ -1,89 +1,130 @@
 # import math
-import tempfile
-import asyncio
-import subprocess
-
-from typing import Optional
 from pathlib import Path
-from app.config import get_settings
+from typing import AsyncIterable, List, Optional, Union
+
+from app.config import get_settings, GifProfile
+from app.utils.errors import FileTooLargeError
+from app.utils.ffmpeg_pool import get_ffmpeg_pool
+from app.utils.file_utils import make_temp_path
 from app.utils.logging import get_logger
+from app.utils.metrics import get_metrics
 
 
 logger = get_logger(__name__)
 
+GIF_CONVERSION_SECONDS = get_metrics().histogram(
+    "gif_conversion_seconds", "ffmpeg run time of mp4 to GIF conversions", ["source"]
+)
+
+
+def get_gif_profile(name: Optional[str] = None) -> GifProfile:
+    """Возвращает профиль конвертации GIF из настроек.
+
+    Args:
+        name (Optional[str]): Имя профиля, по умолчанию default_profile.
+    Returns:
+        GifProfile: Профиль конвертации.
+    """
+    config = get_settings().conversion
+    name = name or config.default_profile
+    if name not in config.profiles:
+        logger.warning(f"Unknown GIF profile {name}, using defaults")
+        return GifProfile()
+    return config.profiles[name]
+
 
-async def convert_mp4_to_gif(file_data: bytes) -> bytes:
+def build_gif_filter(profile: GifProfile) -> str:
+    """Собирает фильтр ffmpeg для профиля.
+
+    Args:
+        profile (GifProfile): Профиль конвертации.
+    Returns:
+        str: Значение для -vf.
+    """
+    base = f"fps={profile.fps},scale={profile.width}:-1:flags=lanczos"
+    if profile.palette_mode == "none":
+        return base
+    return (
+        f"{base},split[s0][s1];"
+        f"[s0]palettegen=stats_mode={profile.palette_mode}[p];[s1][p]paletteuse"
+    )
+
+
+def build_gif_command(
+    source: Optional[Path], output: Optional[Path], profile: GifProfile
+) -> List[str]:
+    """Собирает команду ffmpeg для конвертации в GIF.
+
+    Args:
+        source (Optional[Path]): Входной файл, None — чтение из stdin.
+        output (Optional[Path]): Выходной файл, None — запись в stdout.
+        profile (GifProfile): Профиль конвертации.
+    Returns:
+        List[str]: Команда ffmpeg.
+    """
+    cmd = [
+        "ffmpeg",
+        "-y",  # Перезапись без подтверждения
+        "-i",
+        str(source) if source is not None else "pipe:0",
+        "-vf",
+        build_gif_filter(profile),
+        "-loop",
+        "0",
+    ]
+    if output is not None:
+        cmd.append(str(output))
+    else:
+        cmd += ["-f", "gif", "pipe:1"]
+    return cmd
+
+
+async def convert_mp4_to_gif(
+    source: Union[Path, AsyncIterable[bytes]], profile: Optional[str] = None
+) -> Path:
     """Конвертирует mp4 в gif.
 
+    Вход читается из файла или потоком через stdin, выход забирается из
+    stdout по мере кодирования и пишется на диск один раз.
+
+    Размер проверяется после кодирования: обрезка ffmpeg по -fs дала бы
+    битый GIF без ошибки.
+
     Args:
-        file_data (bytes): Данные файла mp4 в виде байтового массива.
+        source (Union[Path, AsyncIterable[bytes]]): Файл mp4 или поток его блоков.
+            Поток должен быть faststart (см. is_streamable_mp4).
+        profile (Optional[str]): Имя профиля конвертации.
     Returns:
-        bytes: Данные файла gif в виде байтового массива.
+        Path: Путь к временному файлу gif. Удалять его должен вызывающий код.
+    Raises:
+        FileTooLargeError: GIF больше max_output_size профиля.
     """
 
-    settings = get_settings()
-    temp_dir = Path(settings.general.temp_dir)
-    temp_dir.mkdir(parents=True, exist_ok=True)
+    output_path = make_temp_path(".gif")
+    logger.debug(f"Preparing output gif path: {output_path}")
 
-    input_path: Optional[Path] = None
-    output_path: Optional[Path] = None
+    piped = not isinstance(source, Path)
+    label = "stdin" if piped else source.name
     try:
-        # Сохраняем входящий файл во временное хранилище
-        with tempfile.NamedTemporaryFile(
-            dir=temp_dir, suffix=".mp4", delete=False
-        ) as tmp_in:
-            input_path = Path(tmp_in.name)
-            tmp_in.write(file_data)
-            logger.debug(f"Saved input video to {input_path}")
-
-        # Подготавливаем путь для гиф
-        with tempfile.NamedTemporaryFile(
-            dir=temp_dir, suffix=".gif", delete=False
-        ) as tmp_out:
-            output_path = Path(tmp_out.name)
-            logger.debug(f"Preparing output gif path: {output_path}")
-
-        def _convert():
-            """Конвертирует mp4 в gif с помощью FFmpeg."""
-            cmd = [
-                "ffmpeg",
-                "-y",  # Перезапись без подтверждения
-                "-i",
-                str(input_path),
-                "-vf",
-                "fps=10,scale=480:-1:flags=lanczos,split[s0][s1];[s0]palettegen[p];[s1][p]paletteuse",
-                "-loop",
-                "0",
-                str(output_path),
-            ]
-
-            result = subprocess.run(
-                cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+        # Конвертация идет в пуле с ограниченным числом процессов ffmpeg
+        gif_profile = get_gif_profile(profile)
+        cmd = build_gif_command(None if piped else source, None, gif_profile)
+        with output_path.open("wb") as out:
+            elapsed = await get_ffmpeg_pool().run(
+                cmd, label=label, stdin=source if piped else None, stdout=out
             )
+        GIF_CONVERSION_SECONDS.observe(elapsed, source="pipe" if piped else "file")
+
+        if output_path.stat().st_size == 0:
+            # Если выходной файл пуст, это может быть ошибкой
+            raise FileNotFoundError(f"Output file is empty: {output_path}")
+
+        size = output_path.stat().st_size
+        if gif_profile.max_output_size and size > gif_profile.max_output_size:
+            raise FileTooLargeError(output_path.name, size, gif_profile.max_output_size)
 
-            if result.returncode != 0:
-                logger.error(f"FFmpeg error: {result.stderr.decode()}")
-                raise RuntimeError(
-                    f"FFmpeg conversion failed: {result.stderr.decode()}"
-                )
-
-        # Запускаем конвертацию в отдельном потоке
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, _convert)
-
-        if not output_path.exists():
-            # Если выходной файл не существует, это может быть ошибкой
-            raise FileNotFoundError(f"Output file not found: {output_path}")
-
-        # Читаем и возвращаем данные из выходного файла
-        return output_path.read_bytes()
-
-    finally:
-        # В конце удаляет временные файлы
-        for path in (input_path, output_path):
-            if isinstance(path, Path) and path.exists():
-                try:
-                    path.unlink()
-                    logger.debug(f"Deleted temporary file: {path}")
-                except Exception as e:
-                    logger.error(f"Error deleting temporary file {path}: {e}")
+        return output_path
+    except BaseException:
+        # При ошибке удаляет временный файл
+        output_path.unlink(missing_ok=True)
+        raise
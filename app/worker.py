@@ -0,0 +1,171 @@
+import signal
+import asyncio
+from dataclasses import dataclass
+from typing import Optional, Set
+
+from telegram import Bot, Message
+
+from app.config import get_settings
+from app.handlers.telegram_media_handler import TelegramMediaHandler
+from app.services.delivery_queue import DeliveryQueue
+from app.services.discord import DiscordService
+from app.services.ingest_queue import IngestJob, IngestQueue
+from app.services.media_cache import MediaCache
+from app.services.media_service import MediaService
+from app.services.message_index import MessageIndex
+from app.services.metrics_server import MetricsServer
+from app.utils.ffmpeg_pool import close_ffmpeg_pool
+from app.utils.file_utils import close_http_client
+from app.utils.logging import setup_logget, get_logger
+
+
+@dataclass
+class WorkerContext:
+    """Замена контекста обновления: обработке медиа нужен только бот"""
+
+    bot: Bot
+
+
+class MediaWorker:
+    """
+    Процесс обработки постов: скачивание, конвертация и отправка в Discord.
+
+    Забирает посты из IngestQueue, пока не получит SIGTERM. После сигнала
+    новые посты не берутся, а начатые дорабатываются.
+
+    Если очередь доставки включена, готовый пост ставится в общую очередь
+    доставки, а доставляет его процесс бота. Пост снимается с IngestQueue,
+    как только записан в очередь доставки.
+    """
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.name = f"worker-{index}"
+        self.settings = get_settings()
+        self.logger = get_logger(__name__)
+        self.queue = IngestQueue(self.settings)
+        self._stop = asyncio.Event()
+        self._tasks: Set[asyncio.Task] = set()
+        self._handler: Optional[TelegramMediaHandler] = None
+        self._context: Optional[WorkerContext] = None
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stop.set)
+
+        settings = self.settings
+        metrics_server = None
+        if settings.metrics.enabled:
+            metrics_server = MetricsServer(
+                settings.metrics, port=settings.metrics.port + self.index + 1
+            )
+            await metrics_server.start()
+
+        message_index = MessageIndex(settings) if settings.edits.enabled else None
+        discord_service = DiscordService(message_index=message_index)
+        delivery_queue = None
+        if settings.queue.enabled:
+            # Очередь общая с процессом бота: здесь задачи только ставятся
+            delivery_queue = DeliveryQueue(discord_service, settings)
+
+        # Индекс кэша живет в памяти процесса, поэтому у каждого процесса
+        # свой каталог и своя доля общего бюджета
+        media_cache = MediaCache(
+            settings.general.temp_dir / "cache" / self.name,
+            settings.general.cache_max_bytes // settings.workers.count,
+        )
+        self._handler = TelegramMediaHandler(
+            media_service=MediaService(cache=media_cache),
+            discord_service=discord_service,
+            settings=settings,
+            delivery_queue=delivery_queue,
+        )
+
+        overrides = {
+            key: value
+            for key, value in (
+                ("base_url", settings.telegram.base_url),
+                ("base_file_url", settings.telegram.base_file_url),
+            )
+            if value
+        }
+        bot = Bot(settings.telegram.bot_token, **overrides)
+        self._context = WorkerContext(bot=bot)
+        self.logger.info(f"{self.name} started")
+        try:
+            async with bot:
+                await self._poll()
+        finally:
+            if delivery_queue is not None:
+                await delivery_queue.stop()
+            await discord_service.close()
+            await close_http_client()
+            await close_ffmpeg_pool()
+            self.queue.close()
+            if message_index is not None:
+                message_index.close()
+            if metrics_server is not None:
+                await metrics_server.stop()
+            self.logger.info(f"{self.name} stopped")
+
+    async def _poll(self) -> None:
+        """Забирает посты, пока есть свободные слоты"""
+        slots = asyncio.Semaphore(self.settings.workers.concurrency)
+        while not self._stop.is_set():
+            await slots.acquire()
+            job = await self.queue.lease(self.name)
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(
+                        self._stop.wait(), self.settings.workers.poll_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(self._process(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+        if self._tasks:
+            self.logger.info(f"Finishing {len(self._tasks)} posts before exit")
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _process(self, job: IngestJob) -> None:
+        """Обрабатывает пост, продлевая аренду, пока идет работа"""
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            bot = self._context.bot
+            messages = [Message.de_json(data, bot) for data in job.messages]
+            await self._handler.process_post(
+                messages, self._context, webhooks=job.webhooks
+            )
+        except Exception as e:
+            self.logger.error(
+                f"Error processing post: {e}",
+                extra={"chat_id": job.chat_id, "attempt": job.attempts},
+            )
+            await self.queue.fail(job, e)
+        else:
+            await self.queue.ack(job)
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job: IngestJob) -> None:
+        interval = self.settings.workers.lease_timeout / 3
+        while True:
+            await asyncio.sleep(interval)
+            await self.queue.extend(job, self.name)
+
+
+def main(index: int) -> None:
+    """Точка входа процесса обработки"""
+    setup_logget(
+        f"logs/worker-{index}.log",
+        "DEBUG",
+        libs=["httpx", "asyncio", "telegram", "discord"],
+    )
+    asyncio.run(MediaWorker(index).run())
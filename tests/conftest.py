@@ -0,0 +1,70 @@
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import pytest
+from telegram import Chat, Message, PhotoSize
+
+import app.config as config
+from app.config import Settings
+
+
+@pytest.fixture
+def make_settings(tmp_path, monkeypatch) -> Callable[..., Settings]:
+    """Собирает настройки во временном каталоге и делает их текущими
+
+    Секции из аргументов заменяют соответствующие секции по умолчанию.
+    """
+
+    def make(**sections: Any) -> Settings:
+        data: Dict[str, Any] = {
+            "telegram": {"admin_ids": [], "bot_token": "1:test", "max_file_size": 1},
+            "discord": {
+                "webhooks": [
+                    {"name": "first", "url": "http://discord.invalid/1"},
+                    {"name": "second", "url": "http://discord.invalid/2"},
+                ],
+                "max_file_size": 8388608,
+                "message": {},
+            },
+            "general": {"temp_dir": str(tmp_path)},
+            "metrics": {"enabled": False},
+        }
+        data.update(sections)
+        settings = Settings(**data)
+        monkeypatch.setattr(config, "_settings", settings)
+        return settings
+
+    return make
+
+
+@pytest.fixture
+def settings(make_settings) -> Settings:
+    return make_settings()
+
+
+@pytest.fixture
+def make_message() -> Callable[..., Message]:
+    """Собирает сообщение канала Telegram"""
+
+    def make(
+        chat_id: int,
+        message_id: int,
+        text: Optional[str] = None,
+        caption: Optional[str] = None,
+        photo: Optional[str] = None,
+        media_group_id: Optional[str] = None,
+    ) -> Message:
+        sizes: Optional[List[PhotoSize]] = None
+        if photo is not None:
+            sizes = [PhotoSize(f"id-{photo}", photo, 1280, 720)]
+        return Message(
+            message_id,
+            datetime.now(timezone.utc),
+            Chat(chat_id, Chat.CHANNEL),
+            text=text,
+            caption=caption,
+            photo=sizes,
+            media_group_id=media_group_id,
+        )
+
+    return make
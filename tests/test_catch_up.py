@@ -0,0 +1,220 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+from telegram import Update
+
+from app.services.catch_up import CatchUp
+
+
+class FakeBot:
+    """Бот с отставанием обновлений, которое отдается страницами getUpdates"""
+
+    def __init__(self, updates: List[Update], url: str = ""):
+        self.updates = updates
+        self.url = url
+        self.offsets: List[Optional[int]] = []
+
+    async def get_webhook_info(self):
+        return SimpleNamespace(pending_update_count=len(self.updates), url=self.url)
+
+    async def get_updates(self, offset=None, limit=100, **kwargs):
+        self.offsets.append(offset)
+        # Запрос со смещением подтверждает предыдущие обновления
+        if offset is not None:
+            self.updates = [u for u in self.updates if u.update_id >= offset]
+        return self.updates[:limit]
+
+    async def delete_webhook(self):
+        self.url = ""
+
+
+class FakeHandler:
+    """Обработчик постов, который записывает отправки и падает по расписанию"""
+
+    def __init__(self, failures: Optional[Dict[int, int]] = None):
+        self.failures = dict(failures or {})
+        self.sent: List[Tuple[int, List[int], str]] = []
+        self.edits: List[Tuple[int, int, str]] = []
+        self.live: List[int] = []
+
+    def start_post(self, messages, context):
+        first = messages[0]
+
+        async def send():
+            if self.failures.get(first.message_id, 0):
+                self.failures[first.message_id] -= 1
+                raise RuntimeError("webhook is down")
+            await asyncio.sleep(0.01)
+            self.sent.append(
+                (
+                    first.chat.id,
+                    [message.message_id for message in messages],
+                    first.text or first.caption or "",
+                )
+            )
+
+        return send
+
+    async def edit_post(self, message):
+        self.edits.append((message.chat.id, message.message_id, message.text))
+
+    async def handle_message(self, update, context):
+        self.live.append(update.channel_post.message_id)
+
+    async def handle_edit(self, update, context):
+        self.live.append(update.edited_channel_post.message_id)
+
+
+@pytest.fixture
+def catch_up_settings(make_settings):
+    return make_settings(
+        catch_up={
+            "enabled": True,
+            "min_backlog": 2,
+            "batch_size": 2,
+            "page_size": 2,
+            "retry_backoff": 0.01,
+        },
+        media_group={"max_wait": 0.05},
+    )
+
+
+@pytest.fixture
+def post(make_message):
+    def make(update_id: int, chat_id: int, message_id: int, **fields) -> Update:
+        return Update(
+            update_id, channel_post=make_message(chat_id, message_id, **fields)
+        )
+
+    return make
+
+
+@pytest.fixture
+def edit(make_message):
+    def make(update_id: int, chat_id: int, message_id: int, text: str) -> Update:
+        return Update(
+            update_id, edited_channel_post=make_message(chat_id, message_id, text=text)
+        )
+
+    return make
+
+
+def run(settings, handler, bot, during=None) -> CatchUp:
+    catch_up = CatchUp(handler, settings)
+    application = SimpleNamespace(bot=bot, update_queue=asyncio.Queue())
+
+    async def main():
+        await catch_up.start(application)
+        if during is not None:
+            await during(catch_up)
+        if catch_up._task is not None:
+            await asyncio.wait_for(catch_up._task, 10)
+        await catch_up.stop()
+        return application.update_queue.qsize()
+
+    catch_up.passed = asyncio.run(main())
+    return catch_up
+
+
+def test_backlog_is_sent_in_order_per_chat(catch_up_settings, post, make_message):
+    handler = FakeHandler()
+    bot = FakeBot(
+        [
+            post(1, 1, 10, text="a"),
+            post(2, 2, 20, text="other"),
+            post(3, 1, 11, photo="x", media_group_id="g"),
+            post(4, 1, 12, photo="y", media_group_id="g"),
+            post(5, 1, 13, text="b"),
+            # Команда бота остается обычным обработчикам
+            Update(6, message=make_message(5, 1, text="/start")),
+        ]
+    )
+    catch_up = run(catch_up_settings, handler, bot)
+
+    assert [ids for chat, ids, _ in handler.sent if chat == 1] == [
+        [10],
+        [11, 12],
+        [13],
+    ]
+    assert [ids for chat, ids, _ in handler.sent if chat == 2] == [[20]]
+    assert catch_up.passed == 1
+    # Страницы подтверждены, хранилище пусто
+    assert bot.updates == []
+    assert bot.offsets == [None, 3, 5, 7]
+    assert catch_up._execute("SELECT COUNT(*) FROM messages") == [(0,)]
+
+
+def test_small_backlog_is_left_to_normal_handling(catch_up_settings, post):
+    handler = FakeHandler()
+    bot = FakeBot([post(1, 1, 10, text="a")])
+    catch_up = run(catch_up_settings, handler, bot)
+
+    assert catch_up._task is None
+    assert bot.offsets == []
+    assert handler.sent == []
+
+
+def test_edits_of_unsent_posts_are_collapsed(catch_up_settings, post, edit):
+    handler = FakeHandler()
+    bot = FakeBot(
+        [
+            post(1, 1, 10, text="draft"),
+            edit(2, 1, 10, "final"),
+            # Пост отправлен до простоя: правка применяется к Discord
+            edit(3, 1, 5, "old v2"),
+            edit(4, 1, 5, "old v3"),
+        ]
+    )
+    run(catch_up_settings, handler, bot)
+
+    assert handler.sent == [(1, [10], "final")]
+    assert handler.edits == [(1, 5, "old v3")]
+
+
+def test_failed_post_is_retried_then_dropped(catch_up_settings, post):
+    catch_up_settings.catch_up.max_attempts = 2
+    handler = FakeHandler({10: 1, 11: 5})
+    bot = FakeBot(
+        [post(1, 1, 10, text="a"), post(2, 1, 11, text="b"), post(3, 1, 12, text="c")]
+    )
+    catch_up = run(catch_up_settings, handler, bot)
+
+    # Повторенный пост не обгоняется следующими, брошенный не держит очередь
+    assert [ids for _, ids, _ in handler.sent] == [[10], [12]]
+    assert catch_up._execute("SELECT COUNT(*) FROM messages") == [(0,)]
+
+
+def test_new_posts_of_backlog_chats_wait_behind_it(catch_up_settings, post):
+    handler = FakeHandler()
+    bot = FakeBot([post(1, 1, 10, text="a"), post(2, 1, 11, text="b")])
+
+    async def during(catch_up):
+        await catch_up.handle_message(post(3, 1, 12, text="new"), None)
+        await catch_up.handle_message(post(4, 2, 20, text="elsewhere"), None)
+
+    run(catch_up_settings, handler, bot, during)
+
+    assert [ids for _, ids, _ in handler.sent] == [[10], [11], [12]]
+    # Канал без отставания обрабатывается как обычно
+    assert handler.live == [20]
+
+
+def test_newest_first_and_max_age(catch_up_settings, post, make_message):
+    catch_up_settings.catch_up.order = "newest_first"
+    catch_up_settings.catch_up.max_age = 3600
+    handler = FakeHandler()
+    stale = make_message(1, 9, text="stale")
+    with stale._unfrozen():
+        stale.date = stale.date.replace(year=2000)
+    bot = FakeBot(
+        [
+            Update(1, channel_post=stale),
+            post(2, 1, 10, text="a"),
+            post(3, 1, 11, text="b"),
+        ]
+    )
+    run(catch_up_settings, handler, bot)
+
+    assert [ids for _, ids, _ in handler.sent] == [[11], [10]]
@@ -0,0 +1,137 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List
+
+from app.config import DispatcherConfig
+from app.handlers.channel_dispatcher import ChannelDispatcher, ChannelJob
+from app.handlers.telegram_media_handler import TelegramMediaHandler
+
+
+class Recorder:
+    """Задачи, которые записывают порядок выполнения и выброшенные посты"""
+
+    def __init__(self):
+        self.done: List[str] = []
+        self.dropped: List[str] = []
+
+    def job(self, label: str, delay: float = 0, ready=None) -> ChannelJob:
+        async def run():
+            await asyncio.sleep(delay)
+            self.done.append(label)
+
+        return ChannelJob(
+            run=run,
+            ready=ready,
+            on_drop=lambda: self.dropped.append(label),
+            label=label,
+        )
+
+
+def test_posts_of_a_channel_keep_order_across_channels():
+    recorder = Recorder()
+
+    async def main():
+        dispatcher = ChannelDispatcher(DispatcherConfig(max_concurrency=4))
+        # Медленный первый пост не пропускает вперед следующие посты канала
+        await dispatcher.submit(1, recorder.job("1-a", delay=0.05))
+        await dispatcher.submit(1, recorder.job("1-b"))
+        await dispatcher.submit(2, recorder.job("2-a"))
+        await dispatcher.shutdown()
+
+    asyncio.run(main())
+    assert recorder.done.index("1-a") < recorder.done.index("1-b")
+    # Другой канал не ждет медленный пост
+    assert recorder.done[0] == "2-a"
+
+
+def test_block_policy_holds_posts_without_waiting():
+    recorder = Recorder()
+
+    async def main():
+        config = DispatcherConfig(max_queue_per_chat=2, max_held_per_chat=3)
+        dispatcher = ChannelDispatcher(config)
+        ready = asyncio.Event()
+        results = [await dispatcher.submit(1, recorder.job("p0", ready=ready))]
+        for index in range(1, 7):
+            results.append(await dispatcher.submit(1, recorder.job(f"p{index}")))
+        depth = dispatcher.depth(1)
+        ready.set()
+        await dispatcher.shutdown()
+        return results, depth
+
+    results, depth = asyncio.run(main())
+    # 2 поста в очереди и 3 отложенных, остальные выброшены
+    assert results == [True] * 5 + [False] * 2
+    assert depth == 5
+    assert recorder.done == ["p0", "p1", "p2", "p3", "p4"]
+    assert recorder.dropped == ["p5", "p6"]
+
+
+def test_drop_oldest_releases_the_dropped_post():
+    recorder = Recorder()
+
+    async def main():
+        config = DispatcherConfig(max_queue_per_chat=2, overflow_policy="drop_oldest")
+        dispatcher = ChannelDispatcher(config)
+        ready = asyncio.Event()
+        await dispatcher.submit(1, recorder.job("p0", ready=ready))
+        await dispatcher.submit(1, recorder.job("p1"))
+        await dispatcher.submit(1, recorder.job("p2"))
+        ready.set()
+        await dispatcher.shutdown()
+
+    asyncio.run(main())
+    assert recorder.dropped == ["p0"]
+    assert recorder.done == ["p1", "p2"]
+
+
+class BlockingMediaService:
+    """Загрузка, которая не завершается, пока ее не отменят"""
+
+    def __init__(self):
+        self.started: List[int] = []
+        self.cancelled: List[int] = []
+
+    async def build_payloads(self, message, context):
+        self.started.append(message.message_id)
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.cancelled.append(message.message_id)
+            raise
+
+
+def test_dropped_media_group_stops_its_downloads(make_settings, make_message):
+    settings = make_settings(
+        dispatcher={"max_queue_per_chat": 2, "overflow_policy": "drop_oldest"}
+    )
+    media = BlockingMediaService()
+    handler = TelegramMediaHandler(
+        media_service=media,
+        discord_service=SimpleNamespace(message_index=None),
+        settings=settings,
+    )
+
+    def update(message_id: int, photo: str):
+        message = make_message(1, message_id, media_group_id="g", photo=photo)
+        return SimpleNamespace(effective_message=message)
+
+    async def main():
+        recorder = Recorder()
+        await handler.handle_message(update(10, "a"), None)
+        await asyncio.sleep(0)
+        # Следующие посты вытесняют еще собирающуюся группу из очереди
+        await handler.dispatcher.submit(1, recorder.job("next"))
+        await handler.dispatcher.submit(1, recorder.job("last"))
+        await asyncio.sleep(0)
+        await handler.handle_message(update(11, "b"), None)
+        await asyncio.sleep(0)
+
+        await handler.aggregator.shutdown(timeout=0)
+        await handler.dispatcher.shutdown()
+        return recorder
+
+    recorder = asyncio.run(main())
+    assert media.started == [10]
+    assert media.cancelled == [10]
+    assert recorder.done == ["next", "last"]
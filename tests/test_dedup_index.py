@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from app.services.dedup_index import DedupIndex, fingerprint_post
+
+
+@pytest.fixture
+def index(settings):
+    index = DedupIndex(settings)
+    yield index
+    index.close()
+
+
+def claim(index, fingerprint):
+    return asyncio.run(index.claim(fingerprint))
+
+
+def test_repeat_in_same_chat_is_duplicate(index, make_message):
+    first = fingerprint_post([make_message(1, 10, caption="hi", photo="a")])
+    repeat = fingerprint_post([make_message(1, 11, caption="Hi ", photo="a")])
+
+    assert claim(index, first) == "new"
+    assert claim(index, repeat) == "duplicate"
+
+
+def test_same_post_in_other_chat_is_new(index, make_message):
+    post = [make_message(1, 10, caption="hi", photo="a")]
+    other = [make_message(2, 10, caption="hi", photo="a")]
+
+    assert claim(index, fingerprint_post(post)) == "new"
+    assert claim(index, fingerprint_post(other)) == "new"
+
+
+def test_cross_channel_is_opt_in(index, make_message):
+    post = [make_message(1, 10, caption="hi", photo="a")]
+    other = [make_message(2, 10, caption="hi", photo="a")]
+
+    assert claim(index, fingerprint_post(post, cross_channel=True)) == "new"
+    assert claim(index, fingerprint_post(other, cross_channel=True)) == "duplicate"
+
+
+def test_target_webhooks_are_part_of_the_key(index, make_message):
+    post = [make_message(1, 10, caption="hi", photo="a")]
+
+    assert claim(index, fingerprint_post(post, ["first"])) == "new"
+    assert claim(index, fingerprint_post(post, ["second"])) == "new"
+    assert claim(index, fingerprint_post(post, ["first"])) == "duplicate"
+    # Порядок вебхуков не важен
+    both = fingerprint_post(post, ["first", "second"])
+    assert claim(index, both) == "new"
+    assert claim(index, fingerprint_post(post, ["second", "first"])) == "duplicate"
+
+
+def test_media_repeat_with_new_text(index, make_message):
+    post = [make_message(1, 10, caption="hi", photo="a")]
+    retold = [make_message(1, 11, caption="other text", photo="a")]
+    elsewhere = [make_message(2, 11, caption="other text", photo="a")]
+
+    assert claim(index, fingerprint_post(post)) == "new"
+    assert claim(index, fingerprint_post(retold)) == "media_duplicate"
+    assert claim(index, fingerprint_post(elsewhere)) == "new"
+
+
+def test_released_fingerprint_can_be_claimed_again(index, make_message):
+    fingerprint = fingerprint_post([make_message(1, 10, text="hello")])
+
+    assert claim(index, fingerprint) == "new"
+    asyncio.run(index.release(fingerprint))
+    assert claim(index, fingerprint) == "new"
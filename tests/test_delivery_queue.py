@@ -0,0 +1,195 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+from app.services.delivery_queue import DeliveryQueue
+from app.services.discord import DiscordService
+from app.services.message_index import PostRef
+from app.utils.errors import WebhookError
+
+
+class FakeDiscord:
+    """Discord, который записывает доставки и падает по расписанию"""
+
+    def __init__(
+        self,
+        failures: Optional[Dict[Tuple[str, str], int]] = None,
+        error: Optional[Exception] = None,
+    ):
+        self.webhook_names = ["first", "second"]
+        self.failures = dict(failures or {})
+        self.error = error or RuntimeError("webhook is down")
+        self.attempts: List[Tuple[str, str]] = []
+        self.sent: List[Tuple[str, str]] = []
+
+    async def send_to(self, name, content="", payloads=None, post=None, **kwargs):
+        # Первый пост медленнее, чтобы следующие могли бы его обогнать
+        await asyncio.sleep(0.02 if content == "post-1" else 0)
+        self.attempts.append((name, content))
+        if self.failures.get((name, content), 0):
+            self.failures[(name, content)] -= 1
+            raise self.error
+        self.sent.append((name, content))
+
+    def record_delivery(self, webhook: str, origin_time: float) -> None:
+        pass
+
+
+def run_queue(settings, discord, posts: List[Tuple[int, str]], root) -> None:
+    async def main() -> None:
+        queue = DeliveryQueue(discord, settings, root=root)
+        await queue.start()
+        try:
+            for chat_id, content in posts:
+                await queue.enqueue(content, [], chat_id=chat_id)
+            for chat_id in {chat_id for chat_id, _ in posts}:
+                await asyncio.wait_for(queue.wait_chat(chat_id), 10)
+        finally:
+            await queue.stop()
+
+    asyncio.run(main())
+
+
+def delivered(discord: FakeDiscord, webhook: str) -> List[str]:
+    return [content for name, content in discord.sent if name == webhook]
+
+
+@pytest.fixture
+def queue_settings(make_settings):
+    return make_settings(queue={"base_backoff": 0.05, "max_attempts": 3})
+
+
+def test_posts_of_one_chat_keep_order(queue_settings, tmp_path):
+    discord = FakeDiscord()
+    posts = [(1, f"post-{index}") for index in range(1, 6)]
+    run_queue(queue_settings, discord, posts, tmp_path / "outbox")
+
+    expected = [content for _, content in posts]
+    assert delivered(discord, "first") == expected
+    assert delivered(discord, "second") == expected
+
+
+def test_failed_delivery_holds_back_its_lane(queue_settings, tmp_path):
+    discord = FakeDiscord({("first", "post-1"): 2})
+    posts = [(1, "post-1"), (1, "post-2"), (2, "other")]
+    run_queue(queue_settings, discord, posts, tmp_path / "outbox")
+
+    assert delivered(discord, "first") == ["other", "post-1", "post-2"]
+    # Другой вебхук не ждет повтора
+    second = delivered(discord, "second")
+    assert [content for content in second if content != "other"] == [
+        "post-1",
+        "post-2",
+    ]
+    assert discord.sent.index(("second", "post-2")) < discord.sent.index(
+        ("first", "post-1")
+    )
+
+
+def test_dead_letter_releases_its_lane(queue_settings, tmp_path):
+    discord = FakeDiscord({("first", "post-1"): 10})
+    posts = [(1, "post-1"), (1, "post-2")]
+    run_queue(queue_settings, discord, posts, tmp_path / "outbox")
+
+    assert delivered(discord, "first") == ["post-2"]
+    assert delivered(discord, "second") == ["post-1", "post-2"]
+
+
+@pytest.mark.parametrize("status", [400, 403, 404, 413])
+def test_rejected_delivery_is_not_retried(make_settings, tmp_path, status):
+    # С такой задержкой повтор не уложился бы в таймаут wait_chat
+    settings = make_settings(queue={"base_backoff": 30})
+    discord = FakeDiscord({("first", "post-1"): 10}, WebhookError(status, "rejected"))
+    posts = [(1, "post-1"), (1, "post-2")]
+    run_queue(settings, discord, posts, tmp_path / "outbox")
+
+    assert discord.attempts.count(("first", "post-1")) == 1
+    assert delivered(discord, "first") == ["post-2"]
+
+
+def test_rate_limited_delivery_is_retried(queue_settings, tmp_path):
+    discord = FakeDiscord({("first", "post-1"): 1}, WebhookError(429, "exhausted"))
+    run_queue(queue_settings, discord, [(1, "post-1")], tmp_path / "outbox")
+
+    assert delivered(discord, "first") == ["post-1"]
+
+
+def test_post_is_enqueued_once(queue_settings, tmp_path):
+    discord = FakeDiscord()
+    post = PostRef(1, "m10", 10, "post-1")
+
+    async def main():
+        queue = DeliveryQueue(discord, queue_settings, root=tmp_path / "outbox")
+        first = await queue.enqueue("post-1", [], post=post, chat_id=1)
+        # Повтор после падения процесса обработки до подтверждения поста
+        again = await queue.enqueue("post-1", [], post=post, chat_id=1)
+        await queue.start()
+        try:
+            await asyncio.wait_for(queue.wait_chat(1), 10)
+        finally:
+            await queue.stop()
+        return first, again
+
+    first, again = asyncio.run(main())
+    assert first == again
+    assert delivered(discord, "first") == ["post-1"]
+    # Файлы повторной постановки не остаются на диске
+    assert not [path for path in (tmp_path / "outbox").iterdir() if path.is_dir()]
+
+
+def test_deliverer_picks_up_jobs_of_other_processes(queue_settings, tmp_path):
+    discord = FakeDiscord()
+    root = tmp_path / "outbox"
+
+    async def main():
+        deliverer = DeliveryQueue(
+            discord, queue_settings, root=root, poll_interval=0.05
+        )
+        producer = DeliveryQueue(discord, queue_settings, root=root)
+        await deliverer.start()
+        try:
+            # Очередь пуста, доставщик спит до следующей проверки
+            await asyncio.sleep(0.1)
+            for index in range(1, 4):
+                await producer.enqueue(f"post-{index}", [], chat_id=1)
+            await asyncio.wait_for(deliverer.wait_chat(1), 10)
+        finally:
+            await producer.stop()
+            await deliverer.stop()
+
+    asyncio.run(main())
+    assert delivered(discord, "first") == ["post-1", "post-2", "post-3"]
+
+
+def test_split_post_resumes_from_failed_message(queue_settings, tmp_path):
+    calls: List[str] = []
+    failed: List[bool] = []
+
+    async def main() -> None:
+        discord = DiscordService()
+        hook = next(hook for hook in discord._hooks if hook.hook.name == "first")
+
+        async def execute(content: str = "", files=None) -> Any:
+            if len(calls) == 1 and not failed:
+                failed.append(True)
+                raise RuntimeError("webhook is down")
+            calls.append(content)
+            return {"id": str(len(calls))}
+
+        hook.execute = execute
+        queue = DeliveryQueue(discord, queue_settings, root=tmp_path / "outbox")
+        await queue.start()
+        try:
+            # Текст длиннее лимита Discord уходит тремя сообщениями
+            content = " ".join(["a" * 1500, "b" * 1500, "c" * 1500])
+            await queue.enqueue(content, [], webhooks=["first"], chat_id=1)
+            await asyncio.wait_for(queue.wait_chat(1), 10)
+        finally:
+            await queue.stop()
+            await discord.close()
+
+    asyncio.run(main())
+
+    assert failed
+    assert [content[0] for content in calls] == ["a", "b", "c"]
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from app.services.ingest_queue import IngestQueue
+
+
+@pytest.fixture
+def queue(make_settings):
+    queue = IngestQueue(make_settings(workers={"lease_timeout": 30}))
+    yield queue
+    queue.close()
+
+
+def test_one_post_per_chat_is_leased(queue):
+    async def main():
+        await queue.put(1, [{"n": 1}])
+        await queue.put(1, [{"n": 2}])
+        await queue.put(2, [{"n": 3}])
+
+        first = await queue.lease("worker-1")
+        other = await queue.lease("worker-2")
+        # Второй пост канала 1 ждет, пока первый в аренде
+        assert await queue.lease("worker-3") is None
+
+        await queue.ack(first)
+        second = await queue.lease("worker-3")
+        return first, other, second
+
+    first, other, second = asyncio.run(main())
+    assert (first.chat_id, first.messages) == (1, [{"n": 1}])
+    assert (other.chat_id, other.messages) == (2, [{"n": 3}])
+    assert (second.chat_id, second.messages) == (1, [{"n": 2}])
+
+
+def test_failed_post_is_retried_before_later_posts(queue):
+    async def main():
+        await queue.put(1, [{"n": 1}])
+        await queue.put(1, [{"n": 2}])
+
+        job = await queue.lease("worker-1")
+        await queue.fail(job, RuntimeError("boom"))
+        # Повтор отложен, но следующий пост канала его не обгоняет
+        assert await queue.lease("worker-1") is None
+
+        await asyncio.sleep(1.1)
+        return await queue.lease("worker-1")
+
+    retried = asyncio.run(main())
+    assert retried.messages == [{"n": 1}]
+    assert retried.attempts == 2
+
+
+def test_wait_chat_returns_once_posts_are_processed(make_settings):
+    queue = IngestQueue(make_settings(workers={"poll_interval": 0.01}))
+
+    async def main():
+        await queue.put(1, [{"n": 1}])
+        waiter = asyncio.create_task(queue.wait_chat(1))
+        # Посты других каналов не задерживают ожидание
+        await asyncio.wait_for(queue.wait_chat(2), 1)
+
+        job = await queue.lease("worker-1")
+        await asyncio.sleep(0.05)
+        pending = not waiter.done()
+        await queue.ack(job)
+        await asyncio.wait_for(waiter, 1)
+        return pending
+
+    try:
+        assert asyncio.run(main())
+    finally:
+        queue.close()
@@ -0,0 +1,82 @@
+import json
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+import app.utils.logging as log_utils
+from app.utils.logging import JsonFormatter, RateLimitFilter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(log_utils, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def record(msg: str, lineno: int = 10, level: int = logging.INFO, name: str = "app"):
+    return logging.LogRecord(name, level, "app/module.py", lineno, msg, None, None)
+
+
+def test_repeated_messages_are_limited_per_call_site(clock):
+    limiter = RateLimitFilter(burst=3, period=1.0)
+    # Текст разный, но место вызова одно
+    passed = [limiter.filter(record(f"post {index}")) for index in range(5)]
+    assert passed == [True, True, True, False, False]
+    # Другая строка кода считается отдельно
+    assert limiter.filter(record("other", lineno=11))
+
+
+def test_next_window_reports_suppressed_messages(clock):
+    limiter = RateLimitFilter(burst=1, period=1.0)
+    for index in range(4):
+        limiter.filter(record(f"post {index}"))
+
+    clock.now += 1.0
+    first = record("post 4")
+    assert limiter.filter(first)
+    assert first.suppressed == 3
+
+    second_window = record("post 5")
+    assert not limiter.filter(second_window)
+    assert not hasattr(second_window, "suppressed")
+
+
+def test_warnings_are_never_limited(clock):
+    limiter = RateLimitFilter(burst=1, period=1.0)
+    assert all(limiter.filter(record("down", level=logging.WARNING)) for _ in range(10))
+
+
+def test_least_recently_used_windows_are_evicted(clock):
+    limiter = RateLimitFilter(burst=1, period=1.0, max_keys=2)
+    limiter.filter(record("a", lineno=1))
+    limiter.filter(record("b", lineno=2))
+    # Окно строки 1 использовано позже строки 2
+    assert not limiter.filter(record("a", lineno=1))
+    limiter.filter(record("c", lineno=3))
+
+    assert len(limiter._windows) == 2
+    # Окно строки 2 вытеснено, и ее сообщение снова проходит
+    assert limiter.filter(record("b", lineno=2))
+    assert not limiter.filter(record("c", lineno=3))
+
+
+def test_json_formatter_keeps_extra_fields():
+    entry = record("Job enqueued")
+    entry.job_id = "abc"
+    entry.files = 2
+
+    data = json.loads(JsonFormatter().format(entry))
+    assert data["message"] == "Job enqueued"
+    assert (data["level"], data["logger"]) == ("INFO", "app")
+    assert (data["job_id"], data["files"]) == ("abc", 2)
+    assert "lineno" not in data
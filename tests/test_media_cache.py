@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from app.services.media_cache import CACHE_EVICTIONS, CACHE_LOOKUPS, MediaCache
+
+
+@pytest.fixture
+def source(tmp_path):
+    def make(name: str, size: int):
+        path = tmp_path / "src" / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b"x" * size)
+        return path
+
+    return make
+
+
+def test_checkout_returns_a_copy_of_the_entry(settings, tmp_path, source):
+    cache = MediaCache(tmp_path / "cache", 100)
+    hits = CACHE_LOOKUPS.value(transform="raw", result="hit")
+    misses = CACHE_LOOKUPS.value(transform="raw", result="miss")
+
+    assert cache.checkout("a", "raw") is None
+    cache.store("a", "raw", source("a", 10))
+    copy = cache.checkout("a", "raw")
+
+    assert copy.read_bytes() == b"x" * 10
+    assert copy.parent == settings.general.temp_dir
+    assert CACHE_LOOKUPS.value(transform="raw", result="hit") == hits + 1
+    assert CACHE_LOOKUPS.value(transform="raw", result="miss") == misses + 1
+
+
+def test_least_recently_used_entry_is_evicted(settings, tmp_path, source):
+    cache = MediaCache(tmp_path / "cache", 25)
+    evictions = CACHE_EVICTIONS.value()
+    cache.store("a", "raw", source("a", 10))
+    cache.store("b", "raw", source("b", 10))
+    # Обращение к a делает b самой старой записью
+    cache.checkout("a", "raw").unlink()
+    cache.store("c", "raw", source("c", 10))
+
+    assert cache.checkout("b", "raw") is None
+    assert cache.checkout("a", "raw") is not None
+    assert cache.checkout("c", "raw") is not None
+    assert CACHE_EVICTIONS.value() == evictions + 1
+
+
+def test_evicted_entry_keeps_checked_out_copy(settings, tmp_path, source):
+    cache = MediaCache(tmp_path / "cache", 15)
+    cache.store("a", "gif", source("a", 10))
+    copy = cache.checkout("a", "gif")
+    cache.store("b", "gif", source("b", 10))
+
+    assert not (tmp_path / "cache" / "a.gif").exists()
+    # Копия — жесткая ссылка, вытеснение ее не удаляет
+    assert copy.read_bytes() == b"x" * 10
+
+
+def test_oversized_file_is_not_cached(settings, tmp_path, source):
+    cache = MediaCache(tmp_path / "cache", 15)
+    cache.store("a", "raw", source("a", 20))
+    assert cache.checkout("a", "raw") is None
+
+
+def test_index_is_restored_in_mtime_order(settings, tmp_path, source):
+    root = tmp_path / "cache"
+    cache = MediaCache(root, 100)
+    for index, name in enumerate(["a", "b", "c"]):
+        cache.store(name, "raw", source(name, 10))
+        os.utime(root / f"{name}.raw", (1000 + index, 1000 + index))
+
+    # Бюджет меньше прежнего: при загрузке вытесняется самая старая запись
+    restored = MediaCache(root, 25)
+    assert restored.checkout("a", "raw") is None
+    assert restored.checkout("b", "raw") is not None
+    assert restored.checkout("c", "raw") is not None
+
+
+def test_disabled_cache_does_nothing(settings, tmp_path, source):
+    cache = MediaCache(tmp_path / "cache", 0)
+    cache.store("a", "raw", source("a", 10))
+
+    assert cache.checkout("a", "raw") is None
+    assert not (tmp_path / "cache").exists()
@@ -0,0 +1,118 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from app.config import MediaGroupConfig
+from app.handlers.media_group_aggregator import MediaGroupAggregator
+
+
+class Flushes:
+    """Записывает собранные группы и время их отправки"""
+
+    def __init__(self):
+        self.groups: List[List[int]] = []
+        self.times: List[float] = []
+
+    async def __call__(self, group, context):
+        self.groups.append([message.message_id for message in group.messages])
+        self.times.append(asyncio.get_running_loop().time())
+
+
+def config(**values) -> MediaGroupConfig:
+    values.setdefault("quiet_period", 0.05)
+    values.setdefault("min_quiet_period", 0.01)
+    return MediaGroupConfig(**values)
+
+
+def test_group_is_flushed_after_quiet_period(make_message):
+    flushes = Flushes()
+
+    async def main():
+        aggregator = MediaGroupAggregator(flushes, config())
+        started = asyncio.get_running_loop().time()
+        aggregator.add(make_message(1, 12, media_group_id="g", photo="b"), None)
+        aggregator.add(make_message(1, 11, media_group_id="g", photo="a"), None)
+        # Повтор сообщения группу не меняет
+        group = aggregator.add(make_message(1, 11, media_group_id="g"), None)
+        await group.complete.wait()
+        await asyncio.sleep(0)
+        return started, aggregator.pending
+
+    started, pending = asyncio.run(main())
+    # Сообщения альбома упорядочены по ID
+    assert flushes.groups == [[11, 12]]
+    assert flushes.times[0] - started >= 0.05
+    assert pending == 0
+
+
+def test_new_item_restarts_the_quiet_period(make_message):
+    flushes = Flushes()
+
+    async def main():
+        aggregator = MediaGroupAggregator(flushes, config())
+        started = asyncio.get_running_loop().time()
+        aggregator.add(make_message(1, 1, media_group_id="g"), None)
+        await asyncio.sleep(0.04)
+        group = aggregator.add(make_message(1, 2, media_group_id="g"), None)
+        await group.complete.wait()
+        return started
+
+    started = asyncio.run(main())
+    assert flushes.groups == [[1, 2]]
+    assert flushes.times[0] - started >= 0.09
+
+
+def test_max_wait_bounds_a_group_that_keeps_growing(make_message):
+    flushes = Flushes()
+
+    async def main():
+        aggregator = MediaGroupAggregator(flushes, config(max_wait=0.15))
+        started = asyncio.get_running_loop().time()
+        for message_id in range(1, 10):
+            group = aggregator.add(
+                make_message(1, message_id, media_group_id="g"), None
+            )
+            await asyncio.sleep(0.03)
+        await group.complete.wait()
+        return started
+
+    started = asyncio.run(main())
+    assert 0.15 <= flushes.times[0] - started < 0.25
+    assert len(flushes.groups[0]) < 9
+
+
+@pytest.mark.parametrize(
+    "gap, expected",
+    [
+        # 2 * p95 интервалов между сообщениями
+        (0.2, 0.4),
+        # Ограничения снизу и сверху
+        (0.001, 0.3),
+        (5.0, 3.0),
+    ],
+)
+def test_quiet_period_adapts_to_observed_gaps(gap, expected):
+    aggregator = MediaGroupAggregator(None, MediaGroupConfig())
+    aggregator._gaps.extend([gap] * 9)
+    # Пока замеров мало, используется начальная пауза
+    assert aggregator.quiet_period == 1.0
+
+    aggregator._gaps.append(gap)
+    assert aggregator.quiet_period == pytest.approx(expected)
+
+
+def test_shutdown_flushes_pending_groups(make_message):
+    flushes = Flushes()
+
+    async def main():
+        aggregator = MediaGroupAggregator(flushes, config(quiet_period=10))
+        started = asyncio.get_running_loop().time()
+        aggregator.add(make_message(1, 1, media_group_id="a"), None)
+        aggregator.add(make_message(2, 1, media_group_id="b"), None)
+        await aggregator.shutdown()
+        return started
+
+    started = asyncio.run(main())
+    assert sorted(flushes.groups) == [[1], [1]]
+    assert max(flushes.times) - started < 1
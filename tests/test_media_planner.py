@@ -0,0 +1,124 @@
+from datetime import datetime, timezone
+
+import pytest
+from telegram import Animation, Chat, Message, PhotoSize, Sticker, Video
+
+from app.utils.media_planner import plan_message
+
+# Лимиты Bot API и Discord в тестах
+DOWNLOAD_LIMIT = 1000
+DISCORD_LIMIT = 100
+
+
+@pytest.fixture
+def planner_settings(make_settings):
+    settings = make_settings()
+    settings.telegram.max_file_size = DOWNLOAD_LIMIT
+    settings.discord.max_file_size = DISCORD_LIMIT
+    return settings
+
+
+def message(**media) -> Message:
+    return Message(1, datetime.now(timezone.utc), Chat(1, Chat.CHANNEL), **media)
+
+
+def photo(*sizes):
+    return [
+        PhotoSize(f"photo-{index}", f"u{index}", 100 * index, 100 * index, size)
+        for index, size in enumerate(sizes, start=1)
+    ]
+
+
+def video(size):
+    return Video("video", "uv", 640, 360, 10, file_size=size)
+
+
+def sticker(is_animated=False, is_video=False, size=10, thumbnail=None):
+    return Sticker(
+        "sticker",
+        "us",
+        512,
+        512,
+        is_animated,
+        is_video,
+        Sticker.REGULAR,
+        file_size=size,
+        thumbnail=thumbnail,
+    )
+
+
+def decisions(plans):
+    return [(plan.kind, plan.action, plan.reason) for plan in plans]
+
+
+def test_largest_photo_under_the_discord_limit_is_sent(planner_settings):
+    plans = plan_message(message(photo=photo(40, 90, 500)), planner_settings)
+    assert decisions(plans) == [("photo", "send", None)]
+    assert plans[0].media.file_id == "photo-2"
+
+
+def test_photo_without_size_is_trusted(planner_settings):
+    plans = plan_message(message(photo=photo(40, None)), planner_settings)
+    assert plans[0].media.file_id == "photo-2"
+
+
+def test_smallest_photo_is_fitted_when_all_are_too_big(planner_settings):
+    plans = plan_message(message(photo=photo(200, 800, 5000)), planner_settings)
+    assert decisions(plans) == [("photo", "fit", None)]
+    assert plans[0].media.file_id == "photo-1"
+
+
+def test_photo_over_the_bot_api_limit_is_skipped(planner_settings):
+    plans = plan_message(message(photo=photo(2000, 5000)), planner_settings)
+    assert decisions(plans) == [("photo", "skip", "bot_api_limit")]
+
+
+@pytest.mark.parametrize(
+    "size, fit, expected",
+    [
+        (50, True, ("video", "send", None)),
+        (None, True, ("video", "send", None)),
+        (500, True, ("video", "fit", None)),
+        (500, False, ("video", "skip", "discord_limit")),
+        (5000, True, ("video", "skip", "bot_api_limit")),
+    ],
+)
+def test_video_plan_follows_both_limits(planner_settings, size, fit, expected):
+    planner_settings.conversion.fit_to_size = fit
+    plans = plan_message(message(video=video(size)), planner_settings)
+    assert decisions(plans) == [expected]
+
+
+def test_animation_is_converted_unless_too_big_to_download(planner_settings):
+    small = Animation("gif", "ua", 320, 240, 3, file_size=500)
+    huge = Animation("gif", "ua", 320, 240, 3, file_size=5000)
+
+    plans = plan_message(message(animation=small), planner_settings)
+    assert decisions(plans) == [("animation", "convert", None)]
+    assert plans[0].ext == "gif"
+    plans = plan_message(message(animation=huge), planner_settings)
+    assert decisions(plans) == [("animation", "skip", "bot_api_limit")]
+
+
+def test_sticker_plans(planner_settings):
+    thumbnail = PhotoSize("thumb", "ut", 128, 128, 5)
+
+    def plan(item):
+        return plan_message(message(sticker=item), planner_settings)[0]
+
+    static = plan(sticker())
+    assert (static.action, static.ext) == ("send", "webp")
+    assert plan(sticker(is_video=True)).action == "convert"
+    # Без рендерера TGS отправляется миниатюра, а без нее стикер пропускается
+    assert plan(sticker(is_animated=True, thumbnail=thumbnail)).media is thumbnail
+    assert plan(sticker(is_animated=True)).reason == "no_tgs_renderer"
+
+    planner_settings.stickers.tgs_renderer = ["render", "{input}", "{output}"]
+    planner_settings.stickers.animated_format = "apng"
+    rendered = plan(sticker(is_animated=True, thumbnail=thumbnail))
+    assert (rendered.action, rendered.ext) == ("convert", "png")
+
+
+def test_disabled_stickers_are_not_planned(planner_settings):
+    planner_settings.stickers.enabled = False
+    assert plan_message(message(sticker=sticker()), planner_settings) == []
@@ -0,0 +1,217 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from app.handlers.telegram_media_handler import TelegramMediaHandler
+from app.services.delivery_queue import DeliveryQueue
+from app.services.discord import DiscordService
+from app.services.message_index import MessageIndex, PostRef, SentMessage
+from app.utils.errors import WebhookError
+
+
+class FakeDiscord:
+    def __init__(self, message_index: MessageIndex):
+        self.message_index = message_index
+        self.edited = []
+        self.deleted = []
+
+    async def edit_post(self, post, caption):
+        self.edited.append((post.ref.key, caption))
+
+    async def delete_post(self, post):
+        self.deleted.append(post.ref.key)
+        return True
+
+
+@pytest.fixture
+def edit_settings(make_settings):
+    return make_settings(edits={"enabled": True})
+
+
+@pytest.fixture
+def index(edit_settings):
+    index = MessageIndex(edit_settings)
+    yield index
+    index.close()
+
+
+@pytest.fixture
+def handler(index, edit_settings):
+    return TelegramMediaHandler(
+        media_service=SimpleNamespace(build_payloads=None),
+        discord_service=FakeDiscord(index),
+        settings=edit_settings,
+    )
+
+
+def record(index, ref, webhook="first", ids=("100",)):
+    messages = [SentMessage(id, ref.caption, False) for id in ids]
+    asyncio.run(index.record(ref, webhook, ref.caption, messages))
+
+
+def test_edit_finds_post_by_key(handler, index, make_message):
+    record(index, PostRef(1, "m10", 10, "old"))
+
+    asyncio.run(handler.edit_post(make_message(1, 10, text="new")))
+    assert handler.discord.edited == [("m10", "new")]
+
+
+def test_edit_of_group_uses_first_message(handler, index, make_message):
+    record(index, PostRef(1, "gA", 10, "caption"))
+
+    # Подпись группы хранится в первом сообщении, правки остальных не видны
+    asyncio.run(handler.edit_post(make_message(1, 11, caption="x", media_group_id="A")))
+    assert handler.discord.edited == []
+
+    asyncio.run(
+        handler.edit_post(make_message(1, 10, caption="new", media_group_id="A"))
+    )
+    assert handler.discord.edited == [("gA", "new")]
+
+
+def test_edit_of_unknown_or_unchanged_post_is_skipped(handler, index, make_message):
+    record(index, PostRef(1, "m10", 10, "same"))
+
+    asyncio.run(handler.edit_post(make_message(1, 10, text="same")))
+    asyncio.run(handler.edit_post(make_message(2, 10, text="other chat")))
+    assert handler.discord.edited == []
+
+
+def test_delete_finds_post_by_first_message(handler, index):
+    record(index, PostRef(1, "gA", 10, "caption"), webhook="first")
+    record(index, PostRef(1, "gA", 10, "caption"), webhook="second")
+
+    assert asyncio.run(handler.delete_post(1, 11)) == "not_found"
+    assert asyncio.run(handler.delete_post(1, 10)) == "deleted"
+    assert handler.discord.deleted == ["gA"]
+
+
+def test_edit_rewrites_indexed_messages(index):
+    edits: List[tuple] = []
+    deletes: List[str] = []
+
+    async def main():
+        discord = DiscordService(message_index=index)
+        hook = next(hook for hook in discord._hooks if hook.hook.name == "first")
+
+        async def edit(message_id, content):
+            edits.append((message_id, content))
+
+        async def delete(message_id):
+            deletes.append(message_id)
+
+        hook.edit = edit
+        hook.delete = delete
+        ref = PostRef(1, "m10", 10, "a" * 1500 + " " + "b" * 1500)
+        await index.record(
+            ref,
+            "first",
+            ref.caption,
+            [
+                SentMessage("100", "a" * 1500, False),
+                SentMessage("101", "b" * 1500, False),
+                SentMessage("102", "", True),
+            ],
+        )
+        try:
+            await discord.edit_post(await index.get(1, "m10"), "short")
+            return await index.get(1, "m10")
+        finally:
+            await discord.close()
+
+    post = asyncio.run(main())
+
+    assert edits == [("100", "short")]
+    # Текстовое сообщение без текста удаляется, вложения остаются
+    assert deletes == ["101"]
+    assert post.ref.caption == "short"
+    assert [message.id for message in post.deliveries[0].messages] == ["100", "102"]
+
+
+class FakeWebhooks:
+    """Подменяет запросы вебхуков сервиса Discord и записывает их"""
+
+    def __init__(self, discord: DiscordService, delay: float = 0):
+        self.sent: List[tuple] = []
+        self.edits: List[tuple] = []
+        self.deletes: List[tuple] = []
+        self.failing: set = set()
+        for hook in discord._hooks:
+            self._patch(hook, hook.hook.name, delay)
+
+    def _patch(self, hook, name: str, delay: float) -> None:
+        async def execute(content="", files=None):
+            await asyncio.sleep(delay)
+            self.sent.append((name, content))
+            return {"id": f"{name}-{len(self.sent)}"}
+
+        async def edit(message_id, content):
+            self.edits.append((name, message_id, content))
+
+        async def delete(message_id):
+            if name in self.failing:
+                raise WebhookError(500, "unavailable")
+            self.deletes.append((name, message_id))
+
+        hook.execute = execute
+        hook.edit = edit
+        hook.delete = delete
+
+
+def test_edit_waits_for_the_queued_post(index, edit_settings, tmp_path, make_message):
+    async def main():
+        discord = DiscordService(message_index=index)
+        webhooks = FakeWebhooks(discord, delay=0.05)
+        queue = DeliveryQueue(discord, edit_settings, root=tmp_path / "outbox")
+        handler = TelegramMediaHandler(
+            media_service=SimpleNamespace(build_payloads=None),
+            discord_service=discord,
+            settings=edit_settings,
+            delivery_queue=queue,
+        )
+        await queue.start()
+        try:
+            ref = PostRef(1, "m10", 10, "old")
+            await queue.enqueue("old", [], post=ref, chat_id=1)
+            # Правка приходит, пока пост еще не доставлен
+            edited = make_message(1, 10, text="new")
+            await handler.handle_edit(SimpleNamespace(edited_channel_post=edited), None)
+            await handler.dispatcher.shutdown()
+            return webhooks, await index.get(1, "m10")
+        finally:
+            await queue.stop()
+            await discord.close()
+
+    webhooks, post = asyncio.run(main())
+    assert sorted(webhooks.sent) == [("first", "old"), ("second", "old")]
+    assert sorted(name for name, _, content in webhooks.edits) == ["first", "second"]
+    assert {content for _, _, content in webhooks.edits} == {"new"}
+    assert post.ref.caption == "new"
+
+
+def test_failed_delete_keeps_the_post_indexed(index):
+    async def main():
+        discord = DiscordService(message_index=index)
+        webhooks = FakeWebhooks(discord)
+        ref = PostRef(1, "m10", 10, "caption")
+        for name in ("first", "second"):
+            await index.record(ref, name, "caption", [SentMessage(name, "", True)])
+        try:
+            webhooks.failing.add("first")
+            failed = await discord.delete_post(await index.get(1, "m10"))
+            kept = await index.get(1, "m10")
+
+            # Повтор удаляет оставшееся сообщение и забывает пост
+            webhooks.failing.clear()
+            deleted = await discord.delete_post(kept)
+            return failed, kept, deleted, await index.get(1, "m10"), webhooks
+        finally:
+            await discord.close()
+
+    failed, kept, deleted, forgotten, webhooks = asyncio.run(main())
+    assert (failed, deleted) == (False, True)
+    assert kept is not None
+    assert forgotten is None
+    assert ("first", "first") in webhooks.deletes
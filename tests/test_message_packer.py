@@ -0,0 +1,93 @@
+import pytest
+
+from app.models.file_payload import FilePayload
+from app.utils.message_packer import (
+    MAX_CONTENT_LENGTH,
+    REQUEST_OVERHEAD,
+    pack_files,
+    pack_message,
+    split_content,
+)
+
+
+def payload(name: str, size: int) -> FilePayload:
+    return FilePayload(b"x" * size, name)
+
+
+def names(groups):
+    return [[file.filename for file in group] for group in groups]
+
+
+def test_short_content_is_not_split():
+    assert split_content("  hello  ") == ["hello"]
+    assert split_content("") == []
+
+
+def test_content_is_split_on_the_best_boundary():
+    content = "a" * 1200 + "\n\n" + "b" * 500 + ". " + "c" * 900
+    parts = split_content(content)
+    # Абзац предпочтительнее предложения, если часть не выходит слишком короткой
+    assert parts == ["a" * 1200, "b" * 500 + ". " + "c" * 900]
+
+
+def test_short_first_part_is_avoided():
+    content = "a" * 100 + "\n\n" + "b" * 1500 + " " + "c" * 900
+    parts = split_content(content)
+    assert parts == ["a" * 100 + "\n\n" + "b" * 1500, "c" * 900]
+
+
+def test_content_without_boundaries_is_cut_at_the_limit():
+    parts = split_content("x" * 4500)
+    assert [len(part) for part in parts] == [2000, 2000, 500]
+    assert all(len(part) <= MAX_CONTENT_LENGTH for part in parts)
+
+
+def test_ordered_packing_keeps_file_order():
+    files = [payload(name, size) for name, size in zip("abcde", [6, 6, 3, 3, 3])]
+    groups = pack_files(files, max_files=10, max_bytes=10)
+    assert names(groups) == [["a"], ["b", "c"], ["d", "e"]]
+
+
+def test_ordered_packing_respects_file_count():
+    files = [payload(str(index), 1) for index in range(12)]
+    groups = pack_files(files, max_files=10, max_bytes=100)
+    assert [len(group) for group in groups] == [10, 2]
+
+
+def test_compact_packing_saves_messages():
+    files = [payload(name, size) for name, size in zip("abcd", [6, 5, 4, 5])]
+    assert len(pack_files(files, 10, 10, "ordered")) == 3
+    groups = pack_files(files, 10, 10, "compact")
+    # Внутри сообщения и между сообщениями сохраняется исходный порядок
+    assert names(groups) == [["a", "c"], ["b", "d"]]
+
+
+@pytest.mark.parametrize("strategy", ["ordered", "compact"])
+def test_oversized_file_goes_alone(strategy):
+    files = [payload("small", 2), payload("huge", 50), payload("tail", 2)]
+    groups = pack_files(files, 10, 10, strategy)
+    assert ["huge"] in names(groups)
+    assert sum(len(group) for group in groups) == 3
+
+
+def test_files_follow_the_last_text_part():
+    files = [payload(str(index), 1) for index in range(12)]
+    messages = pack_message("a" * 1500 + " " + "b" * 1500, files, max_files=10)
+
+    assert [message.content[:1] for message in messages] == ["a", "b", ""]
+    assert [len(message.files) for message in messages] == [0, 10, 2]
+
+
+def test_request_size_leaves_room_for_the_payload():
+    files = [payload("a", 600), payload("b", 600)]
+    messages = pack_message("", files, max_bytes=REQUEST_OVERHEAD + 1000)
+    assert [[file.filename for file in message.files] for message in messages] == [
+        ["a"],
+        ["b"],
+    ]
+
+
+def test_empty_post_is_one_message():
+    messages = pack_message("", [])
+    assert len(messages) == 1
+    assert (messages[0].content, messages[0].files) == ("", [])
@@ -0,0 +1,91 @@
+import asyncio
+import socket
+
+import aiohttp
+import pytest
+
+from app.config import MetricsConfig
+from app.services.metrics_server import CONTENT_TYPE, MetricsServer
+from app.utils.metrics import MetricsRegistry
+
+
+def test_counter_renders_labelled_samples():
+    registry = MetricsRegistry()
+    counter = registry.counter("posts_total", "Posts handled", ["chat"])
+    counter.inc(chat=1)
+    counter.inc(2.5, chat=1)
+    counter.inc(chat='say "hi"\n\\')
+
+    assert registry.render().splitlines() == [
+        "# HELP posts_total Posts handled",
+        "# TYPE posts_total counter",
+        'posts_total{chat="1"} 3.5',
+        'posts_total{chat="say \\"hi\\"\\n\\\\"} 1',
+    ]
+    assert counter.value(chat=1) == 3.5
+
+
+def test_labels_must_match_the_declaration():
+    counter = MetricsRegistry().counter("posts_total", "Posts handled", ["chat"])
+    with pytest.raises(ValueError):
+        counter.inc()
+    with pytest.raises(ValueError):
+        counter.inc(chat=1, webhook="first")
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("wait_seconds", "Wait", buckets=(1, 0.5))
+    for value in (0.2, 0.7, 0.9, 4):
+        histogram.observe(value)
+
+    assert histogram.render()[2:] == [
+        'wait_seconds_bucket{le="0.5"} 1',
+        'wait_seconds_bucket{le="1"} 3',
+        'wait_seconds_bucket{le="+Inf"} 4',
+        "wait_seconds_sum 5.8",
+        "wait_seconds_count 4",
+    ]
+
+
+def test_gauge_reads_its_source_on_render():
+    registry = MetricsRegistry()
+    plain = registry.gauge("depth", "Queue depth")
+    labelled = registry.gauge("bytes", "Cache bytes", ["kind"])
+    sizes = {("photo",): 10}
+    plain.set_function(lambda: len(sizes))
+    labelled.set_function(lambda: sizes)
+
+    sizes[("video",)] = 20
+    assert plain.render()[2:] == ["depth 2"]
+    assert labelled.render()[2:] == ['bytes{kind="photo"} 10', 'bytes{kind="video"} 20']
+
+
+def test_registering_twice_returns_the_same_metric():
+    registry = MetricsRegistry()
+    first = registry.counter("posts_total", "Posts handled")
+    assert registry.counter("posts_total", "Posts handled") is first
+    with pytest.raises(ValueError):
+        registry.gauge("posts_total", "Posts handled")
+
+
+def test_server_exposes_the_registry():
+    registry = MetricsRegistry()
+    registry.counter("posts_total", "Posts handled").inc()
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    async def main():
+        server = MetricsServer(MetricsConfig(enabled=True), registry, port=port)
+        await server.start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                    return response.headers["Content-Type"], await response.text()
+        finally:
+            await server.stop()
+
+    content_type, body = asyncio.run(main())
+    assert content_type == CONTENT_TYPE
+    assert "posts_total 1\n" in body
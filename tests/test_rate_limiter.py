@@ -0,0 +1,145 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+
+from app.config import WebhookConfig
+from app.services.rate_limiter import (
+    DISCORD_QUEUE_DEPTH,
+    DISCORD_RATE_LIMITED,
+    RateLimiter,
+    WebhookScheduler,
+)
+from app.services.webhook_client import WebhookResponse
+from app.utils.errors import WebhookError
+
+
+def ok(headers: Dict[str, str] = None) -> WebhookResponse:
+    return WebhookResponse(200, headers or {}, {"id": "1"})
+
+
+def limited(retry_after: float, is_global: bool = False) -> WebhookResponse:
+    return WebhookResponse(
+        429, {}, {"retry_after": retry_after, "global": is_global, "message": "slow"}
+    )
+
+
+class FakeClient:
+    """Клиент вебхуков, который отвечает по сценарию"""
+
+    def __init__(self, responses: List[WebhookResponse]):
+        self.responses = list(responses)
+        self.calls: List[tuple] = []
+
+    async def execute(self, url: str, **kwargs: Any) -> WebhookResponse:
+        self.calls.append((url, asyncio.get_running_loop().time()))
+        return self.responses.pop(0) if self.responses else ok()
+
+
+def scheduler(name, client, limiter, max_retries=10) -> WebhookScheduler:
+    return WebhookScheduler(
+        WebhookConfig(name=name, url=f"http://discord.invalid/{name}"),
+        client,
+        limiter,
+        asyncio.Semaphore(10),
+        max_retries=max_retries,
+    )
+
+
+def test_rate_limited_send_is_retried_after_retry_after():
+    client = FakeClient([limited(0.1), ok()])
+    rate_limited = DISCORD_RATE_LIMITED.value(webhook="rl-retry", scope="bucket")
+
+    async def main():
+        hook = scheduler("rl-retry", client, RateLimiter())
+        return await hook.execute("hello"), hook.queue_depth
+
+    data, depth = asyncio.run(main())
+
+    assert data == {"id": "1"}
+    assert depth == 0
+    assert len(client.calls) == 2
+    assert client.calls[1][1] - client.calls[0][1] >= 0.1
+    assert DISCORD_RATE_LIMITED.value(webhook="rl-retry", scope="bucket") == (
+        rate_limited + 1
+    )
+
+
+def test_exhausted_bucket_delays_the_next_send():
+    headers = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "0.1"}
+    client = FakeClient([ok(headers), ok()])
+
+    async def main():
+        hook = scheduler("rl-bucket", client, RateLimiter())
+        await hook.execute("one")
+        await hook.execute("two")
+
+    asyncio.run(main())
+    assert client.calls[1][1] - client.calls[0][1] >= 0.1
+
+
+def test_shared_bucket_is_shared_between_webhooks():
+    def headers(reset_after: str) -> Dict[str, str]:
+        return {
+            "X-RateLimit-Bucket": "shared",
+            "X-RateLimit-Remaining": "0",
+            "X-RateLimit-Reset-After": reset_after,
+        }
+
+    client = FakeClient([ok(headers("0.05")), ok(headers("0.3")), ok()])
+
+    async def main():
+        limiter = RateLimiter()
+        first = scheduler("rl-a", client, limiter)
+        second = scheduler("rl-b", client, limiter)
+        await second.execute("warm up")
+        await first.execute("one")
+        # Ответ первому вебхуку сдвинул сброс общего бакета
+        await second.execute("two")
+
+    asyncio.run(main())
+    assert client.calls[2][1] - client.calls[1][1] >= 0.3
+
+
+def test_global_rate_limit_blocks_every_webhook():
+    client = FakeClient([limited(0.1, is_global=True), ok(), ok()])
+
+    async def main():
+        limiter = RateLimiter()
+        first = scheduler("rl-global-a", client, limiter)
+        second = scheduler("rl-global-b", client, limiter)
+        await first.execute("one")
+        await second.execute("two")
+
+    asyncio.run(main())
+    assert client.calls[2][1] - client.calls[0][1] >= 0.1
+
+
+def test_retries_exhausted_raise_and_reset_depth():
+    client = FakeClient([limited(0.01)] * 3)
+
+    async def main():
+        hook = scheduler("rl-exhausted", client, RateLimiter(), max_retries=2)
+        with pytest.raises(WebhookError) as error:
+            await hook.execute("hello")
+        return error.value, hook
+
+    error, hook = asyncio.run(main())
+    assert error.status == 429
+    assert len(client.calls) == 3
+    assert hook.queue_depth == 0
+    assert 'discord_webhook_queue_depth{webhook="rl-exhausted"} 0' in "\n".join(
+        DISCORD_QUEUE_DEPTH.render()
+    )
+
+
+def test_error_response_is_not_retried():
+    client = FakeClient([WebhookResponse(400, {}, {"message": "bad"})])
+
+    async def main():
+        with pytest.raises(WebhookError) as error:
+            await scheduler("rl-error", client, RateLimiter()).execute("hello")
+        return error.value
+
+    assert asyncio.run(main()).status == 400
+    assert len(client.calls) == 1
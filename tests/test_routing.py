@@ -0,0 +1,113 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.handlers.telegram_media_handler import TelegramMediaHandler
+
+
+ROUTES = [
+    {"name": "news", "chats": [1], "caption_pattern": "#news", "webhooks": ["first"]},
+    {"name": "photos", "media_types": ["photo"], "webhooks": ["second"]},
+    {"name": "videos", "chats": [2], "media_types": ["video"], "webhooks": ["first"]},
+]
+
+
+@pytest.fixture
+def routed_settings(make_settings):
+    return make_settings(routes=ROUTES)
+
+
+class FakeMediaService:
+    def __init__(self):
+        self.started = []
+
+    async def build_payloads(self, message, context):
+        self.started.append(message.message_id)
+        return []
+
+
+@pytest.fixture
+def handler(routed_settings):
+    return TelegramMediaHandler(
+        media_service=FakeMediaService(),
+        discord_service=SimpleNamespace(message_index=None),
+        settings=routed_settings,
+    )
+
+
+def names(routes):
+    return [route.name for route in routes]
+
+
+def test_match_by_chat_media_and_caption(routed_settings):
+    routing = routed_settings.routing
+
+    assert names(routing.match(1, {"text"}, "today #news")) == ["news"]
+    assert names(routing.match(1, {"photo"}, "#news")) == ["news", "photos"]
+    assert names(routing.match(1, {"text"}, "no tag")) == []
+    assert names(routing.match(2, {"video"}, "")) == ["videos"]
+    # Маршрут канала 2 не подходит другим каналам
+    assert names(routing.match(3, {"video"}, "")) == []
+    assert names(routing.match(3, {"photo"}, "")) == ["photos"]
+
+
+def test_route_picks_webhooks_in_config_order(handler, make_message):
+    post = [make_message(1, 10, caption="#news", photo="a")]
+    assert handler._route(post) == ["first", "second"]
+    assert handler._route([make_message(1, 11, text="plain")]) == []
+
+
+def test_no_routes_sends_everywhere(make_settings, make_message):
+    handler = TelegramMediaHandler(
+        media_service=FakeMediaService(),
+        discord_service=SimpleNamespace(message_index=None),
+        settings=make_settings(),
+    )
+    assert handler._route([make_message(5, 1, text="hi")]) is None
+
+
+def test_routed_media_group_downloads_right_away(handler, make_message):
+    media = handler.media_service
+
+    async def main():
+        # Фото из любого канала подходит маршруту photos
+        message = make_message(3, 10, media_group_id="g", photo="a")
+        group = handler.aggregator.add(message, None)
+        await asyncio.sleep(0)
+        assert media.started == [10]
+        group.flush_now.set()
+        await group.complete.wait()
+
+    asyncio.run(main())
+
+
+def test_unrouted_media_group_is_not_downloaded(make_settings, make_message):
+    settings = make_settings(
+        routes=[{"name": "news", "caption_pattern": "#news", "webhooks": ["first"]}],
+        media_group={"quiet_period": 0.05, "min_quiet_period": 0.05},
+    )
+    handler = TelegramMediaHandler(
+        media_service=FakeMediaService(),
+        discord_service=SimpleNamespace(message_index=None),
+        settings=settings,
+    )
+    media = handler.media_service
+
+    async def main():
+        handler.aggregator.add(make_message(1, 10, media_group_id="g", photo="a"), None)
+        handler.aggregator.add(make_message(1, 11, media_group_id="g", photo="b"), None)
+        await asyncio.sleep(0)
+        # Пока подписи нет, маршрут неизвестен и скачивание не начато
+        assert media.started == []
+
+        group = handler.aggregator.add(
+            make_message(1, 12, media_group_id="g", photo="c", caption="#news"),
+            None,
+        )
+        await asyncio.sleep(0)
+        # Отложенные элементы запускаются вместе с тем, что решил маршрут
+        assert sorted(media.started) == [10, 11, 12]
+        await group.complete.wait()
+
+    asyncio.run(main())
@@ -0,0 +1,163 @@
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List, Optional
+
+import pytest
+
+import app.services.media_service as media_service
+import app.utils.transcoder as transcoder
+from app.config import GifProfile
+from app.services.media_cache import MediaCache
+from app.services.media_service import MediaService
+
+MAX_SIZE = 1_000_000
+
+
+class FakeEncoder:
+    """Вместо ffmpeg пишет результат заданного размера"""
+
+    def __init__(self, sizes: List[Optional[int]]):
+        self.sizes = list(sizes)
+        self.commands: List[List[str]] = []
+        self.outputs: List[Path] = []
+
+    async def __call__(self, cmd: List[str], output: Path, label: str):
+        self.commands.append(cmd)
+        self.outputs.append(output)
+        size = self.sizes.pop(0)
+        if size is not None:
+            output.write_bytes(b"\0" * size)
+        return size
+
+    def option(self, index: int, name: str) -> str:
+        cmd = self.commands[index]
+        return cmd[cmd.index(name) + 1]
+
+
+@pytest.fixture
+def encoder(settings, monkeypatch):
+    def make(*sizes: Optional[int]) -> FakeEncoder:
+        fake = FakeEncoder(list(sizes))
+        monkeypatch.setattr(transcoder, "_attempt", fake)
+        return fake
+
+    return make
+
+
+@pytest.fixture
+def source(tmp_path) -> Path:
+    path = tmp_path / "source.mp4"
+    path.write_bytes(b"\0" * 10)
+    return path
+
+
+def test_video_bitrate_is_corrected_by_measured_size(encoder, source):
+    fake = encoder(1_200_000, 900_000)
+    fitted = asyncio.run(transcoder.fit_video(source, MAX_SIZE, duration=10))
+
+    # 95% лимита за 10 секунд минус звук
+    assert fake.option(0, "-b:v") == "696000"
+    assert fake.option(1, "-b:v") == str(int(696000 * 950_000 / 1_200_000))
+    assert fitted == fake.outputs[1]
+    assert fitted.stat().st_size == 900_000
+    assert not fake.outputs[0].exists()
+
+
+def test_video_too_long_for_the_limit_is_not_encoded(encoder, source):
+    fake = encoder()
+    assert asyncio.run(transcoder.fit_video(source, MAX_SIZE, duration=600)) is None
+    assert fake.commands == []
+
+
+def test_video_without_duration_is_not_encoded(encoder, source, monkeypatch):
+    async def unknown(path):
+        return None
+
+    monkeypatch.setattr(transcoder, "probe_duration", unknown)
+    fake = encoder()
+    assert asyncio.run(transcoder.fit_video(source, MAX_SIZE)) is None
+    assert fake.commands == []
+
+
+def test_failed_encode_stops_fitting(encoder, source):
+    fake = encoder(None, 500_000)
+    assert asyncio.run(transcoder.fit_video(source, MAX_SIZE, duration=10)) is None
+    assert len(fake.commands) == 1
+
+
+def test_gif_starts_from_the_variant_predicted_to_fit(encoder, source):
+    fake = encoder(900_000)
+    # Профиль 10 fps, 480 px дал GIF в четыре раза больше лимита
+    measured = (GifProfile(fps=10, width=480), 4 * MAX_SIZE)
+    fitted = asyncio.run(transcoder.fit_gif(source, MAX_SIZE, measured))
+
+    assert fitted is not None
+    assert len(fake.commands) == 1
+    assert fake.option(0, "-vf").startswith("fps=8,scale=240:")
+
+
+def test_gif_is_not_encoded_when_nothing_can_fit(encoder, source):
+    fake = encoder()
+    measured = (GifProfile(fps=10, width=480), 1000 * MAX_SIZE)
+    assert asyncio.run(transcoder.fit_gif(source, MAX_SIZE, measured)) is None
+    assert fake.commands == []
+
+
+def test_photo_is_scaled_down_by_area(encoder, source):
+    fake = encoder(4 * MAX_SIZE, MAX_SIZE // 2)
+    fitted = asyncio.run(transcoder.fit_photo(source, MAX_SIZE))
+
+    assert fitted == fake.outputs[1]
+    assert "iw*1.0000" in fake.option(0, "-vf")
+    assert "iw*0.4873" in fake.option(1, "-vf")
+
+
+@pytest.fixture
+def service(make_settings, tmp_path):
+    make_settings(
+        discord={
+            "webhooks": [{"name": "first", "url": "http://discord.invalid/1"}],
+            "max_file_size": 100,
+            "message": {},
+        }
+    )
+    return MediaService(cache=MediaCache(tmp_path / "cache", 10_000))
+
+
+def oversized(tmp_path) -> Path:
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(b"\0" * 500)
+    return path
+
+
+def test_unfitted_media_falls_back_to_the_original(service, tmp_path, monkeypatch):
+    media = service
+
+    async def no_fit(path, max_size):
+        return None
+
+    monkeypatch.setattr(media_service, "fit_photo", no_fit)
+    path = oversized(tmp_path)
+    photo = SimpleNamespace(file_unique_id="p", file_size=500)
+
+    assert asyncio.run(media._fit_to_size(path, photo, "jpg")) == path
+    assert path.exists()
+
+
+def test_fitted_media_replaces_and_is_cached(service, tmp_path, monkeypatch):
+    media = service
+    fitted = tmp_path / "fitted.jpg"
+    fitted.write_bytes(b"\0" * 80)
+
+    async def fit(path, max_size):
+        return fitted
+
+    monkeypatch.setattr(media_service, "fit_photo", fit)
+    path = oversized(tmp_path)
+    photo = SimpleNamespace(file_unique_id="p", file_size=500)
+
+    assert asyncio.run(media._fit_to_size(path, photo, "jpg")) == fitted
+    assert not path.exists()
+    # Повтор поста берет подогнанный файл из кэша
+    assert media._from_cache("p", media._fit_transform).stat().st_size == 80